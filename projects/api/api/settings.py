@@ -142,6 +142,12 @@ STATIC_URL = "static/"
 
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
+# Media files (task outputs, uploads)
+
+MEDIA_URL = "media/"
+
+MEDIA_ROOT = config("MEDIA_ROOT", default=os.path.join(BASE_DIR, "media"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -185,3 +191,35 @@ CELERY_RESULT_BACKEND_DB = "".join(
     ]
 )
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+
+# Scenario enumeration (apps.core.scenarios)
+
+# Combinations per result chunk; also bounds the task's memory use.
+SCENARIO_CHUNK_SIZE = config("SCENARIO_CHUNK_SIZE", default=65536, cast=int)
+
+# Larger spaces fail the job once counted: count them, don't store them.
+SCENARIO_MAX_COMBINATIONS = config(
+    "SCENARIO_MAX_COMBINATIONS", default=100_000_000, cast=int
+)
+
+# Submission limits, checked before the space is counted.
+SCENARIO_MAX_DIMENSIONS = config("SCENARIO_MAX_DIMENSIONS", default=32, cast=int)
+SCENARIO_MAX_RULES = config("SCENARIO_MAX_RULES", default=100, cast=int)
+
+# Project matrices (apps.core.matrices)
+
+# Seconds a cached matrix is kept; entries of stale versions are never read.
+MATRIX_CACHE_TIMEOUT = config("MATRIX_CACHE_TIMEOUT", default=3600, cast=int)
+
+# Factorized technology matrices kept per worker process (LRU).
+SOLVER_CACHE_SIZE = config("SOLVER_CACHE_SIZE", default=32, cast=int)
+
+# Batch solves: larger batches become a SolveJob, solved SOLVE_BATCH_SIZE
+# demands per Celery task across the worker pool.
+SOLVE_BATCH_SIZE = config("SOLVE_BATCH_SIZE", default=512, cast=int)
+
+# Bill of materials explosion (apps.core.bom): default and largest max_depth.
+# The work grows with depth x reachable edges.
+BOM_DEFAULT_DEPTH = config("BOM_DEFAULT_DEPTH", default=10, cast=int)
+
+BOM_MAX_DEPTH = config("BOM_MAX_DEPTH", default=30, cast=int)
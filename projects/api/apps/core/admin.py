@@ -20,6 +20,9 @@ from .models import (
     ProductionFactorContainTransformableEntity,
     ElementaryFlowType,
     ElementaryFlow,
+    ScenarioJob,
+    SolveJob,
+    ImportJob,
 )
 
 
@@ -256,3 +259,72 @@ class ElementaryFlowAdmin(ImportExportModelAdmin):
         "process",
         "unit",
     ]
+
+
+@admin.register(ScenarioJob)
+class ScenarioJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "project",
+        "status",
+        "produced",
+        "total",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = (AutocompleteFilterFactory("project", "project"), "status")
+    readonly_fields = (
+        "task_id",
+        "total",
+        "produced",
+        "chunk_size",
+        "chunk_count",
+        "error",
+        "started_at",
+        "finished_at",
+    )
+
+
+@admin.register(SolveJob)
+class SolveJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "project",
+        "status",
+        "solved",
+        "total",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = (AutocompleteFilterFactory("project", "project"), "status")
+    readonly_fields = (
+        "task_id",
+        "data_version",
+        "total",
+        "solved",
+        "error",
+        "started_at",
+        "finished_at",
+    )
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "file",
+        "project",
+        "dry_run",
+        "status",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = (AutocompleteFilterFactory("project", "project"), "status")
+    readonly_fields = (
+        "task_id",
+        "sheets",
+        "report",
+        "error",
+        "started_at",
+        "finished_at",
+    )
@@ -0,0 +1,182 @@
+"""
+Multi-level bill of materials of a Good, from the GoodContainGood edges.
+
+A recursive query collects the edges reachable from the good within
+`max_depth` levels. UNION (not UNION ALL) keeps one row per (sub-good,
+level), so the query grows with the size of the graph, not with its number
+of paths: a chain of diamonds has 2^n paths but 2n sub-goods. The paths are
+then counted level by level, each level's frontier being aggregated per
+sub-good (quantity and number of paths reaching it) before the next one.
+
+A path stops where it would reach a sub-good already on it: that edge is
+reported as a cycle on the sub-good and not followed, other paths through
+the same sub-goods still are. A path leaving a strongly connected
+component can't come back to it, so only the sub-goods visited in the
+current component are tracked: outside cycles the frontier is aggregated
+per sub-good, inside them per (sub-good, visited sub-goods) and the work
+grows with the number of simple paths within a component.
+"""
+
+from collections import defaultdict
+
+from django.db import connection
+
+from .models import Good, GoodContainGood
+
+REACHABLE_EDGES_SQL = """
+WITH RECURSIVE reach (good_id, depth) AS (
+    SELECT CAST(%(good)s AS BIGINT), 0
+  UNION
+    SELECT e.{child}, r.depth + 1
+    FROM reach r
+    JOIN {edge} e ON e.{parent} = r.good_id
+    WHERE r.depth < %(max_depth)s
+)
+SELECT e.{parent}, e.{child}, e.{quantity}
+FROM {edge} e
+WHERE e.{parent} IN (SELECT good_id FROM reach)
+ORDER BY e.{parent}, e.{child}, e.{pk}
+"""
+
+
+def reachable_edges_sql():
+    qn = connection.ops.quote_name
+    edge = GoodContainGood._meta
+    return REACHABLE_EDGES_SQL.format(
+        edge=qn(edge.db_table),
+        pk=qn(edge.pk.column),
+        parent=qn(edge.get_field("parent_good").column),
+        child=qn(edge.get_field("child_good").column),
+        quantity=qn(edge.get_field("quantity").column),
+    )
+
+
+def components(good_id, children):
+    """
+    Strongly connected component of each good reachable from good_id, as
+    the frozenset of its goods, or None for a good on no cycle (Tarjan's
+    algorithm, iterative).
+    """
+    index, low, stack, on_stack = {}, {}, [], set()
+    found = {}
+    calls = [(good_id, 0)]
+    while calls:
+        node, i = calls.pop()
+        if i == 0:
+            index[node] = low[node] = len(index)
+            stack.append(node)
+            on_stack.add(node)
+        edges = children.get(node, ())
+        if i < len(edges):
+            calls.append((node, i + 1))
+            child = edges[i][0]
+            if child not in index:
+                calls.append((child, 0))
+            elif child in on_stack:
+                low[node] = min(low[node], index[child])
+            continue
+        if calls:
+            parent = calls[-1][0]
+            low[parent] = min(low[parent], low[node])
+        if low[node] == index[node]:
+            members = []
+            while True:
+                member = stack.pop()
+                on_stack.discard(member)
+                members.append(member)
+                if member == node:
+                    break
+            cyclic = len(members) > 1 or any(c == node for c, _ in edges)
+            component = frozenset(members) if cyclic else None
+            for member in members:
+                found[member] = component
+    return found
+
+
+def explode(good_id, max_depth):
+    """
+    Sub-goods of a good down to `max_depth` levels, one dict per sub-good:
+    cumulative quantity per unit of the good (summed over all the paths
+    reaching it), shallowest and deepest level, number of paths, whether it
+    closes a cycle (the repeated edge is not counted) and whether it has
+    children beyond `max_depth`.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(reachable_edges_sql(), {"good": good_id, "max_depth": max_depth})
+        children = defaultdict(list)
+        for parent, child, quantity in cursor.fetchall():
+            children[parent].append((child, quantity))
+    component = components(good_id, children)
+
+    rows = {}
+
+    def row(sub_good_id, depth):
+        r = rows.setdefault(
+            sub_good_id,
+            {
+                "good": sub_good_id,
+                "quantity": 0.0,
+                "min_depth": depth,
+                "max_depth": depth,
+                "paths": 0,
+                "cycle": False,
+                "truncated": False,
+            },
+        )
+        r["max_depth"] = max(r["max_depth"], depth)
+        return r
+
+    # frontier: (sub-good, sub-goods of its component on the path) ->
+    # (quantity, number of paths) at the current level
+    start = frozenset([good_id]) if component[good_id] else frozenset()
+    frontier = {(good_id, start): (1.0, 1)}
+    for depth in range(1, max_depth + 1):
+        following = {}
+        for (parent, visited), (quantity, paths) in frontier.items():
+            for child, edge_quantity in children.get(parent, ()):
+                if child in visited:
+                    row(child, depth)["cycle"] = True
+                    continue
+                if component[child] is None:
+                    state = (child, frozenset())
+                elif component[child] is component[parent]:
+                    state = (child, visited | {child})
+                else:
+                    state = (child, frozenset([child]))
+                q, n = following.get(state, (0.0, 0))
+                following[state] = (q + quantity * edge_quantity, n + paths)
+        for (child, _), (quantity, paths) in following.items():
+            r = row(child, depth)
+            r["quantity"] += quantity
+            r["paths"] += paths
+        frontier = following
+        if not frontier:
+            break
+    else:
+        for sub_good_id, _ in frontier:
+            rows[sub_good_id]["truncated"] = sub_good_id in children
+
+    names = Good.objects.filter(pk__in=rows).values_list(
+        "pk", "name", "reference_unit__symbol"
+    )
+    for pk, name, symbol in names:
+        rows[pk]["name"] = name
+        rows[pk]["unit"] = symbol
+    results = sorted(rows.values(), key=lambda r: (r["min_depth"], r["good"]))
+    return [
+        {
+            key: r[key]
+            for key in (
+                "good",
+                "name",
+                "unit",
+                "quantity",
+                "min_depth",
+                "max_depth",
+                "paths",
+                "cycle",
+                "truncated",
+            )
+        }
+        for r in results
+    ]
@@ -0,0 +1,259 @@
+import itertools
+import json
+import math
+import os
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.scenarios import (
+    CompiledSpace,
+    generate,
+    generate_dfs,
+    generate_from_whitelists,
+    generate_planned,
+    planned_space,
+)
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, "benchmarks", "scenarios.json")
+
+# Stored by --save: the speed-up is measured against the DFS engine in the
+# same run, so a baseline recorded on one machine holds on another.
+BASELINE_FIELDS = ("produced", "nodes", "speedup")
+
+# Shortest timed run: faster scenarios are repeated within a run.
+MIN_RUN_SECONDS = 0.05
+
+ENGINES = {
+    "compiled": generate,
+    "planned": generate_planned,
+    "whitelists": generate_from_whitelists,
+    "dfs": generate_dfs,
+}
+
+# ---------------------------
+# Helpers
+# ---------------------------
+
+
+def build_scenario(dims, modalities, n_whitelists, n_blacklists, rule_size, seed=0):
+    """
+    Deterministic benchmark space: `dims` dimensions of `modalities` values
+    and random rules fixing `rule_size` dimensions each (the larger, the more
+    selective a whitelist and the rarer a blacklist hit).
+    """
+    rng = random.Random(f"{seed}-{dims}-{modalities}-{n_whitelists}-{n_blacklists}")
+    values = [f"M{i}" for i in range(modalities)]
+    domains = [list(values) for _ in range(dims)]
+
+    def rule():
+        picked = rng.sample(range(dims), min(rule_size, dims))
+        return {d: rng.choice(values) for d in sorted(picked)}
+
+    whitelists = [rule() for _ in range(n_whitelists)]
+    blacklists = [rule() for _ in range(n_blacklists)]
+    return domains, whitelists, blacklists
+
+
+def expanded_nodes(engine, domains, whitelists, blacklists):
+    """
+    Nodes the DFS expands over the full space (sum of the live prefixes at
+    each depth), computed without enumerating. None for the whitelists
+    engine, which builds assignments from the rules instead of walking the
+    tree of prefixes.
+    """
+    if engine == "whitelists":
+        return None
+    if engine == "planned":
+        space = planned_space(domains, whitelists, blacklists)
+    else:
+        space = CompiledSpace(domains, whitelists, blacklists)
+    return sum(space.live_prefixes())
+
+
+def timed(gen, domains, whitelists, blacklists, limit, loops):
+    """
+    Time per pass, time to first result and results produced by one run of
+    `loops` passes: short scenarios are passed over several times per run
+    (like timeit) so that timer resolution doesn't dominate.
+    """
+    start = time.perf_counter()
+    first = None
+    for _ in range(loops):
+        produced = 0
+        for _ in itertools.islice(gen(domains, whitelists, blacklists), limit):
+            if first is None:
+                first = time.perf_counter() - start
+            produced += 1
+    return (time.perf_counter() - start) / loops, first, produced
+
+
+def run_scenario(engine, domains, whitelists, blacklists, limit, repeat):
+    gen = ENGINES[engine]
+    args = (domains, whitelists, blacklists, limit)
+    # The DFS reference runs on the same machine in the same process: the
+    # ratio is what the baseline stores, absolute rates don't travel. Each
+    # run of the engine is paired with one of the DFS, and the median of the
+    # paired ratios is kept: a lucky run skews a ratio of minimums.
+    gens = {engine: gen, "dfs": generate_dfs}
+    loops = dict.fromkeys(gens, 1)
+    elapsed = first = None
+    ratios = []
+    for _ in range(repeat):
+        run = {}
+        for name, g in gens.items():
+            run[name], run_first, run_produced = timed(g, *args, loops[name])
+            loops[name] = max(
+                loops[name], math.ceil(MIN_RUN_SECONDS / max(run[name], 1e-6))
+            )
+            if name != engine:
+                continue
+            produced = run_produced
+            # Best of `repeat` runs: the minimum is the least noisy estimate.
+            if elapsed is None or run[name] < elapsed:
+                elapsed = run[name]
+            if run_first is not None and (first is None or run_first < first):
+                first = run_first
+        if run[engine] > 0:
+            ratios.append(run["dfs"] / run[engine])
+
+    # Separate pass: tracemalloc slows allocation-heavy code down noticeably.
+    tracemalloc.start()
+    for _ in itertools.islice(gen(domains, whitelists, blacklists), limit):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "produced": produced,
+        "seconds": elapsed,
+        "per_second": produced / elapsed if elapsed > 0 else None,
+        "first_result_seconds": first,
+        "speedup": statistics.median(ratios) if ratios else None,
+        "nodes": expanded_nodes(engine, domains, whitelists, blacklists),
+        "peak_memory_bytes": peak,
+    }
+
+
+# ---------------------------
+# Command
+# ---------------------------
+
+
+class Command(BaseCommand):
+    help = "Benchmark the scenario combination generator against stored baselines"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--engine", choices=sorted(ENGINES), default="compiled", help="Generator"
+        )
+        parser.add_argument("--dims", type=int, nargs="+", default=[4, 6])
+        parser.add_argument("--modalities", type=int, nargs="+", default=[10, 50])
+        parser.add_argument("--whitelists", type=int, nargs="+", default=[0, 5])
+        parser.add_argument("--blacklists", type=int, nargs="+", default=[0, 10])
+        parser.add_argument(
+            "--rule-size",
+            type=int,
+            nargs="+",
+            default=[1, 2],
+            help="Dimensions fixed by each rule (rule selectivity)",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=50_000,
+            help="Assignments consumed per scenario (throughput is measured on them)",
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per scenario")
+        parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+        parser.add_argument(
+            "--save", action="store_true", help="Write results as the new baseline"
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed relative drop of the speed-up over the DFS engine",
+        )
+        parser.add_argument("--json", action="store_true", help="JSON output")
+
+    def handle(self, *args, **opts):
+        engine = opts["engine"]
+        grid = itertools.product(
+            opts["dims"],
+            opts["modalities"],
+            opts["whitelists"],
+            opts["blacklists"],
+            opts["rule_size"],
+        )
+
+        results = {}
+        for dims, modalities, n_wl, n_bl, rule_size in grid:
+            key = f"{engine}/d{dims}-m{modalities}-wl{n_wl}-bl{n_bl}-r{rule_size}"
+            scenario = build_scenario(dims, modalities, n_wl, n_bl, rule_size)
+            results[key] = run_scenario(
+                engine, *scenario, opts["limit"], opts["repeat"]
+            )
+            if not opts["json"]:
+                r = results[key]
+                first = r["first_result_seconds"]
+                self.stdout.write(
+                    f"{key:<42} {r['produced']:>8} results "
+                    f"{r['per_second'] or 0:>12,.0f}/s "
+                    f"first {first * 1000 if first is not None else float('nan'):>8.2f} ms "
+                    f"x{r['speedup'] or 0:>6.2f} vs dfs "
+                    f"nodes {r['nodes'] if r['nodes'] is not None else '-':>10} "
+                    f"peak {r['peak_memory_bytes'] / 1024:>8.0f} KiB"
+                )
+
+        baseline = {}
+        if os.path.exists(opts["baseline"]):
+            with open(opts["baseline"]) as fh:
+                baseline = json.load(fh)
+
+        regressions = []
+        for key, r in results.items():
+            ref = baseline.get(key)
+            if not ref:
+                continue
+            # Expanded nodes are machine independent: any increase is a change
+            # in pruning. The speed-up over the DFS is noisy and only flagged
+            # past tolerance.
+            if None not in (r["nodes"], ref.get("nodes")) and r["nodes"] > ref["nodes"]:
+                regressions.append(f"{key}: nodes {ref['nodes']} -> {r['nodes']}")
+            if ref.get("speedup") and r["speedup"]:
+                drop = 1 - r["speedup"] / ref["speedup"]
+                if drop > opts["tolerance"]:
+                    regressions.append(
+                        f"{key}: speed-up over dfs x{ref['speedup']:.2f} -> "
+                        f"x{r['speedup']:.2f} (-{drop:.0%})"
+                    )
+
+        if opts["json"]:
+            self.stdout.write(
+                json.dumps({"results": results, "regressions": regressions}, indent=2)
+            )
+
+        if opts["save"]:
+            # Only the machine-independent figures make a shareable baseline.
+            baseline.update(
+                {
+                    key: {field: r[field] for field in BASELINE_FIELDS}
+                    for key, r in results.items()
+                }
+            )
+            os.makedirs(os.path.dirname(opts["baseline"]), exist_ok=True)
+            with open(opts["baseline"], "w") as fh:
+                json.dump(baseline, fh, indent=2, sort_keys=True)
+                fh.write("\n")
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved: {opts['baseline']}"))
+            return
+
+        if regressions:
+            raise CommandError("Regressions:\n  " + "\n  ".join(regressions))
+        if baseline:
+            self.stdout.write(self.style.SUCCESS("No regression against baseline."))
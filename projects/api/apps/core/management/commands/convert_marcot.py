@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.marcot import COLUMNAR_FORMATS, convert_workbook
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert a Marcot XLSX template into a directory of per-sheet "
+        "Parquet or CSV files, importable with import_marcot"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", type=str, help="Path to .xlsx file")
+        parser.add_argument("directory", type=str, help="Output directory")
+        parser.add_argument(
+            "--format",
+            choices=COLUMNAR_FORMATS,
+            default="parquet",
+            help="Columnar format of the sheet files",
+        )
+
+    def handle(self, *args, **opts):
+        start = time.perf_counter()
+        try:
+            written = convert_workbook(
+                opts["file"], opts["directory"], fmt=opts["format"]
+            )
+        except ImportError:
+            raise CommandError("Columnar formats require pyarrow.")
+
+        for sheet, rows in written.items():
+            self.stdout.write(f"{sheet:<22} {rows:>8} rows")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Converted {len(written)} sheets to {opts['format']} in "
+                f"{time.perf_counter() - start:.2f}s."
+            )
+        )
@@ -1,11 +1,15 @@
-import math
-import re
-from collections import defaultdict
+import concurrent.futures
+import json
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from itertools import islice
 
-from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils.text import capfirst
 
-from openpyxl import load_workbook
+import numpy as np
 
 from apps.core.models import (
     Project,
@@ -21,52 +25,286 @@ from apps.core.models import (
     EconomicFlow,
     ElementaryFlowCompartment,
 )
+from apps.core.marcot import (
+    PARSERS,
+    ProcessIndex,
+    Validator,
+    check_compartment_row,
+    check_cons_permol_row,
+    check_lay_goods_row,
+    check_tr_row,
+    find_trans,
+    lay_trans_row_error,
+    norm,
+    open_source,
+    parse_sheet,
+    tr_row_key,
+    unit_symbol,
+)
+from apps.core.matrices import bump_data_version
 
 # ---------------------------
 # Helpers
 # ---------------------------
 
 
-def norm(s: str) -> str:
-    if s is None:
-        return ""
-    return re.sub(r"\s+", " ", str(s)).strip().lower()
+def reset_peak_rss():
+    """
+    Reset the kernel's peak RSS counter (Linux only) so the next reading
+    covers what happened since. Elsewhere the peak stays process-wide.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
 
 
-def as_float(x):
-    if x is None:
-        return None
-    if isinstance(x, (int, float)):
-        if isinstance(x, float) and (math.isnan(x) or math.isinf(x)):
-            return None
-        return float(x)
+def peak_rss_mb():
+    """Peak resident set size of this process, in MiB."""
     try:
-        x = str(x).strip()
-        if x == "":
-            return None
-        return float(x)
-    except Exception:
-        return None
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource  # Unix only, hence the late import
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def copy_insert(model, objs):
+    """
+    Insert unsaved model instances with PostgreSQL COPY.
+    COPY does not return primary keys: only use it for rows nothing refers to.
+    """
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ", ".join(connection.ops.quote_name(f.column) for f in fields)
+    with connection.cursor() as cursor:
+        with cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+            for obj in objs:
+                copy.write_row(
+                    [
+                        f.get_db_prep_save(getattr(obj, f.attname), connection)
+                        for f in fields
+                    ]
+                )
 
 
-def iter_rows_as_dict(ws, header_row=1):
+class ImportReport:
     """
-    Yield dict rows based on the header row.
-    Skips entirely-empty rows.
+    Per-sheet row counts and timings, plus peak RSS when profiling memory.
+
+    `totals` maps each sheet to import to its row count as declared by the
+    workbook (an estimate, used for percentages). When a `progress` callable
+    is given it receives a snapshot() at each sheet boundary and every
+    `every` rows within a sheet.
+
+    With `stats`, time is also split per stage: "parse" (reading rows from
+    the source), "lookup" (resolving ids and get_or_create, the default while
+    a sheet loads) and "write" (INSERTs, upserts and deletes). Queries are
+    counted and timed in the stage that issued them while the report is
+    installed with connection.execute_wrapper().
     """
-    headers = []
-    for cell in ws[header_row]:
-        headers.append(cell.value)
 
-    # Keep only columns that have a non-empty header
-    idxs = [i for i, h in enumerate(headers) if h not in (None, "")]
-    clean_headers = [headers[i] for i in idxs]
+    STAGES = ("parse", "lookup", "write")
+
+    def __init__(
+        self, profile_memory=False, totals=None, progress=None, every=1000, stats=False
+    ):
+        self.profile_memory = profile_memory or stats
+        self.totals = totals or {}
+        self.progress = progress
+        self.every = every
+        self.stats = stats
+        self.sheets = []
+        self.current = None
+        self.stage_name = None
+        self.stage_start = None
+        # Work done outside of any sheet: opening the source, project setup
+        self.setup = {"seconds": 0.0, "queries": 0, "query_seconds": 0.0}
+
+    @contextmanager
+    def sheet(self, name):
+        stats = {"sheet": name, "rows": 0, "skipped": 0, "written": 0, "seconds": 0.0}
+        if self.stats:
+            stats["stages"] = {
+                stage: {"seconds": 0.0, "queries": 0, "query_seconds": 0.0}
+                for stage in self.STAGES
+            }
+        if self.profile_memory:
+            reset_peak_rss()
+        self.current = (stats, time.perf_counter())
+        self.notify()
+        self.switch("lookup")
+        try:
+            yield stats
+        finally:
+            self.switch(None)
+            stats["seconds"] = time.perf_counter() - self.current[1]
+            if self.profile_memory:
+                stats["peak_rss_mb"] = peak_rss_mb()
+            self.current = None
+            self.sheets.append(stats)
+            self.notify()
+
+    def switch(self, stage):
+        """Charge the time since the last switch to the current stage."""
+        if not self.stats:
+            return None
+        now = time.perf_counter()
+        previous = self.stage_name
+        if previous and self.current:
+            self.current[0]["stages"][previous]["seconds"] += now - self.stage_start
+        self.stage_name, self.stage_start = stage, now
+        return previous
+
+    @contextmanager
+    def stage(self, name):
+        """Attribute the time spent in the block to stage `name`."""
+        if not (self.stats and self.current):
+            yield
+            return
+        previous = self.switch(name)
+        try:
+            yield
+        finally:
+            self.switch(previous)
+
+    @contextmanager
+    def query(self):
+        """Count one query (or COPY) and its duration in the current stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.stats:
+                if self.current and self.stage_name:
+                    counters = self.current[0]["stages"][self.stage_name]
+                else:
+                    counters = self.setup
+                counters["queries"] += 1
+                counters["query_seconds"] += time.perf_counter() - start
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        with self.query():
+            return execute(sql, params, many, context)
+
+    def track(self, rows):
+        """Pass `rows` through, notifying progress every `every` rows."""
+        rows = iter(rows)
+        n = 0
+        while True:
+            # Parsing is lazy: pulling the next row is where it happens
+            with self.stage("parse"):
+                row = next(rows, StopIteration)
+            if row is StopIteration:
+                return
+            yield row
+            n += 1
+            if n % self.every == 0:
+                self.notify()
+
+    def notify(self):
+        if self.progress:
+            self.progress(self.snapshot())
+
+    def snapshot(self):
+        """JSON-serializable progress of every sheet, done or not."""
+        started = {s["sheet"]: s for s in self.sheets}
+        if self.current:
+            stats, start = self.current
+            stats["seconds"] = time.perf_counter() - start
+            started[stats["sheet"]] = stats
+
+        sheets = []
+        for name, total in self.totals.items():
+            s = started.get(name, {"rows": 0, "seconds": 0.0})
+            done = any(d["sheet"] == name for d in self.sheets)
+            if done:
+                percent = 100.0
+            elif total:
+                percent = min(100.0 * s["rows"] / total, 100.0)
+            else:
+                percent = 0.0
+            sheets.append(
+                {
+                    "sheet": name,
+                    "rows": s["rows"],
+                    "total": total,
+                    "seconds": s["seconds"],
+                    "rows_per_second": (
+                        s["rows"] / s["seconds"] if s["seconds"] > 0 else None
+                    ),
+                    "percent": percent,
+                    "done": done,
+                }
+            )
 
-    for row in ws.iter_rows(min_row=header_row + 1, values_only=True):
-        vals = [row[i] for i in idxs]
-        if all(v is None or str(v).strip() == "" for v in vals):
-            continue
-        yield dict(zip(clean_headers, vals))
+        # Overall percentage weighs sheets by their size
+        weight = sum(max(s["total"] or 0, s["rows"]) for s in sheets)
+        covered = sum(
+            max(s["total"] or 0, s["rows"]) * s["percent"] / 100.0 for s in sheets
+        )
+        return {
+            "sheet": self.current[0]["sheet"] if self.current else None,
+            "percent": 100.0 * covered / weight if weight else None,
+            "sheets": sheets,
+        }
+
+    def json(self):
+        """
+        JSON-serializable stats of every imported sheet. Each stage, each
+        sheet and the whole import get their query count, query time and
+        Python time (what remains once queries are taken out).
+        """
+
+        def split(counters):
+            counters["python_seconds"] = max(
+                counters["seconds"] - counters["query_seconds"], 0.0
+            )
+            return counters
+
+        sheets = []
+        for s in self.sheets:
+            s = dict(s)
+            if self.stats:
+                s["stages"] = {k: split(dict(v)) for k, v in s["stages"].items()}
+                s["queries"] = sum(v["queries"] for v in s["stages"].values())
+                s["query_seconds"] = sum(
+                    v["query_seconds"] for v in s["stages"].values()
+                )
+                split(s)
+            sheets.append(s)
+
+        setup = split(dict(self.setup))
+        total = {
+            key: setup[key] + sum(s.get(key, 0) for s in sheets)
+            for key in ("seconds", "queries", "query_seconds")
+        }
+        for key in ("rows", "skipped", "written"):
+            total[key] = sum(s[key] for s in sheets)
+        if self.profile_memory:
+            total["peak_rss_mb"] = max(
+                (s["peak_rss_mb"] for s in sheets), default=peak_rss_mb()
+            )
+        return {"setup": setup, "sheets": sheets, "total": split(total)}
+
+    def write(self, stdout):
+        mem = " {:>12}".format("peak RSS MiB") if self.profile_memory else ""
+        stdout.write(f"{'sheet':<22} {'rows':>8} {'written':>8} {'seconds':>9}{mem}")
+        for s in self.sheets:
+            mem = f" {s['peak_rss_mb']:>12.1f}" if self.profile_memory else ""
+            stdout.write(
+                f"{s['sheet']:<22} {s['rows']:>8} {s['written']:>8} {s['seconds']:>9.3f}{mem}"
+            )
+        total = sum(s["seconds"] for s in self.sheets)
+        stdout.write(f"{'total':<22} {'':>8} {'':>8} {total:>9.3f}")
 
 
 # ---------------------------
@@ -77,575 +315,850 @@ def iter_rows_as_dict(ws, header_row=1):
 class Command(BaseCommand):
     help = "Import Marcot XLSX template into DB"
 
+    # Passed by the import_workbook task through call_command: a callable
+    # receiving ImportReport snapshots.
+    stealth_options = ("progress",)
+
+    # Import order matters: later sheets resolve ids created by earlier ones.
+    SHEETS = [
+        "l_cons",
+        "l_trans",
+        "l_goods",
+        "l_act",
+        "cons_permol",
+        "lay_trans",
+        "lay_goods",
+        "tr",
+        "background_biosphere",
+    ]
+
     def add_arguments(self, parser):
-        parser.add_argument("file", type=str, help="Path to .xlsx file")
         parser.add_argument(
-            "--dry-run", action="store_true", help="Parse without writing"
+            "file",
+            type=str,
+            help="Path to .xlsx file, or to a directory of per-sheet .parquet/.csv files",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Run the whole import, then roll it back",
+        )
+        parser.add_argument(
+            "--validate",
+            action="store_true",
+            help="Only check the file and list every error, without using the database "
+            "(the whole file is still parsed)",
         )
         parser.add_argument("--verbose", action="store_true", help="Verbose output")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows per bulk INSERT statement. Link sheets are written in chunks of "
+            "max(--batch-size, --copy-threshold) rows",
+        )
+        parser.add_argument(
+            "--copy-threshold",
+            type=int,
+            default=5000,
+            help="Use PostgreSQL COPY for link tables with at least this many rows (0 disables)",
+        )
+        parser.add_argument(
+            "--profile-memory",
+            action="store_true",
+            help="Report peak RSS per sheet",
+        )
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="Print a JSON report of rows, queries, query/Python time and peak RSS "
+            "per sheet and stage (parse, lookup, write) instead of the timing table",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=0,
+            help="Parse sheets concurrently in this many processes (0: sequential, streaming)",
+        )
+        parser.add_argument(
+            "--project",
+            type=int,
+            help="Update this existing project in place instead of creating a new one",
+        )
 
-    @transaction.atomic
     def handle(self, *args, **opts):
-        path = opts["file"]
-        dry = opts["dry_run"]
-        verbose = opts["verbose"]
+        if opts["validate"]:
+            return self.validate(opts["file"])
+
+        self.report = ImportReport(
+            profile_memory=opts["profile_memory"],
+            progress=opts.get("progress"),
+            stats=opts["stats"],
+        )
+        # With --stats every query goes through the report to be counted
+        with (
+            connection.execute_wrapper(self.report) if opts["stats"] else nullcontext()
+        ):
+            self.run_import(opts["file"], opts)
+        if opts["stats"]:
+            # One line, last, so it can be picked out of the command's output
+            self.stdout.write(json.dumps(self.report.json()))
+
+    def validate(self, path):
+        wb = open_source(path)
+        try:
+            sheets = [sheet for sheet in self.SHEETS if sheet in wb.sheetnames]
+            issues = Validator().run(wb, sheets)
+        finally:
+            wb.close()
+
+        for issue in issues:
+            style = (
+                self.style.ERROR if issue["level"] == "error" else self.style.WARNING
+            )
+            self.stdout.write(style(f"[{issue['sheet']}] {issue['message']}"))
+        errors = sum(issue["level"] == "error" for issue in issues)
+        warnings = len(issues) - errors
+        if errors:
+            raise CommandError(
+                f"Validation failed: {errors} error(s), {warnings} warning(s)"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Validation passed ({warnings} warning(s)).")
+        )
 
-        wb = load_workbook(path, data_only=True)
+    @transaction.atomic
+    def run_import(self, path, opts):
+        report = self.report
+        setup_start = time.perf_counter()
+        dry = opts["dry_run"]
+        self.verbose = opts["verbose"]
+        self.batch_size = opts["batch_size"]
+        self.copy_threshold = opts["copy_threshold"]
+
+        # Workbooks are opened read-only so rows are streamed from the archive
+        # instead of every cell being built in memory up front; columnar
+        # directories are read in record batches.
+        wb = open_source(path)
+        sheets = [sheet for sheet in self.SHEETS if sheet in wb.sheetnames]
+        # Declared sheet dimensions, for progress percentages
+        report.totals = {
+            sheet: max((wb[sheet].max_row or 1) - 1, 0) for sheet in sheets
+        }
 
         # --- caches ---
-        dim_by_name = {}
-        unit_by_symbol = {}
-        conserved_by_extid = {}  # maps consId -> ConservedEntity
-        trans_by_extid = {}  # maps id -> TransformableEntity
-        good_by_extid = {}  # maps productId -> Good
-        proc_by_actid = {}  # maps activityId -> Process
+        self.dim_by_name = {}
+        self.unit_by_symbol = {}
+        self.conserved_by_extid = {}  # maps consId -> ConservedEntity
+        self.trans_by_extid = {}  # maps id -> TransformableEntity
+        self.good_by_extid = {}  # maps productId -> Good
+        self.proc_by_actid = {}  # maps activityId -> Process
 
         # Also build activity-name matching for the "tr" sheet (which uses labels)
-        proc_by_norm_name = {}
-
-        def get_dimension(project, name):
-            key = norm(name)
-            if not key:
-                key = "unknown"
-                name = "unknown"
-            if key in dim_by_name:
-                return dim_by_name[key]
-
-            obj, created = Dimension.objects.get_or_create(
-                project=project,
-                name=str(name).strip(),
-            )
+        self.proc_by_norm_name = {}
 
-            if verbose and created:
-                print("  -| Creating Dimension:", name)
+        # model verbose_name_plural -> [inserted, updated, deleted, unchanged]
+        self.changes = {}
 
-            dim_by_name[key] = obj
-            return obj
+        # -------------------------
+        # Prepare project
+        # -------------------------
+        if opts["project"] is not None:
+            try:
+                self.project = Project.objects.get(pk=opts["project"])
+            except Project.DoesNotExist:
+                wb.close()
+                raise CommandError(f"Project {opts['project']} does not exist")
+            print(f"Updating project '{self.project.name}'...")
+        else:
+            print("Creating new project...")
+            self.project = Project.objects.create(name="New Imported Project")
+
+        # Each sheet goes through the same stages: parse rows into plain
+        # tuples, resolve external ids against the caches (raising on invalid
+        # rows), then write everything with bulk INSERTs.
+        #
+        # Sequentially, each sheet is parsed lazily while it loads. With
+        # --workers, every sheet is parsed up front in a process pool (parsing
+        # needs no ids) while loading still happens here in dependency order,
+        # waiting only for the sheet it needs next.
+        report.setup["seconds"] += time.perf_counter() - setup_start
+        executor = None
+        try:
+            if opts["workers"] > 0:
+                wb.close()
+                executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=min(opts["workers"], len(sheets) or 1)
+                )
+                parsed = {
+                    sheet: executor.submit(parse_sheet, path, sheet) for sheet in sheets
+                }
 
-        def get_unit(project, symbol, dimension_name=None):
-            sym = str(symbol).strip() if symbol else ""
-            if not sym:
-                sym = "1"  # fallback symbol for dimensionless-ish
-            key = norm(sym)
-            if key in unit_by_symbol:
-                return unit_by_symbol[key]
+            for sheet in sheets:
+                with report.sheet(sheet) as stats:
+                    if executor:
+                        with report.stage("parse"):
+                            rows = parsed[sheet].result()
+                    else:
+                        rows = PARSERS[sheet](wb[sheet])
+                    getattr(self, f"load_{sheet}")(report.track(rows), stats)
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+            # Read-only workbooks keep the file open until closed
+            wb.close()
+
+        if any(any(counts[:3]) for counts in self.changes.values()):
+            # Bulk writes send no signals: invalidate cached matrices here
+            bump_data_version(pk=self.project.pk)
+
+        if dry:
+            # If dry-run, rollback the whole transaction
+            print("Dry-run complete (rolling back).")
+            transaction.set_rollback(True)
 
-            dim = get_dimension(project, dimension_name or "unknown")
+        if not opts["stats"]:
+            report.write(self.stdout)
+        self.write_changes()
+        self.stdout.write(self.style.SUCCESS("Import complete."))
 
-            # Use symbol as name if not provided elsewhere
-            obj, created = Unit.objects.get_or_create(
-                symbol=sym,
-                defaults={"name": sym, "dimension": dim},
+    def write_changes(self):
+        self.stdout.write("Changes:")
+        for label, (inserted, updated, deleted, unchanged) in self.changes.items():
+            self.stdout.write(
+                f"  {label}: {inserted} inserted, {updated} updated, "
+                f"{deleted} deleted, {unchanged} unchanged"
             )
 
-            if verbose and created:
-                print("  -| Creating Unit:", sym, "| Dimension:", dim.name)
+    # -------------------------
+    # Lookups
+    # -------------------------
+
+    def get_dimension(self, name):
+        key = norm(name)
+        if not key:
+            key = "unknown"
+            name = "unknown"
+        if key in self.dim_by_name:
+            return self.dim_by_name[key]
+
+        obj, created = Dimension.objects.get_or_create(
+            project=self.project,
+            name=str(name).strip(),
+        )
 
-            # Ensure dimension is set (in case it existed but wrong/empty)
-            if obj.dimension_id != dim.id:
-                obj.dimension = dim
-                obj.save(update_fields=["dimension"])
+        if self.verbose and created:
+            print("  -| Creating Dimension:", name)
 
-            unit_by_symbol[key] = obj
-            return obj
+        self.dim_by_name[key] = obj
+        return obj
 
-        # -------------------------
-        # Prepare new project
-        # -------------------------
-        print("Creating new project...")
-        project = Project.objects.create(name="New Imported Project")
+    def get_unit(self, symbol, dimension_name=None):
+        sym = unit_symbol(symbol)
+        key = norm(sym)
+        if key in self.unit_by_symbol:
+            return self.unit_by_symbol[key]
 
-        # -------------------------
-        # l_cons: conserved entities + units
-        # -------------------------
-        if "l_cons" in wb.sheetnames:
-            print("Importing conserved entities...")
-
-            ws = wb["l_cons"]
-            for r in iter_rows_as_dict(ws):
-                extid = r.get("consId")
-                name = r.get("name")
-                dim_name = r.get("dimension")
-                unit_sym = r.get("unit")
-                molar_mass = r.get("Molar mass [g/mol]")
-
-                if not extid or not name:
-                    continue
+        dim = self.get_dimension(dimension_name or "unknown")
 
-                if verbose:
-                    print(
-                        "-| Detected ConservedEntity:",
-                        name,
-                        "(ID:",
-                        extid,
-                        ")",
-                        "| molar mass:",
-                        molar_mass,
-                        "g/mol",
+        # Use symbol as name if not provided elsewhere
+        obj, created = Unit.objects.get_or_create(
+            symbol=sym,
+            defaults={"name": sym, "dimension": dim},
+        )
+
+        if self.verbose and created:
+            print("  -| Creating Unit:", sym, "| Dimension:", dim.name)
+
+        # Ensure dimension is set (in case it existed but wrong/empty)
+        if obj.dimension_id != dim.id:
+            obj.dimension = dim
+            obj.save(update_fields=["dimension"])
+
+        self.unit_by_symbol[key] = obj
+        return obj
+
+    def write(self, model, objs, stats, copy=False):
+        """
+        Bulk insert `objs`. Large link tables (`copy=True`) go through COPY on
+        PostgreSQL; their primary keys are then left unset.
+        """
+        with self.report.stage("write"):
+            if (
+                copy
+                and self.copy_threshold
+                and connection.vendor == "postgresql"
+                and len(objs) >= self.copy_threshold
+            ):
+                # COPY bypasses execute wrappers
+                with self.report.query():
+                    copy_insert(model, objs)
+            else:
+                model.objects.bulk_create(objs, batch_size=self.batch_size)
+        stats["written"] += len(objs)
+
+    def sync(self, model, objs, stats, existing, key, fields, copy=False):
+        """
+        Make `existing` (a queryset) hold exactly `objs`, rows being matched
+        on the `key` fields. New rows are inserted, rows whose `fields` differ
+        are upserted, rows missing from `objs` are deleted and unchanged rows
+        are not written at all. Matched objects take the existing primary key.
+
+        `objs` may be a generator: it is written a chunk at a time, so besides
+        the existing rows only one chunk of new objects is held in memory.
+        """
+        opts = model._meta
+        key_attrs = [opts.get_field(f).attname for f in key]
+        field_attrs = [opts.get_field(f).attname for f in fields]
+
+        def key_of(obj):
+            return tuple(getattr(obj, a) for a in key_attrs)
+
+        with self.report.stage("write"):
+            current = {key_of(obj): obj for obj in existing.only(*key, *fields)}
+
+        counts = self.changes.setdefault(
+            capfirst(opts.verbose_name_plural), [0, 0, 0, 0]
+        )
+        # Chunks are large enough for COPY to kick in
+        objs = iter(objs)
+        size = max(self.batch_size, self.copy_threshold)
+        while chunk := list(islice(objs, size)):
+            with self.report.stage("write"):
+                new, changed = [], []
+                for obj in chunk:
+                    old = current.pop(key_of(obj), None)
+                    if old is None:
+                        new.append(obj)
+                        continue
+                    obj.pk = old.pk
+                    if any(getattr(obj, a) != getattr(old, a) for a in field_attrs):
+                        changed.append(obj)
+
+                self.write(model, new, stats, copy=copy)
+                if changed:
+                    model.objects.bulk_create(
+                        changed,
+                        batch_size=self.batch_size,
+                        update_conflicts=True,
+                        unique_fields=key,
+                        update_fields=fields,
                     )
+                    stats["written"] += len(changed)
+            counts[0] += len(new)
+            counts[1] += len(changed)
+            counts[3] += len(chunk) - len(new) - len(changed)
+
+        with self.report.stage("write"):
+            if current:
+                model.objects.filter(
+                    pk__in=[obj.pk for obj in current.values()]
+                ).delete()
+        counts[2] += len(current)
+
+    # -------------------------
+    # l_cons: conserved entities + units
+    # -------------------------
+
+    def load_l_cons(self, rows, stats):
+        print("Importing conserved entities...")
+
+        parsed = []
+        for extid, name, dim_name, unit_sym, molar_mass in rows:
+            stats["rows"] += 1
+            if not extid or not name:
+                stats["skipped"] += 1
+                continue
+            parsed.append((str(extid).strip(), name, dim_name, unit_sym, molar_mass))
+
+        objs = []
+        for extid, name, dim_name, unit_sym, molar_mass in parsed:
+            if self.verbose:
+                print(
+                    "-| Detected ConservedEntity:",
+                    name,
+                    "(ID:",
+                    extid,
+                    ")",
+                    "| molar mass:",
+                    molar_mass,
+                    "g/mol",
+                )
 
-                get_unit(project, unit_sym, dim_name)
-                obj = ConservedEntity.objects.create(
-                    project=project,
+            self.get_unit(unit_sym, dim_name)
+            objs.append(
+                ConservedEntity(
+                    project=self.project,
                     name=str(name).strip(),
-                    short_name=str(extid).strip(),
+                    short_name=extid,
                     molar_mass=molar_mass,
+                    external_id=extid,
                 )
-                conserved_by_extid[str(extid).strip()] = obj
-
-        # -------------------------
-        # l_trans: transformable entities + units
-        # -------------------------
-        if "l_trans" in wb.sheetnames:
-            ws = wb["l_trans"]
-            for r in iter_rows_as_dict(ws):
-                extid = r.get("id")
-                name = r.get("name")
-                dim_name = r.get("reference_property")
-                unit_sym = r.get("unit")
-
-                if not extid or not name:
-                    continue
-
-                if verbose:
-                    print("-| Detected TransformableEntity:", name, "(ID:", extid, ")")
+            )
 
-                get_unit(project, unit_sym, dim_name)
-                obj = TransformableEntity.objects.create(
-                    project=project,
+        self.sync(
+            ConservedEntity,
+            objs,
+            stats,
+            existing=ConservedEntity.objects.filter(
+                project=self.project, external_id__isnull=False
+            ),
+            key=["project", "external_id"],
+            fields=["name", "short_name", "molar_mass"],
+        )
+        for (extid, *_), obj in zip(parsed, objs):
+            self.conserved_by_extid[extid] = obj
+
+    # -------------------------
+    # l_trans: transformable entities + units
+    # -------------------------
+
+    def load_l_trans(self, rows, stats):
+        parsed = []
+        for extid, name, dim_name, unit_sym in rows:
+            stats["rows"] += 1
+            if not extid or not name:
+                stats["skipped"] += 1
+                continue
+            parsed.append((str(extid).strip(), name, dim_name, unit_sym))
+
+        objs = []
+        for extid, name, dim_name, unit_sym in parsed:
+            if self.verbose:
+                print("-| Detected TransformableEntity:", name, "(ID:", extid, ")")
+
+            self.get_unit(unit_sym, dim_name)
+            objs.append(
+                TransformableEntity(
+                    project=self.project,
                     name=str(name).strip(),
-                    short_name=str(extid).strip(),
+                    short_name=extid,
+                    external_id=extid,
                 )
-                trans_by_extid[str(extid).strip()] = obj
-
-        # -------------------------
-        # l_goods: goods + reference_unit
-        # -------------------------
-        if "l_goods" in wb.sheetnames:
-            ws = wb["l_goods"]
-            for r in iter_rows_as_dict(ws):
-                pid = r.get("productId")
-                name = r.get("name")
-                dim_name = r.get("reference_property")
-                unit_sym = r.get("unit")
-                if not pid or not name:
-                    continue
-
-                if verbose:
-                    print("-| Detected Good:", name, "(ID:", pid, ")")
+            )
 
-                u = get_unit(project, unit_sym, dim_name)
-                obj = Good.objects.create(
-                    project=project,
+        self.sync(
+            TransformableEntity,
+            objs,
+            stats,
+            existing=TransformableEntity.objects.filter(
+                project=self.project, external_id__isnull=False
+            ),
+            key=["project", "external_id"],
+            fields=["name", "short_name"],
+        )
+        for (extid, *_), obj in zip(parsed, objs):
+            self.trans_by_extid[extid] = obj
+
+    # -------------------------
+    # l_goods: goods + reference_unit
+    # -------------------------
+
+    def load_l_goods(self, rows, stats):
+        parsed = []
+        for pid, name, dim_name, unit_sym in rows:
+            stats["rows"] += 1
+            if not pid or not name:
+                stats["skipped"] += 1
+                continue
+            parsed.append((str(pid).strip(), name, dim_name, unit_sym))
+
+        objs = []
+        for pid, name, dim_name, unit_sym in parsed:
+            if self.verbose:
+                print("-| Detected Good:", name, "(ID:", pid, ")")
+
+            u = self.get_unit(unit_sym, dim_name)
+            objs.append(
+                Good(
+                    project=self.project,
                     name=str(name).strip(),
                     reference_unit=u,
+                    external_id=pid,
                 )
+            )
 
-                good_by_extid[str(pid).strip()] = obj
-
-        # -------------------------
-        # l_act: processes
-        # -------------------------
-        if "l_act" in wb.sheetnames:
-            ws = wb["l_act"]
-            for r in iter_rows_as_dict(ws):
-                actid = r.get("activityId")
-                name = r.get("name")
-                location = r.get("location")  # TODO: Add location handling
-
-                if not actid or not name:
-                    continue
-
-                if verbose:
-                    print("-| Detected Process:", name, "(ID:", actid, ")")
-
-                obj = Process.objects.create(project=project, name=str(name).strip())
-                proc_by_actid[str(actid).strip()] = obj
-                proc_by_norm_name[norm(name)] = obj
-
-        # -------------------------
-        # cons_permol: composition Transformable -> Conserved
-        # -------------------------
-        if "cons_permol" in wb.sheetnames:
-            ws = wb["cons_permol"]
-            mol_unit = get_unit(project, "mol", "amount")
-
-            # We map substance -> TransformableEntity by extid (preferred), otherwise by name
-            trans_by_name = {norm(t.name): t for t in TransformableEntity.objects.all()}
-            cons_by_name = {norm(c.name): c for c in ConservedEntity.objects.all()}
-
-            for r in iter_rows_as_dict(ws):
-                substance = r.get("substance")
-                element = r.get("element")
-                comp = as_float(r.get("molar composition"))
-                if not substance:
-                    raise Exception(
-                        f"Skipping cons_permol row due to missing substance: cons_permol -> {r}"
-                    )
-                if not element:
-                    raise Exception(
-                        f"Skipping cons_permol row due to missing element: cons_permol -> {r}"
-                    )
-                if comp is None:
-                    raise Exception(
-                        f"Skipping cons_permol row due to missing composition: cons_permol -> {r}"
-                    )
-
-                t = trans_by_extid.get(str(substance).strip())
-                c = conserved_by_extid.get(str(element).strip())
+        self.sync(
+            Good,
+            objs,
+            stats,
+            existing=Good.objects.filter(
+                project=self.project, external_id__isnull=False
+            ),
+            key=["project", "external_id"],
+            fields=["name", "reference_unit"],
+        )
+        for (pid, *_), obj in zip(parsed, objs):
+            self.good_by_extid[pid] = obj
+
+    # -------------------------
+    # l_act: processes
+    # -------------------------
+
+    def load_l_act(self, rows, stats):
+        parsed = []
+        for actid, name in rows:
+            stats["rows"] += 1
+            if not actid or not name:
+                stats["skipped"] += 1
+                continue
+            parsed.append((str(actid).strip(), name))
+
+        objs = []
+        for actid, name in parsed:
+            if self.verbose:
+                print("-| Detected Process:", name, "(ID:", actid, ")")
+
+            objs.append(
+                Process(project=self.project, name=str(name).strip(), external_id=actid)
+            )
 
-                if not t:
-                    raise Exception(
-                        f"Skipping cons_permol row due to not defined transformable entity: cons_permol -> {r}"
-                    )
-                if not c:
-                    raise Exception(
-                        f"Skipping cons_permol row due to not defined conserved entity: cons_permol -> {r}"
-                    )
+        self.sync(
+            Process,
+            objs,
+            stats,
+            existing=Process.objects.filter(
+                project=self.project, external_id__isnull=False
+            ),
+            key=["project", "external_id"],
+            fields=["name"],
+        )
+        for (actid, name), obj in zip(parsed, objs):
+            self.proc_by_actid[actid] = obj
+            self.proc_by_norm_name[norm(name)] = obj
+
+    # -------------------------
+    # cons_permol: composition Transformable -> Conserved
+    # -------------------------
+
+    def load_cons_permol(self, rows, stats):
+        mol_unit = self.get_unit("mol", "amount")
+
+        # We map substance -> TransformableEntity by extid
+        def links():
+            for substance, element, comp, r in rows:
+                stats["rows"] += 1
+                t, c = check_cons_permol_row(
+                    substance,
+                    element,
+                    comp,
+                    r,
+                    self.trans_by_extid,
+                    self.conserved_by_extid,
+                )
+                t, c = self.trans_by_extid[t], self.conserved_by_extid[c]
 
-                if verbose:
+                if self.verbose:
                     print(
                         "-| Linking TransformableEntity '{}' with ConservedEntity '{}' | ratio: {}".format(
                             t.name, c.name, comp
                         )
                     )
 
-                TransformableEntityContainConservedEntity.objects.create(
+                yield TransformableEntityContainConservedEntity(
                     transformable_entity=t,
                     conserved_entity=c,
                     unit=mol_unit,
                     ratio=comp,
                 )
 
-        # # -------------------------
-        # # cons: composition Transformable -> Conserved
-        # # -------------------------
-        # if "cons" in wb.sheetnames:
-        #     ws = wb["cons"]
-        #     rows = list(ws.values)
-
-        #     if not rows:
-        #         pass
-
-        #     else:
-        #         header = list(rows[0])
-        #         # header[0] is like "id", header[1:] are transformableIds
-        #         transformable_ids = [h for h in header[1:] if h not in (None, "")]
-        #         transformable_map = trans_by_extid.copy()
-
-        #         # Build transformable lookup
-        #         conservable_by_name = {
-        #             norm(c.name): c for c in ConservedEntity.objects.all()
-        #         }
-
-        #         for row in rows[1:]:
-        #             if not row or all(v is None for v in row):
-        #                 continue
-
-        #             conservable_key = row[0]
-        #             if not conservable_key:
-        #                 raise Exception(
-        #                     f"Skipping cons row due to missing conserved entity: cons -> {row}"
-        #                 )
-        #             conservable = conserved_by_extid.get(str(conservable_key).strip()) or conservable_by_name.get(
-        #                 norm(conservable_key)
-        #             )
-        #             if not conservable:
-        #                 raise Exception(
-        #                     f"Skipping cons row due to not defined conservable entity: cons -> {row}"
-        #                 )
-
-        #             for col_idx, pid in enumerate(transformable_ids, start=1):
-        #                 qty = as_float(row[col_idx] if col_idx < len(row) else None)
-        #                 if qty is None:
-        #                     # Quantity is None, so skip-it as is 0 / not present
-        #                     continue
-
-        #                 transformable = transformable_map.get(str(pid).strip())
-        #                 if not transformable:
-        #                     raise Exception(
-        #                         f"Skipping cons row due to not defined transformable: cons -> {row}"
-        #                     )
-
-        #                 # We want to report all the measure to 'mol' unit ?!
-        #                 molar_mass = conservable.molar_mass
-        #                 todo: find a way to store in Kg or to convert to mol
-
-        #                 u = transformable.reference_unit
-
-        #                 if verbose:
-        #                     print(
-        #                         "-| Linking TransformableEntity '{}' with ConservedEntity '{}' | quantity: {}".format(
-        #                             transformable.name, conservable.name, qty
-        #                         )
-        #                     )
-
-        #                 TransformableEntityContainConservedEntity.objects.create(
-        #                     transformable_entity=transformable,
-        #                     conserved_entity=conservable,
-        #                     unit=mol_unit,
-        #                     ratio=comp,
-        #                 )
-
-        # -------------------------
-        # lay_trans: Good contains Transformable
-        #    matrix: first column is transformable id/name, next columns are productIds
-        # -------------------------
-        if "lay_trans" in wb.sheetnames:
-            ws = wb["lay_trans"]
-            rows = list(ws.values)
-            if not rows:
-                pass
-            else:
-                header = list(rows[0])
-                # header[0] is like "id good", header[1:] are productIds
-                product_ids = [h for h in header[1:] if h not in (None, "")]
-                good_map = good_by_extid.copy()
-
-                # Build transformable lookup
-                trans_by_name = {
-                    norm(t.name): t for t in TransformableEntity.objects.all()
-                }
+        self.sync(
+            TransformableEntityContainConservedEntity,
+            links(),
+            stats,
+            existing=TransformableEntityContainConservedEntity.objects.filter(
+                transformable_entity__project=self.project,
+                transformable_entity__external_id__isnull=False,
+            ),
+            key=["transformable_entity", "conserved_entity"],
+            fields=["unit", "ratio"],
+            copy=True,
+        )
 
-                for row in rows[1:]:
-                    if not row or all(v is None for v in row):
-                        continue
-                    trans_key = row[0]
-                    if not trans_key:
-                        raise Exception(
-                            f"Skipping lay_trans row due to missing transformable entity: lay_trans -> {row}"
-                        )
-                    t = trans_by_extid.get(str(trans_key).strip()) or trans_by_name.get(
-                        norm(trans_key)
-                    )
+    # -------------------------
+    # lay_trans: Good contains Transformable
+    #    matrix: first column is transformable id/name, next columns are productIds
+    # -------------------------
+
+    def load_lay_trans(self, blocks, stats):
+        # Name fallback for the transformables of this import
+        trans_by_name = {norm(t.name): t for t in self.trans_by_extid.values()}
+
+        def links():
+            goods = None
+            for product_ids, keys, rows, row_idx, col_idx, quantities, _ in blocks:
+                stats["rows"] += len(keys)
+                # Rows without any quantity
+                stats["skipped"] += len(keys) - len(np.unique(row_idx))
+                if goods is None:
+                    goods = [
+                        self.good_by_extid.get(str(pid).strip()) for pid in product_ids
+                    ]
+                    undefined_good = np.array([g is None for g in goods], dtype=bool)
+
+                # Bulk validation: find the first row (in sheet order) with an
+                # error; a bad key is reported before the row's cells.
+                trans = []
+                for trans_key in keys:
+                    t = find_trans(trans_key, self.trans_by_extid, trans_by_name)
                     if not t:
-                        raise Exception(
-                            f"Skipping lay_trans row due to not defined transformable entity: lay_trans -> {row}"
-                        )
+                        break
+                    trans.append(t)
+                bad_cells = row_idx[undefined_good[col_idx]]
+                first_error = min([len(trans), *bad_cells[:1].tolist()])
+                if first_error < len(keys):
+                    i = first_error
+                    raise lay_trans_row_error(
+                        rows[i],
+                        keys[i],
+                        trans[i] if i < len(trans) else None,
+                        not (bad_cells == i).any(),
+                    )
 
-                    for col_idx, pid in enumerate(product_ids, start=1):
-                        qty = as_float(row[col_idx] if col_idx < len(row) else None)
-                        if qty is None:
-                            # Quantity is None, so skip-it as is 0 / not present
-                            continue
+                for i, j, qty in zip(
+                    row_idx.tolist(), col_idx.tolist(), quantities.tolist()
+                ):
+                    g = goods[j]
+                    t = trans[i]
 
-                        g = good_map.get(str(pid).strip())
-                        if not g:
-                            raise Exception(
-                                f"Skipping lay_trans row due to not defined good: lay_trans -> {row}"
-                            )
+                    # Unit choice: best available in your file is the transformable reference unit,
+                    # but you don't store it on TransformableEntity. We'll fallback to good.reference_unit.
+                    # (If you later add a reference_unit on TransformableEntity, swap this.)
+                    u = g.reference_unit
 
-                        # Unit choice: best available in your file is the transformable reference unit,
-                        # but you don't store it on TransformableEntity. We'll fallback to good.reference_unit.
-                        # (If you later add a reference_unit on TransformableEntity, swap this.)
-                        u = g.reference_unit
-
-                        if verbose:
-                            print(
-                                "-| Linking Good '{}' with TransformableEntity '{}' | quantity: {}".format(
-                                    g.name, t.name, qty
-                                )
+                    if self.verbose:
+                        print(
+                            "-| Linking Good '{}' with TransformableEntity '{}' | quantity: {}".format(
+                                g.name, t.name, qty
                             )
-
-                        GoodContainTransformableEntity.objects.create(
-                            good=g,
-                            transformable_entity=t,
-                            unit=u,
-                            quantity=qty,
                         )
 
-        # -------------------------
-        # lay_goods: parent good contains child good
-        # -------------------------
-        if "lay_goods" in wb.sheetnames:
-            ws = wb["lay_goods"]
-            for r in iter_rows_as_dict(ws):
-                parent_pid = r.get("productId")
-                child_pid = r.get("ID of products inside product")
-                qty = as_float(r.get("value"))
-
-                if not parent_pid:
-                    raise Exception(
-                        f"Skipping lay_goods row due to missing parent productId: lay_goods -> {r}"
-                    )
-                if not child_pid:
-                    raise Exception(
-                        f"Skipping lay_goods row due to missing child productId: lay_goods -> {r}"
+                    yield GoodContainTransformableEntity(
+                        good=g,
+                        transformable_entity=t,
+                        unit=u,
+                        quantity=qty,
                     )
 
-                if qty is None:
-                    # Quantity is None, so skip-it as is 0 / not present
-                    continue
+        self.sync(
+            GoodContainTransformableEntity,
+            links(),
+            stats,
+            existing=GoodContainTransformableEntity.objects.filter(
+                good__project=self.project, good__external_id__isnull=False
+            ),
+            key=["good", "transformable_entity"],
+            fields=["unit", "quantity"],
+            copy=True,
+        )
 
-                parent = good_by_extid.get(str(parent_pid).strip())
-                child = good_by_extid.get(str(child_pid).strip())
-                if not parent:
-                    raise Exception(
-                        f"Skipping lay_goods row due to not defined parent good: lay_goods -> {r}"
-                    )
-                if not child:
-                    raise Exception(
-                        f"Skipping lay_goods row due to not defined child good: lay_goods -> {r}"
-                    )
+    # -------------------------
+    # lay_goods: parent good contains child good
+    # -------------------------
+
+    def load_lay_goods(self, rows, stats):
+        def links():
+            for parent_pid, child_pid, qty, r in rows:
+                stats["rows"] += 1
+
+                pair = check_lay_goods_row(
+                    parent_pid, child_pid, qty, r, self.good_by_extid
+                )
+                if pair is None:
+                    stats["skipped"] += 1
+                    continue
+                parent, child = (self.good_by_extid[pid] for pid in pair)
 
                 u = child.reference_unit
 
-                if verbose:
+                if self.verbose:
                     print(
                         "-| Linking Good '{}' with sub-Good '{}' | quantity: {}".format(
                             parent.name, child.name, qty
                         )
                     )
 
-                GoodContainGood.objects.create(
+                yield GoodContainGood(
                     parent_good=parent,
                     child_good=child,
                     unit=u,
                     quantity=qty,
                 )
 
-        # -------------------------
-        # tr: economic flows
-        #     columns we use:
-        #     - goods_in ID (input good)
-        #     - act (activity label)  -> match Process by normalized name prefix
-        #     - out ID (output good)
-        #     - value (quantity)
-        # -------------------------
-        if "tr" in wb.sheetnames:
-            ws = wb["tr"]
-            procs = list(Process.objects.all())
-            proc_candidates = [(norm(p.name), p) for p in procs]
-
-            def find_process(act_label):
-                k = norm(act_label)
-                if not k:
-                    return None
-                # exact
-                if k in proc_by_norm_name:
-                    return proc_by_norm_name[k]
-                # prefix-ish match
-                for pname, pobj in proc_candidates:
-                    if pname and (k.startswith(pname) or pname.startswith(k)):
-                        return pobj
-                return None
-
-            for r in iter_rows_as_dict(ws):
-                in_pid = r.get("goods_in ID")
-                act_label = r.get("act")
-                out_pid = r.get("out ID")
-                qty = as_float(r.get("value"))
-
-                if not act_label:
-                    raise Exception(
-                        f"Skipping tr row due to missing activity label: tr -> {r}"
-                    )
+        self.sync(
+            GoodContainGood,
+            links(),
+            stats,
+            existing=GoodContainGood.objects.filter(
+                parent_good__project=self.project,
+                parent_good__external_id__isnull=False,
+            ),
+            key=["parent_good", "child_good"],
+            fields=["unit", "quantity"],
+        )
 
-                if qty is None:
-                    # Quantity is None, so skip-it as is 0 / not present
+    # -------------------------
+    # tr: economic flows
+    #     columns we use:
+    #     - goods_in ID (input good)
+    #     - act (activity label)  -> match Process by normalized name prefix
+    #     - out ID (output good)
+    #     - value (quantity)
+    #     - cons_in, trans_in, trans_out: with the goods, they identify the
+    #       row (see tr_row_key)
+    # -------------------------
+
+    def load_tr(self, rows, stats):
+        # Only this import's processes are candidates
+        index = ProcessIndex(self.proc_by_norm_name)
+
+        # Flows have no id in the sheet: they are keyed by the row's
+        # identifying columns, which must be unique per process.
+        seen = set()
+
+        def flows():
+            for in_pid, act_label, out_pid, qty, r in rows:
+                stats["rows"] += 1
+
+                checked = check_tr_row(
+                    in_pid,
+                    act_label,
+                    out_pid,
+                    qty,
+                    r,
+                    index.find,
+                    self.good_by_extid,
+                    seen,
+                )
+                if checked is None:
+                    stats["skipped"] += 1
                     continue
+                p, in_id, out_id = checked
+                row_key = tr_row_key(r)
 
-                p = find_process(act_label)
-
-                if not p:
-                    raise Exception(
-                        f"Skipping tr row due to not defined Process for activity label '{act_label}': tr -> {r}"
-                    )
-
-                if in_pid:
-                    g_in = good_by_extid.get(str(in_pid).strip())
+                if in_id:
+                    g_in = self.good_by_extid[in_id]
 
-                    if not g_in:
-                        raise Exception(
-                            f"Skipping tr row due to not defined input Good: tr -> {r}"
-                        )
-
-                    if verbose:
+                    if self.verbose:
                         print(
                             "-| Creating EconomicFlow for Process '{}' | input Good '{}' | quantity: {}".format(
                                 p.name, g_in.name, qty
                             )
                         )
 
-                    EconomicFlow.objects.create(
+                    yield EconomicFlow(
                         process=p,
                         good=g_in,
                         unit=g_in.reference_unit,
                         direction="input",
                         quantity=qty,
                         is_byproduct=False,
+                        external_id=f"input:{row_key}",
                     )
 
-                if out_pid:
-                    g_out = good_by_extid.get(str(out_pid).strip())
+                if out_id:
+                    g_out = self.good_by_extid[out_id]
 
-                    if not g_out:
-                        raise Exception(
-                            f"Skipping tr row due to not defined output Good: tr -> {r}"
-                        )
-
-                    if verbose:
+                    if self.verbose:
                         print(
                             "-| Creating EconomicFlow for Process '{}' | output Good '{}' | quantity: {}".format(
                                 p.name, g_out.name, qty
                             )
                         )
 
-                    EconomicFlow.objects.create(
+                    yield EconomicFlow(
                         process=p,
                         good=g_out,
                         unit=g_out.reference_unit,
                         direction="output",
                         quantity=qty,
                         is_byproduct=False,
+                        external_id=f"output:{row_key}",
                     )
 
-        # -------------------------
-        # background_biosphere: create compartment hierarchy
-        # -------------------------
-        if "background_biosphere" in wb.sheetnames:
-            ws = wb["background_biosphere"]
-
-            # Cache by (name,parent_id) to avoid duplicates
-            comp_cache = {}
-
-            def get_compartment(name, parent=None):
-                key = (str(name).strip(), parent.id if parent else None)
-                if key in comp_cache:
-                    return comp_cache[key]
-                obj, created = ElementaryFlowCompartment.objects.get_or_create(
-                    project=project,
-                    name=str(name).strip(),
-                    parent_compartment=parent,
-                )
-
-                if verbose and created:
-                    print(
-                        "  -| Creating ElementaryFlowCompartment:",
-                        name,
-                        "| Parent:",
-                        parent.name if parent else "None",
-                    )
-
-                comp_cache[key] = obj
-                return obj
-
-            for r in iter_rows_as_dict(ws):
-                comp = r.get("comp")
-                sub = r.get("subcomp")
-
-                if not comp:
-                    raise Exception(
-                        f"Skipping background_biosphere row due to missing compartment name: background_biosphere -> {r}"
-                    )
-
-                parent = get_compartment(comp, None)
-                if sub:
-                    get_compartment(sub, parent)
+        self.sync(
+            EconomicFlow,
+            flows(),
+            stats,
+            existing=EconomicFlow.objects.filter(
+                process__project=self.project, external_id__isnull=False
+            ),
+            key=["process", "external_id"],
+            fields=["good", "unit", "direction", "quantity", "is_byproduct"],
+            copy=True,
+        )
 
-        if dry:
-            # If dry-run, rollback the whole transaction
-            print("Dry-run complete (rolling back).")
-            transaction.set_rollback(True)
+        for message in index.warnings():
+            self.stdout.write(self.style.WARNING(message))
+
+    # -------------------------
+    # background_biosphere: create compartment hierarchy
+    # -------------------------
+
+    def load_background_biosphere(self, rows, stats):
+        # Unique compartments and (subcompartment, compartment) pairs, in sheet order
+        comps = {}
+        subs = {}
+        for comp, sub, r in rows:
+            stats["rows"] += 1
+
+            comps.setdefault(check_compartment_row(comp, r), comp)
+            if sub:
+                subs.setdefault((str(sub).strip(), str(comp).strip()), sub)
+
+        # Compartments are keyed by their path in the sheet (comp, or
+        # comp/subcomp): the ones created through the API have no external_id
+        # and are left alone. Parents first so the children can reference
+        # their primary keys.
+        parents = {}
+        for key, name in comps.items():
+            if self.verbose:
+                print(
+                    "  -| Creating ElementaryFlowCompartment:", name, "| Parent: None"
+                )
+            parents[key] = ElementaryFlowCompartment(
+                project=self.project, name=key, external_id=key
+            )
+        self.sync(
+            ElementaryFlowCompartment,
+            list(parents.values()),
+            stats,
+            existing=ElementaryFlowCompartment.objects.filter(
+                project=self.project,
+                parent_compartment__isnull=True,
+                external_id__isnull=False,
+            ),
+            key=["project", "external_id"],
+            fields=["name"],
+        )
 
-        self.stdout.write(self.style.SUCCESS("Import complete."))
+        children = []
+        for (key, parent_key), name in subs.items():
+            parent = parents[parent_key]
+            if self.verbose:
+                print(
+                    "  -| Creating ElementaryFlowCompartment:",
+                    name,
+                    "| Parent:",
+                    parent.name,
+                )
+            children.append(
+                ElementaryFlowCompartment(
+                    project=self.project,
+                    name=key,
+                    parent_compartment=parent,
+                    external_id=f"{parent_key}/{key}",
+                )
+            )
+        self.sync(
+            ElementaryFlowCompartment,
+            children,
+            stats,
+            existing=ElementaryFlowCompartment.objects.filter(
+                project=self.project,
+                parent_compartment__isnull=False,
+                external_id__isnull=False,
+            ),
+            key=["project", "external_id"],
+            fields=["name", "parent_compartment"],
+        )
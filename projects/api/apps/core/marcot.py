@@ -0,0 +1,933 @@
+"""
+Parsing of MARCOT templates (XLSX workbooks or columnar directories) into
+plain row tuples.
+
+Nothing here touches Django, so the parsers can run in worker processes.
+Parsers only pull the relevant columns out of each row; validation and id
+resolution happen when the rows are loaded (see the import_marcot command),
+or without a database in `Validator`.
+"""
+
+import csv
+import json
+import math
+import os
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+from openpyxl import load_workbook
+
+
+def norm(s: str) -> str:
+    if s is None:
+        return ""
+    return re.sub(r"\s+", " ", str(s)).strip().lower()
+
+
+def as_float(x):
+    if x is None:
+        return None
+    if isinstance(x, (int, float)):
+        if isinstance(x, float) and (math.isnan(x) or math.isinf(x)):
+            return None
+        return float(x)
+    try:
+        x = str(x).strip()
+        if x == "":
+            return None
+        return float(x)
+    except Exception:
+        return None
+
+
+def iter_rows_as_dict(ws, header_row=1):
+    """
+    Yield dict rows based on the header row.
+    Skips entirely-empty rows.
+    Works on read-only worksheets: rows are streamed, never indexed.
+    """
+    rows = ws.iter_rows(min_row=header_row, values_only=True)
+    headers = next(rows, None) or ()
+
+    # Keep only columns that have a non-empty header
+    idxs = [i for i, h in enumerate(headers) if h not in (None, "")]
+    clean_headers = [headers[i] for i in idxs]
+
+    for row in rows:
+        vals = [row[i] if i < len(row) else None for i in idxs]
+        if all(v is None or str(v).strip() == "" for v in vals):
+            continue
+        yield dict(zip(clean_headers, vals))
+
+
+def open_workbook(path):
+    """Open a workbook in streaming mode. Close it when done."""
+    return load_workbook(path, read_only=True, data_only=True)
+
+
+def open_source(path):
+    """
+    Open an import source: an .xlsx workbook, or a directory of per-sheet
+    .parquet/.csv files (see ColumnarSource). Close it when done.
+    """
+    if os.path.isdir(path):
+        return ColumnarSource(path)
+    return open_workbook(path)
+
+
+# ---------------------------
+# Columnar sources
+#   A directory holds one file per sheet, named after it: l_cons.parquet,
+#   tr.csv, ... Files are read with pyarrow in record batches and exposed
+#   through the small part of the openpyxl worksheet API the parsers use
+#   (iter_rows(min_row, values_only=True) and max_row), so every parser and
+#   validation rule works unchanged.
+#
+#   CSV files keep the header as their first line. Parquet columns are
+#   named c0..cN and the header row is stored in the schema metadata, so
+#   headers may be empty or repeated like in a worksheet.
+# ---------------------------
+
+COLUMNAR_FORMATS = ("parquet", "csv")
+HEADER_METADATA_KEY = b"marcot.header"
+INT_PATTERN = re.compile(r"^[+-]?\d+$")
+# Columns holding quantities, typed like numeric worksheet cells. Every other
+# column (ids, names, units) is kept as read: "001" must stay "001" so the
+# external ids match the ones imported from the .xlsx. In lay_trans, every
+# column but the first is a quantity.
+VALUE_COLUMNS = {
+    "l_cons": {"Molar mass [g/mol]"},
+    "cons_permol": {"molar composition"},
+    "lay_goods": {"value"},
+    "tr": {"value"},
+}
+
+
+def is_value_column(sheet, index, name):
+    if sheet == "lay_trans":
+        return index > 0
+    return name in VALUE_COLUMNS.get(sheet, ())
+
+
+def cell_value(text):
+    """A CSV/string cell typed the way openpyxl returns numeric cells."""
+    if text is None:
+        return None
+    if INT_PATTERN.match(text):
+        return int(text)
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def column_values(column, numeric=True):
+    """
+    Python values of an Arrow column. Text is typed as in a worksheet when
+    `numeric`, and kept as text otherwise.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not numeric or (
+        not pa.types.is_string(column.type)
+        and not pa.types.is_large_string(column.type)
+    ):
+        return column.to_pylist()
+    # Vectorized casts cover the common all-numeric columns...
+    for target in (pa.int64(), pa.float64()):
+        try:
+            return pc.cast(column, target).to_pylist()
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            pass
+    # ...mixed ones are typed cell by cell.
+    return [cell_value(v) for v in column.to_pylist()]
+
+
+class ColumnarSheet:
+    def __init__(self, path, fmt):
+        self.path = path
+        self.format = fmt
+        self.name = os.path.splitext(os.path.basename(path))[0]
+
+    @property
+    def max_row(self):
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+
+            return pq.ParquetFile(self.path).metadata.num_rows + 1
+        return None  # unknown without reading the file
+
+    def iter_rows(self, min_row=1, values_only=True):
+        rows = self._rows()
+        for _ in range(min_row - 1):
+            if next(rows, None) is None:
+                return
+        yield from rows
+
+    def _rows(self):
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+
+            f = pq.ParquetFile(self.path)
+            header = json.loads(f.schema_arrow.metadata[HEADER_METADATA_KEY])
+            yield tuple(header)
+            batches = f.iter_batches()
+        else:
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+
+            with open(self.path, newline="", encoding="utf-8") as f:
+                header = next(csv.reader(f), [])
+            header = [h or None for h in header]
+            yield tuple(header)
+            # Every column is read as text and only quantities are typed by
+            # column_values(), so a column mixing numbers and text reads like
+            # in a worksheet.
+            names = [f"c{i}" for i in range(len(header))]
+            batches = pacsv.open_csv(
+                self.path,
+                read_options=pacsv.ReadOptions(
+                    column_names=names, skip_rows_after_names=1
+                ),
+                parse_options=pacsv.ParseOptions(newlines_in_values=True),
+                convert_options=pacsv.ConvertOptions(
+                    column_types={name: pa.string() for name in names},
+                    strings_can_be_null=True,
+                ),
+            )
+        numeric = [is_value_column(self.name, i, h) for i, h in enumerate(header)]
+        for batch in batches:
+            yield from zip(
+                *(
+                    column_values(column, numeric[i])
+                    for i, column in enumerate(batch.columns)
+                )
+            )
+
+
+class ColumnarSource:
+    def __init__(self, directory):
+        self.directory = directory
+        self.sheets = {}
+        for fmt in reversed(COLUMNAR_FORMATS):  # parquet wins over csv
+            for name in sorted(os.listdir(directory)):
+                stem, ext = os.path.splitext(name)
+                if ext == f".{fmt}":
+                    self.sheets[stem] = ColumnarSheet(
+                        os.path.join(directory, name), fmt
+                    )
+
+    @property
+    def sheetnames(self):
+        return list(self.sheets)
+
+    def __getitem__(self, name):
+        return self.sheets[name]
+
+    def close(self):
+        pass
+
+
+def convert_workbook(path, directory, fmt="parquet", sheets=None):
+    """
+    Write the sheets of an .xlsx workbook as a columnar source directory.
+    Entirely empty rows and trailing unnamed empty columns are dropped. Returns
+    {sheet: number of data rows written}.
+    """
+    import pyarrow as pa
+
+    if fmt not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {COLUMNAR_FORMATS}")
+    os.makedirs(directory, exist_ok=True)
+
+    wb = open_workbook(path)
+    written = {}
+    try:
+        for sheet in sheets or PARSERS:
+            if sheet not in wb.sheetnames:
+                continue
+            rows = wb[sheet].iter_rows(values_only=True)
+            header = list(next(rows, None) or ())
+            data = [row for row in rows if any(v is not None for v in row)]
+            # Trailing unnamed, empty columns are padding; inner ones are kept
+            # since lay_trans reads its matrix by position.
+            width = len(header)
+            while (
+                width
+                and header[width - 1] in (None, "")
+                and not any(
+                    width - 1 < len(row) and row[width - 1] is not None for row in data
+                )
+            ):
+                width -= 1
+            keep = range(width)
+            header = [header[i] for i in keep]
+            columns = [[row[i] if i < len(row) else None for row in data] for i in keep]
+
+            target = os.path.join(directory, f"{sheet}.{fmt}")
+            if fmt == "parquet":
+                import pyarrow.parquet as pq
+
+                arrays = [arrow_column(values) for values in columns]
+                schema = pa.schema(
+                    [pa.field(f"c{i}", a.type) for i, a in enumerate(arrays)],
+                    metadata={HEADER_METADATA_KEY: json.dumps(header, default=str)},
+                )
+                pq.write_table(pa.Table.from_arrays(arrays, schema=schema), target)
+            else:
+                with open(target, "w", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(csv_cell(v) for v in header)
+                    for row in zip(*columns):
+                        writer.writerow(csv_cell(v) for v in row)
+            written[sheet] = len(data)
+    finally:
+        wb.close()
+    return written
+
+
+def arrow_column(values):
+    """Typed column when every cell is a number, strings otherwise."""
+    import pyarrow as pa
+
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return pa.array(values, type=pa.int64())
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return pa.array(
+            [float(v) if v is not None else None for v in values], type=pa.float64()
+        )
+    return pa.array([csv_cell(v) or None for v in values], type=pa.string())
+
+
+def csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+# ---------------------------
+# Sheet parsers
+#   Each yields one tuple per non-empty row. The raw row (dict or tuple) is
+#   kept as the last item where the loader needs it for error messages.
+# ---------------------------
+
+
+def parse_l_cons(ws):
+    for r in iter_rows_as_dict(ws):
+        yield (
+            r.get("consId"),
+            r.get("name"),
+            r.get("dimension"),
+            r.get("unit"),
+            r.get("Molar mass [g/mol]"),
+        )
+
+
+def parse_l_trans(ws):
+    for r in iter_rows_as_dict(ws):
+        yield (r.get("id"), r.get("name"), r.get("reference_property"), r.get("unit"))
+
+
+def parse_l_goods(ws):
+    for r in iter_rows_as_dict(ws):
+        yield (
+            r.get("productId"),
+            r.get("name"),
+            r.get("reference_property"),
+            r.get("unit"),
+        )
+
+
+def parse_l_act(ws):
+    for r in iter_rows_as_dict(ws):
+        # TODO: Add location handling (r.get("location"))
+        yield (r.get("activityId"), r.get("name"))
+
+
+def parse_cons_permol(ws):
+    for r in iter_rows_as_dict(ws):
+        yield (
+            r.get("substance"),
+            r.get("element"),
+            as_float(r.get("molar composition")),
+            r,
+        )
+
+
+# Rows of the lay_trans matrix converted to a dense array at a time
+LAY_TRANS_BLOCK_ROWS = 1024
+
+
+def parse_lay_trans(ws, block_rows=LAY_TRANS_BLOCK_ROWS):
+    """
+    Matrix sheet: first column is transformable id/name, next columns are
+    productIds. Non-empty rows are read `block_rows` at a time into a float
+    array, and each block is reduced to COO triplets of its non-empty
+    cells. Yields (product_ids, keys, rows, row_idx, col_idx, quantities,
+    stray_rows): the block's first-column keys and raw rows, for each cell
+    its row in the block, its index in product_ids and its value, and the
+    rows holding values under unnamed columns.
+    """
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+
+    # header[0] is like "id good", header[1:] are productIds. Columns keep
+    # their sheet position, unnamed ones included.
+    columns = [i for i, h in enumerate(header) if i > 0 and h not in (None, "")]
+    product_ids = [header[i] for i in columns]
+
+    block = []
+    for row in rows:
+        if not row or all(v is None for v in row):
+            continue
+        block.append(row)
+        if len(block) == block_rows:
+            yield (product_ids, *coo_block(block, columns))
+            block = []
+    if block:
+        yield (product_ids, *coo_block(block, columns))
+
+
+def coo_block(block, columns):
+    """Keys, rows and COO triplets (row, column, value) of a matrix block."""
+    import numpy as np
+
+    width = max(len(row) for row in block)
+    if columns:
+        width = max(width, columns[-1] + 1)
+    padded = [tuple(row) + (None,) * (width - len(row)) for row in block]
+    matrix = np.array(padded, dtype=object)
+    cells = matrix[:, columns]
+
+    cells[cells == None] = np.nan  # noqa: E711 (elementwise comparison)
+    try:
+        values = cells.astype(np.float64)
+    except (TypeError, ValueError):
+        # Text cells: fall back to as_float() for this block only
+        values = np.vectorize(
+            lambda x: np.nan if (v := as_float(x)) is None else v,
+            otypes=[np.float64],
+        )(cells)
+    # Quantity is None/NaN/inf, so skip-it as is 0 / not present
+    values[~np.isfinite(values)] = np.nan
+
+    row_idx, col_idx = np.nonzero(~np.isnan(values))
+    keys = [row[0] for row in block]
+
+    # Rows with something under an unnamed column: ignored by the import
+    others = sorted(set(range(1, width)) - set(columns))
+    stray = matrix[:, others] if others else None
+    stray_rows = (
+        np.nonzero((stray != None).any(axis=1))[0]  # noqa: E711
+        if stray is not None
+        else np.zeros(0, dtype=np.intp)
+    )
+    return keys, block, row_idx, col_idx, values[row_idx, col_idx], stray_rows
+
+
+def parse_lay_goods(ws):
+    for r in iter_rows_as_dict(ws):
+        yield (
+            r.get("productId"),
+            r.get("ID of products inside product"),
+            as_float(r.get("value")),
+            r,
+        )
+
+
+def parse_tr(ws):
+    for r in iter_rows_as_dict(ws):
+        yield (
+            r.get("goods_in ID"),
+            r.get("act"),
+            r.get("out ID"),
+            as_float(r.get("value")),
+            r,
+        )
+
+
+def tr_row_key(r):
+    """
+    Key of a tr row from the columns identifying it: a process can take in
+    (or give out) the same good on several rows, one per conserved or
+    transformable entity. Headers are matched on their first line
+    ("trans_out\n(opt.)" is "trans_out").
+    """
+    values = {str(h).split("\n")[0].strip(): v for h, v in r.items()}
+
+    def cell(column):
+        value = values.get(column)
+        return str(value).strip() if value is not None else ""
+
+    return "{}|{}|{}>{}|{}".format(
+        cell("cons_in"),
+        cell("trans_in"),
+        cell("goods_in ID"),
+        cell("trans_out"),
+        cell("out ID"),
+    )
+
+
+def parse_background_biosphere(ws):
+    for r in iter_rows_as_dict(ws):
+        yield (r.get("comp"), r.get("subcomp"), r)
+
+
+PARSERS = {
+    "l_cons": parse_l_cons,
+    "l_trans": parse_l_trans,
+    "l_goods": parse_l_goods,
+    "l_act": parse_l_act,
+    "cons_permol": parse_cons_permol,
+    "lay_trans": parse_lay_trans,
+    "lay_goods": parse_lay_goods,
+    "tr": parse_tr,
+    "background_biosphere": parse_background_biosphere,
+}
+
+
+def parse_sheet(path, sheet):
+    """Parse a whole sheet into a list. Entry point for worker processes."""
+    wb = open_source(path)
+    try:
+        return list(PARSERS[sheet](wb[sheet]))
+    finally:
+        wb.close()
+
+
+class ProcessIndex:
+    """
+    Match activity labels against normalized process names.
+
+    Labels in the `tr` sheet are usually the process name followed by a
+    location ("vacuum qc"), so besides exact matches a label may extend a
+    process name (prefix match) or be cut short of one (reverse prefix).
+    Names are kept in a dict and a sorted list: prefix matches are found by
+    probing the label's own prefixes, reverse-prefix matches by bisecting.
+
+    When several processes match, the longest name that prefixes the label
+    wins, else the shortest name extending it (ties broken alphabetically).
+    Each such label is recorded in `ambiguous` with its sorted candidates.
+    """
+
+    def __init__(self, procs_by_norm_name):
+        self.by_name = {k: p for k, p in procs_by_norm_name.items() if k}
+        self.names = sorted(self.by_name)
+        self.ambiguous = {}  # label -> (chosen name, candidate names)
+        self._cache = {}
+
+    def extending(self, k):
+        """Names strictly longer than `k` that start with it."""
+        i = bisect_left(self.names, k)
+        out = []
+        while i < len(self.names) and self.names[i].startswith(k):
+            if self.names[i] != k:
+                out.append(self.names[i])
+            i += 1
+        return out
+
+    def find(self, act_label):
+        k = norm(act_label)
+        if not k:
+            return None
+        if k in self._cache:
+            return self._cache[k]
+
+        # exact
+        if k in self.by_name:
+            self._cache[k] = self.by_name[k]
+            return self.by_name[k]
+
+        prefixes = [k[:i] for i in range(len(k) - 1, 0, -1) if k[:i] in self.by_name]
+        extending = sorted(self.extending(k), key=lambda n: (len(n), n))
+        candidates = prefixes + extending
+        chosen = candidates[0] if candidates else None
+        if len(candidates) > 1:
+            self.ambiguous[k] = (chosen, sorted(candidates))
+
+        p = self.by_name[chosen] if chosen else None
+        self._cache[k] = p
+        return p
+
+    def warnings(self):
+        """One message per ambiguous label found so far."""
+        return [
+            f"Ambiguous activity label '{label}' matches {candidates}, using '{chosen}'"
+            for label, (chosen, candidates) in sorted(self.ambiguous.items())
+        ]
+
+
+# ---------------------------
+# Row checks
+#   Shared by the importer, which stops at the first RowError, and the
+#   Validator, which collects them. References are checked against any
+#   container of ids: the importer's {id: object} caches or the
+#   Validator's sets.
+# ---------------------------
+
+
+class RowError(Exception):
+    """An invalid row of `sheet`."""
+
+    def __init__(self, sheet, message):
+        super().__init__(message)
+        self.sheet = sheet
+
+
+def skipped_row(sheet, reason, row):
+    return RowError(sheet, f"Skipping {sheet} row due to {reason}: {sheet} -> {row}")
+
+
+def duplicate_row(sheet, what, constraint, row):
+    return RowError(sheet, f"Duplicate {what} violates {constraint}: {sheet} -> {row}")
+
+
+def unit_symbol(symbol):
+    """Unit symbol of a cell; "1" (dimensionless-ish) when empty."""
+    return (str(symbol).strip() if symbol else "") or "1"
+
+
+def check_cons_permol_row(substance, element, comp, r, trans, conserved):
+    """(transformable id, conserved id) of a cons_permol row."""
+    if not substance:
+        raise skipped_row("cons_permol", "missing substance", r)
+    if not element:
+        raise skipped_row("cons_permol", "missing element", r)
+    if comp is None:
+        raise skipped_row("cons_permol", "missing composition", r)
+    t, c = str(substance).strip(), str(element).strip()
+    if t not in trans:
+        raise skipped_row("cons_permol", "not defined transformable entity", r)
+    if c not in conserved:
+        raise skipped_row("cons_permol", "not defined conserved entity", r)
+    return t, c
+
+
+def find_trans(trans_key, by_id, by_norm_name):
+    """Transformable of a lay_trans row: by id, else by name; None if undefined."""
+    if not trans_key:
+        return None
+    return by_id.get(str(trans_key).strip()) or by_norm_name.get(norm(trans_key))
+
+
+def lay_trans_row_error(row, trans_key, trans, goods_defined):
+    """
+    First issue of a lay_trans row whose transformable resolved to `trans`
+    and whose non-empty cells are (or not) all under defined goods.
+    """
+    if not trans_key:
+        return skipped_row("lay_trans", "missing transformable entity", row)
+    if trans is None:
+        return skipped_row("lay_trans", "not defined transformable entity", row)
+    if not goods_defined:
+        return skipped_row("lay_trans", "not defined good", row)
+    return None
+
+
+def check_lay_goods_row(parent_pid, child_pid, qty, r, goods):
+    """(parent id, child id) of a lay_goods row; None without quantity."""
+    if not parent_pid:
+        raise skipped_row("lay_goods", "missing parent productId", r)
+    if not child_pid:
+        raise skipped_row("lay_goods", "missing child productId", r)
+    if qty is None:
+        # Quantity is None, so skip-it as is 0 / not present
+        return None
+    parent, child = str(parent_pid).strip(), str(child_pid).strip()
+    if parent not in goods:
+        raise skipped_row("lay_goods", "not defined parent good", r)
+    if child not in goods:
+        raise skipped_row("lay_goods", "not defined child good", r)
+    return parent, child
+
+
+def check_tr_row(in_pid, act_label, out_pid, qty, r, find_process, goods, seen):
+    """
+    (process, input id, output id) of a tr row, ids being "" when absent;
+    None without quantity. `seen` collects the (process, tr_row_key) of
+    the rows checked so far, which must be unique.
+    """
+    if not act_label:
+        raise skipped_row("tr", "missing activity label", r)
+    if qty is None:
+        return None
+    p = find_process(act_label)
+    if not p:
+        raise skipped_row(
+            "tr", f"not defined Process for activity label '{act_label}'", r
+        )
+    in_id = str(in_pid).strip() if in_pid else ""
+    out_id = str(out_pid).strip() if out_pid else ""
+    if in_id and in_id not in goods:
+        raise skipped_row("tr", "not defined input Good", r)
+    if out_id and out_id not in goods:
+        raise skipped_row("tr", "not defined output Good", r)
+    key = (p, tr_row_key(r))
+    if key in seen:
+        raise duplicate_row(
+            "tr", "row", "unique_economic_flow_external_id_per_process", r
+        )
+    seen.add(key)
+    return p, in_id, out_id
+
+
+def check_compartment_row(comp, r):
+    """Compartment name of a background_biosphere row."""
+    if not comp:
+        raise skipped_row("background_biosphere", "missing compartment name", r)
+    return str(comp).strip()
+
+
+# ---------------------------
+# Validation
+#   An in-memory pass over the parsed sheets applying the row checks above,
+#   plus the checks the database would otherwise make on insert: uniqueness
+#   constraints and references between sheets. Nothing is written and every
+#   invalid row is collected instead of stopping at the first one.
+# ---------------------------
+
+REQUIRED_COLUMNS = {
+    "l_cons": ("consId", "name"),
+    "l_trans": ("id", "name"),
+    "l_goods": ("productId", "name"),
+    "l_act": ("activityId", "name"),
+    "cons_permol": ("substance", "element", "molar composition"),
+    "lay_goods": ("productId", "ID of products inside product", "value"),
+    "tr": ("act", "value"),
+    "background_biosphere": ("comp",),
+}
+
+
+class Validator:
+    """
+    Validate a source without touching the database. `issues` collects
+    {"sheet", "level", "message"} dicts; "error" issues would make the
+    import fail, "warning" ones are silently tolerated by it.
+    """
+
+    def __init__(self):
+        self.issues = []
+        self.conserved = set()
+        self.trans = set()
+        self.trans_name_to_id = {}
+        self.goods = set()
+        self.proc_by_norm_name = {}
+        # normalized unit symbol -> (symbol, first dimension, {dimensions})
+        self.units = {}
+
+    @property
+    def errors(self):
+        return [i for i in self.issues if i["level"] == "error"]
+
+    def error(self, sheet, message):
+        self.issues.append({"sheet": sheet, "level": "error", "message": message})
+
+    def warning(self, sheet, message):
+        self.issues.append({"sheet": sheet, "level": "warning", "message": message})
+
+    def row_error(self, exc):
+        self.error(exc.sheet, str(exc))
+
+    def run(self, source, sheets):
+        """Validate `sheets` (in import order) of an open source."""
+        for sheet in sheets:
+            ws = source[sheet]
+            header = next(ws.iter_rows(values_only=True), None) or ()
+            missing = [c for c in REQUIRED_COLUMNS.get(sheet, ()) if c not in header]
+            if missing:
+                self.error(sheet, f"Missing column(s) {missing} in sheet {sheet}")
+            getattr(self, f"check_{sheet}")(PARSERS[sheet](ws))
+        return self.issues
+
+    def use_unit(self, sheet, symbol, dimension_name):
+        # Same fallbacks as the importer's get_unit()
+        sym = unit_symbol(symbol)
+        dim = norm(dimension_name) or "unknown"
+        entry = self.units.setdefault(norm(sym), (sym, dim, set()))
+        if dim not in entry[2]:
+            entry[2].add(dim)
+            if dim != entry[1]:
+                self.warning(
+                    sheet,
+                    f"Unit '{sym}' used with dimension '{dim}' but already defined "
+                    f"with '{entry[1]}'; the first dimension is kept",
+                )
+
+    def unique_ids(self, sheet, rows, label, constraint):
+        seen = set()
+        for extid, *_ in rows:
+            if extid in seen:
+                self.error(
+                    sheet,
+                    f"Duplicate {label} '{extid}' violates {constraint}: {sheet}",
+                )
+            seen.add(extid)
+        return seen
+
+    def check_l_cons(self, rows):
+        parsed = []
+        for extid, name, dim_name, unit_sym, molar_mass in rows:
+            if not extid or not name:
+                continue
+            parsed.append((str(extid).strip(), name))
+            self.use_unit("l_cons", unit_sym, dim_name)
+        self.conserved = self.unique_ids(
+            "l_cons",
+            parsed,
+            "consId",
+            "unique_conserved_entity_external_id_per_project",
+        )
+
+    def check_l_trans(self, rows):
+        parsed = []
+        for extid, name, dim_name, unit_sym in rows:
+            if not extid or not name:
+                continue
+            parsed.append((str(extid).strip(), name))
+            self.use_unit("l_trans", unit_sym, dim_name)
+        self.trans = self.unique_ids(
+            "l_trans",
+            parsed,
+            "id",
+            "unique_transformable_entity_external_id_per_project",
+        )
+        self.trans_name_to_id = {norm(name): extid for extid, name in parsed}
+
+    def check_l_goods(self, rows):
+        parsed = []
+        for pid, name, dim_name, unit_sym in rows:
+            if not pid or not name:
+                continue
+            parsed.append((str(pid).strip(), name))
+            self.use_unit("l_goods", unit_sym, dim_name)
+        self.goods = self.unique_ids(
+            "l_goods", parsed, "productId", "unique_good_external_id_per_project"
+        )
+
+    def check_l_act(self, rows):
+        parsed = []
+        for actid, name in rows:
+            if not actid or not name:
+                continue
+            parsed.append((str(actid).strip(), name))
+            self.proc_by_norm_name[norm(name)] = str(actid).strip()
+        self.unique_ids(
+            "l_act", parsed, "activityId", "unique_process_external_id_per_project"
+        )
+
+    def check_cons_permol(self, rows):
+        self.use_unit("cons_permol", "mol", "amount")
+        seen = set()
+        for substance, element, comp, r in rows:
+            try:
+                pair = check_cons_permol_row(
+                    substance, element, comp, r, self.trans, self.conserved
+                )
+            except RowError as exc:
+                self.row_error(exc)
+                continue
+            if pair in seen:
+                self.row_error(
+                    duplicate_row(
+                        "cons_permol",
+                        "pair",
+                        "unique_conserved_entity_per_transformable_entity",
+                        r,
+                    )
+                )
+            seen.add(pair)
+
+    def check_lay_trans(self, blocks):
+        import numpy as np
+
+        pairs = set()  # (transformable id, column), for repeated rows
+        trans_by_id = {t: t for t in self.trans}
+        undefined = None
+        for product_ids, keys, rows, row_idx, col_idx, _, stray_rows in blocks:
+            if undefined is None:
+                pids = [str(pid).strip() for pid in product_ids]
+                for pid in sorted({p for p in pids if pids.count(p) > 1}):
+                    self.error(
+                        "lay_trans",
+                        f"Product column '{pid}' repeated violates "
+                        "unique_transformable_entity_per_good: lay_trans",
+                    )
+                # Repeated columns resolve to the same good
+                first = {}
+                pids = [first.setdefault(p, j) for j, p in enumerate(pids)]
+                undefined = np.array(
+                    [str(pid).strip() not in self.goods for pid in product_ids],
+                    dtype=bool,
+                )
+
+            cells = defaultdict(list)
+            for i, j in zip(row_idx.tolist(), col_idx.tolist()):
+                cells[i].append(j)
+            for i, trans_key in enumerate(keys):
+                row = rows[i]
+                key = find_trans(trans_key, trans_by_id, self.trans_name_to_id)
+                exc = lay_trans_row_error(
+                    row, trans_key, key, not any(undefined[j] for j in cells[i])
+                )
+                if exc:
+                    self.row_error(exc)
+                if not key:
+                    continue
+                repeated = {(key, pids[j]) for j in cells[i]} & pairs
+                if repeated:
+                    self.error(
+                        "lay_trans",
+                        f"Transformable '{trans_key}' already set for the same good(s), "
+                        f"violates unique_transformable_entity_per_good: lay_trans -> {row}",
+                    )
+                pairs.update((key, pids[j]) for j in cells[i])
+            for i in stray_rows.tolist():
+                self.warning(
+                    "lay_trans",
+                    f"Values under an unnamed column are ignored: lay_trans -> {rows[i]}",
+                )
+
+    def check_lay_goods(self, rows):
+        seen = set()
+        for parent_pid, child_pid, qty, r in rows:
+            try:
+                pair = check_lay_goods_row(parent_pid, child_pid, qty, r, self.goods)
+            except RowError as exc:
+                self.row_error(exc)
+                continue
+            if pair is None:
+                continue
+            if pair in seen:
+                self.row_error(
+                    duplicate_row(
+                        "lay_goods", "pair", "unique_child_good_per_parent_good", r
+                    )
+                )
+            seen.add(pair)
+
+    def check_tr(self, rows):
+        index = ProcessIndex(self.proc_by_norm_name)
+        seen = set()
+        for in_pid, act_label, out_pid, qty, r in rows:
+            try:
+                check_tr_row(
+                    in_pid, act_label, out_pid, qty, r, index.find, self.goods, seen
+                )
+            except RowError as exc:
+                self.row_error(exc)
+        for message in index.warnings():
+            self.warning("tr", message)
+
+    def check_background_biosphere(self, rows):
+        for comp, sub, r in rows:
+            try:
+                check_compartment_row(comp, r)
+            except RowError as exc:
+                self.row_error(exc)
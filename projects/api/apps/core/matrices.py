@@ -0,0 +1,325 @@
+"""
+Sparse matrices computed from a project's flows.
+
+Matrices are built with a single query each and cached under the project's
+`data_version`, which is incremented whenever the flows change (see
+apps.core.signals and the import_marcot command): a new version simply makes
+the old cache entries unreachable until they expire.
+
+Factorizations can't go through the cache backend (they don't pickle): they
+are kept in a per-process LRU instead, also keyed by the data version.
+"""
+
+import os
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from .models import EconomicFlow, ElementaryFlow, Project
+
+
+class MatrixError(Exception):
+    """A project's matrices can't answer the request (shape, singular, ids)."""
+
+
+def bump_data_version(**lookup):
+    """Mark the flows of the project(s) matching `lookup` as changed."""
+    Project.objects.filter(**lookup).update(data_version=F("data_version") + 1)
+
+
+def bump_data_version_on_commit(process_id, using=None):
+    """
+    Bump the data version of a process's project once the current
+    transaction commits (at once outside a transaction). All the processes
+    changed in one transaction share a single UPDATE, however many flows
+    are saved or deleted one by one.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        bump_data_version(processes=process_id)
+        return
+    # on_commit hooks live in run_on_commit, a new list for each transaction
+    # (and after a savepoint rollback): a new list means a new pending set.
+    hooks, pending = getattr(connection, "pending_data_versions", (None, None))
+    if hooks is not connection.run_on_commit or not pending:
+        pending = set()
+
+        def flush():
+            bump_data_version(processes__in=pending)
+            pending.clear()
+
+        transaction.on_commit(flush, using=using)
+        connection.pending_data_versions = (connection.run_on_commit, pending)
+    pending.add(process_id)
+
+
+def data_version(project_id):
+    """Current data version of a project; Project.DoesNotExist if none."""
+    return Project.objects.values_list("data_version", flat=True).get(pk=project_id)
+
+
+def cached(name, project_id, build, version=None):
+    """
+    Return `build(project_id, version)` from the cache, keyed by the name,
+    the project and its data version (by default the current one).
+    """
+    if version is None:
+        version = data_version(project_id)
+    key = f"matrices:{name}:{project_id}:{version}"
+    value = cache.get(key)
+    if value is None:
+        value = build(project_id, version)
+        cache.set(key, value, settings.MATRIX_CACHE_TIMEOUT)
+    return value
+
+
+def index(ids):
+    """Sorted unique ids and the position of each input id among them."""
+    return np.unique(np.asarray(ids, dtype=np.int64), return_inverse=True)
+
+
+def positions(sorted_ids, ids, label):
+    ids = np.asarray(ids, dtype=np.int64)
+    pos = np.searchsorted(sorted_ids, ids)
+    pos[pos == len(sorted_ids)] = 0
+    missing = ids[sorted_ids[pos] != ids] if len(sorted_ids) else ids
+    if len(missing):
+        raise MatrixError(f"No flows for {label} id(s) {missing.tolist()}.")
+    return pos
+
+
+class TechnologyMatrix:
+    """
+    Technology matrix A (goods x processes) of a project, in CSR format.
+
+    A[i, j] is the net quantity of good `good_ids[i]` produced by one unit of
+    process `process_ids[j]`: outputs count positively, inputs negatively and
+    several flows of the same good and process are summed. Both id arrays
+    are sorted, so positions only change when goods or processes are added
+    or removed. Only goods and processes having flows are indexed.
+    """
+
+    def __init__(self, matrix, good_ids, process_ids, version):
+        self.matrix = matrix
+        self.good_ids = good_ids
+        self.process_ids = process_ids
+        self.version = version
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    @classmethod
+    def build(cls, project_id, version=None):
+        flows = EconomicFlow.objects.filter(process__project_id=project_id)
+        rows = list(flows.values_list("good_id", "process_id", "quantity", "direction"))
+        if not rows:
+            empty = np.empty(0, dtype=np.int64)
+            return cls(sparse.csr_matrix((0, 0)), empty, empty, version)
+
+        goods, processes, quantities, directions = zip(*rows)
+        good_ids, good_pos = index(goods)
+        process_ids, process_pos = index(processes)
+        values = np.asarray(quantities, dtype=np.float64)
+        values[np.asarray(directions) == "input"] *= -1
+        matrix = sparse.csr_matrix(
+            (values, (good_pos, process_pos)),
+            shape=(len(good_ids), len(process_ids)),
+        )
+        matrix.sum_duplicates()
+        return cls(matrix, good_ids, process_ids, version)
+
+    def good_positions(self, good_ids):
+        """Row of each good id; MatrixError for goods without flows."""
+        return positions(self.good_ids, good_ids, "good")
+
+    def process_positions(self, process_ids):
+        """Column of each process id; MatrixError for processes without flows."""
+        return positions(self.process_ids, process_ids, "process")
+
+
+def technology_matrix(project_id, version=None):
+    """The project's TechnologyMatrix, from the cache when up to date."""
+    return cached("technology", project_id, TechnologyMatrix.build, version)
+
+
+class InterventionMatrix:
+    """
+    Intervention matrix B (elementary flow types x processes) of a project,
+    in CSR format, with the same signs as the technology matrix (outputs
+    positive, inputs negative). Its columns are the technology matrix's
+    processes, so B @ s is the inventory for a scaling vector s; elementary
+    flows of processes without economic flows can't be scaled and are left
+    out. Rows are the sorted ids of the flow types having flows.
+    """
+
+    def __init__(self, matrix, flow_type_ids, version):
+        self.matrix = matrix
+        self.flow_type_ids = flow_type_ids
+        self.version = version
+
+    @classmethod
+    def build(cls, project_id, version=None):
+        process_ids = technology_matrix(project_id, version).process_ids
+        flows = ElementaryFlow.objects.filter(process__project_id=project_id)
+        rows = list(
+            flows.values_list(
+                "elementary_flow_type_id", "process_id", "quantity", "direction"
+            )
+        )
+        if rows:
+            flow_types, processes, quantities, directions = zip(*rows)
+        else:
+            flow_types = processes = quantities = directions = ()
+
+        processes = np.asarray(processes, dtype=np.int64)
+        columns = np.searchsorted(process_ids, processes)
+        columns[columns == len(process_ids)] = 0
+        keep = (
+            process_ids[columns] == processes
+            if len(process_ids)
+            else np.zeros(len(processes), dtype=bool)
+        )
+
+        flow_type_ids, type_pos = index(np.asarray(flow_types, dtype=np.int64)[keep])
+        values = np.asarray(quantities, dtype=np.float64)[keep]
+        values[np.asarray(directions)[keep] == "input"] *= -1
+        matrix = sparse.csr_matrix(
+            (values, (type_pos, columns[keep])),
+            shape=(len(flow_type_ids), len(process_ids)),
+        )
+        matrix.sum_duplicates()
+        return cls(matrix, flow_type_ids, version)
+
+
+def intervention_matrix(project_id, version=None):
+    """The project's InterventionMatrix, from the cache when up to date."""
+    return cached("intervention", project_id, InterventionMatrix.build, version)
+
+
+class Solver:
+    """
+    Sparse LU factorization of a square technology matrix, solving A.s = f
+    for the scaling vector s (activity level of each process) that meets a
+    final demand f. Factorizing is the expensive part; each solve then only
+    costs two triangular substitutions.
+    """
+
+    def __init__(self, technology):
+        rows, columns = technology.shape
+        if rows != columns or not rows:
+            raise MatrixError(
+                f"The technology matrix is {rows} goods x {columns} processes; "
+                "solving needs a square matrix (one reference good per process)."
+            )
+        self.technology = technology
+        try:
+            self.lu = splu(technology.matrix.tocsc())
+        except RuntimeError as exc:  # exactly singular
+            raise MatrixError(f"The technology matrix is singular: {exc}.")
+
+    @property
+    def version(self):
+        return self.technology.version
+
+    def demand(self, quantities):
+        """Dense final demand vector from a {good id: quantity} mapping."""
+        return self.demands([quantities])[:, 0]
+
+    def demands(self, mappings):
+        """
+        goods x k matrix of final demand vectors, one column per {good id:
+        quantity} mapping. All the good ids are located in one pass.
+        """
+        columns = np.repeat(np.arange(len(mappings)), [len(q) for q in mappings])
+        good_ids = [g for q in mappings for g in q]
+        quantities = np.fromiter(
+            (v for q in mappings for v in q.values()),
+            dtype=np.float64,
+            count=len(good_ids),
+        )
+        f = np.zeros((self.technology.shape[0], len(mappings)))
+        np.add.at(f, (self.technology.good_positions(good_ids), columns), quantities)
+        return f
+
+    def solve(self, f):
+        """Scaling vector(s) for a demand vector, or a goods x k matrix of them."""
+        s = self.lu.solve(np.asarray(f, dtype=np.float64))
+        if not np.isfinite(s).all():
+            raise MatrixError("The technology matrix is numerically singular.")
+        return s
+
+
+@lru_cache(maxsize=settings.SOLVER_CACHE_SIZE)
+def _solver(project_id, version):
+    return Solver(technology_matrix(project_id, version))
+
+
+def solver(project_id):
+    """The project's Solver, factorized once per data version."""
+    return _solver(project_id, data_version(project_id))
+
+
+# One row per (scenario, good) of a batch of demands, sorted by scenario
+DEMAND_DTYPE = np.dtype([("scenario", "<i8"), ("good", "<i8"), ("quantity", "<f8")])
+
+
+def write_demands(path, mappings):
+    """
+    Save {good id: quantity} mappings as a .npy array of DEMAND_DTYPE rows,
+    a few bytes per non-zero demand instead of a JSON document.
+    """
+    rows = np.fromiter(
+        (
+            (scenario, good, quantity)
+            for scenario, mapping in enumerate(mappings)
+            for good, quantity in mapping.items()
+        ),
+        dtype=DEMAND_DTYPE,
+        count=sum(len(mapping) for mapping in mappings),
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path, rows)
+
+
+def read_demands(path, start, stop):
+    """Mappings of scenarios start to stop - 1 of a write_demands() file."""
+    rows = np.load(path, mmap_mode="r")
+    scenarios = rows["scenario"]
+    lo, hi = np.searchsorted(scenarios, [start, stop])
+    mappings = [{} for _ in range(stop - start)]
+    for scenario, good, quantity in rows[lo:hi].tolist():
+        mappings[scenario - start][good] = quantity
+    return mappings
+
+
+def solve_demands(project_id, mappings, version=None):
+    """
+    Scaling vectors (k x processes) for k {good id: quantity} mappings, all
+    solved against one factorization in a single call. With `version`,
+    MatrixError if the project's data has changed since.
+    """
+    project_solver = solver(project_id)
+    if version is not None and project_solver.version != version:
+        raise MatrixError(
+            f"The project's data changed (version {project_solver.version}, "
+            f"expected {version})."
+        )
+    return project_solver.solve(project_solver.demands(mappings)).T
+
+
+def inventory(project_id, quantities):
+    """
+    Life-cycle inventory of a {good id: quantity} final demand: the
+    InterventionMatrix used and the total of each of its flow types.
+    """
+    project_solver = solver(project_id)
+    interventions = intervention_matrix(project_id, project_solver.version)
+    scaling = project_solver.solve(project_solver.demand(quantities))
+    return interventions, interventions.matrix @ scaling
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScenarioJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "domains",
+                    models.JSONField(
+                        help_text="One list of Term ids per dimension of the scenario space."
+                    ),
+                ),
+                (
+                    "whitelists",
+                    models.JSONField(
+                        blank=True,
+                        default=list,
+                        help_text="Rules {dimension index: Term id}; an assignment must match one of them.",
+                    ),
+                ),
+                (
+                    "blacklists",
+                    models.JSONField(
+                        blank=True,
+                        default=list,
+                        help_text="Rules {dimension index: Term id}; an assignment must match none of them.",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("success", "Success"),
+                            ("failure", "Failure"),
+                        ],
+                        default="pending",
+                        max_length=16,
+                    ),
+                ),
+                ("task_id", models.CharField(blank=True, max_length=255, null=True)),
+                (
+                    "total",
+                    models.BigIntegerField(
+                        blank=True,
+                        help_text="Number of admissible combinations.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "produced",
+                    models.BigIntegerField(
+                        default=0, help_text="Number of combinations written so far."
+                    ),
+                ),
+                (
+                    "chunk_size",
+                    models.PositiveIntegerField(
+                        help_text="Number of combinations per result chunk."
+                    ),
+                ),
+                ("chunk_count", models.PositiveIntegerField(default=0)),
+                ("error", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scenario_jobs",
+                        to="core.project",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Scenario Job",
+                "verbose_name_plural": "Scenario Jobs",
+            },
+        ),
+    ]
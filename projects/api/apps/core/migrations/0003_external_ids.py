@@ -0,0 +1,98 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_scenariojob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conservedentity",
+            name="external_id",
+            field=models.CharField(
+                blank=True,
+                help_text="Identifier of the conserved entity in the imported workbook (MARCOT consId).",
+                max_length=128,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="economicflow",
+            name="external_id",
+            field=models.CharField(
+                blank=True,
+                help_text="Identifier of the flow in the imported workbook, unique per process.",
+                max_length=128,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="good",
+            name="external_id",
+            field=models.CharField(
+                blank=True,
+                help_text="Identifier of the good in the imported workbook (MARCOT productId).",
+                max_length=128,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="process",
+            name="external_id",
+            field=models.CharField(
+                blank=True,
+                help_text="Identifier of the process in the imported workbook (MARCOT activityId).",
+                max_length=128,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="transformableentity",
+            name="external_id",
+            field=models.CharField(
+                blank=True,
+                help_text="Identifier of the transformable entity in the imported workbook (MARCOT id).",
+                max_length=128,
+                null=True,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="conservedentity",
+            constraint=models.UniqueConstraint(
+                fields=("project", "external_id"),
+                name="unique_conserved_entity_external_id_per_project",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="economicflow",
+            constraint=models.UniqueConstraint(
+                fields=("process", "external_id"),
+                name="unique_economic_flow_external_id_per_process",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="good",
+            constraint=models.UniqueConstraint(
+                fields=("project", "external_id"),
+                name="unique_good_external_id_per_project",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="process",
+            constraint=models.UniqueConstraint(
+                fields=("project", "external_id"),
+                name="unique_process_external_id_per_project",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="transformableentity",
+            constraint=models.UniqueConstraint(
+                fields=("project", "external_id"),
+                name="unique_transformable_entity_external_id_per_project",
+            ),
+        ),
+    ]
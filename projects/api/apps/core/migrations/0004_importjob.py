@@ -0,0 +1,92 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_external_ids"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "file",
+                    models.FileField(
+                        help_text="Uploaded MARCOT .xlsx workbook.",
+                        upload_to="imports/",
+                    ),
+                ),
+                (
+                    "dry_run",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Validate and report without keeping any change.",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("success", "Success"),
+                            ("failure", "Failure"),
+                            ("cancelled", "Cancelled"),
+                        ],
+                        default="pending",
+                        max_length=16,
+                    ),
+                ),
+                ("task_id", models.CharField(blank=True, max_length=255, null=True)),
+                (
+                    "sheets",
+                    models.JSONField(
+                        blank=True,
+                        default=list,
+                        help_text="Per-sheet rows, timings and progress of the last run.",
+                    ),
+                ),
+                (
+                    "report",
+                    models.TextField(
+                        blank=True,
+                        help_text="Output of the import command (timings and change summary).",
+                        null=True,
+                    ),
+                ),
+                ("error", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "project",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Project to update in place; set to the imported project once done.",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="import_jobs",
+                        to="core.project",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Import Job",
+                "verbose_name_plural": "Import Jobs",
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_importjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="data_version",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Incremented whenever the project's flows change; keys cached matrices.",
+            ),
+        ),
+    ]
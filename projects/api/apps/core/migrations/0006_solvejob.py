@@ -0,0 +1,82 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_project_data_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SolveJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "demands",
+                    models.JSONField(
+                        help_text="One final demand {good id: quantity} per scenario."
+                    ),
+                ),
+                (
+                    "data_version",
+                    models.PositiveIntegerField(
+                        help_text="Project data version the demands were checked against."
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("success", "Success"),
+                            ("failure", "Failure"),
+                        ],
+                        default="pending",
+                        max_length=16,
+                    ),
+                ),
+                ("task_id", models.CharField(blank=True, max_length=255, null=True)),
+                (
+                    "total",
+                    models.PositiveIntegerField(
+                        help_text="Number of demands in the batch."
+                    ),
+                ),
+                (
+                    "solved",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of demands solved so far."
+                    ),
+                ),
+                ("error", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="solve_jobs",
+                        to="core.project",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Solve Job",
+                "verbose_name_plural": "Solve Jobs",
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_solvejob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="elementaryflowcompartment",
+            name="external_id",
+            field=models.CharField(
+                blank=True,
+                help_text="Identifier of the compartment in the imported workbook (MARCOT comp, or comp/subcomp).",
+                max_length=256,
+                null=True,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="elementaryflowcompartment",
+            constraint=models.UniqueConstraint(
+                fields=("project", "external_id"),
+                name="unique_compartment_external_id_per_project",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:13
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_compartment_external_id"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="solvejob",
+            name="demands",
+        ),
+    ]
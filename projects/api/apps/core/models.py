@@ -1,4 +1,8 @@
+import os
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
 class Project(models.Model):
@@ -20,6 +24,12 @@ class Project(models.Model):
         auto_now=True,
     )
 
+    data_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Incremented whenever the project's flows change; keys cached matrices.",
+    )
+
     def __str__(self):
         return self.name
 
@@ -143,12 +153,25 @@ class ConservedEntity(TermMixin):
         help_text="Molar mass of the conserved entity in g/mol.",
     )
 
+    external_id = models.CharField(
+        max_length=128,
+        blank=True,
+        null=True,
+        help_text="Identifier of the conserved entity in the imported workbook (MARCOT consId).",
+    )
+
     def __str__(self):
         return self.name
 
     class Meta:
         verbose_name = "Conserved Entity"
         verbose_name_plural = "Conserved Entities"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project", "external_id"],
+                name="unique_conserved_entity_external_id_per_project",
+            )
+        ]
 
 
 class TransformableEntity(TermMixin):
@@ -169,12 +192,25 @@ class TransformableEntity(TermMixin):
         help_text="Short name or symbol for the transformable entity (e.g., 'CH4' for Methane).",
     )
 
+    external_id = models.CharField(
+        max_length=128,
+        blank=True,
+        null=True,
+        help_text="Identifier of the transformable entity in the imported workbook (MARCOT id).",
+    )
+
     def __str__(self):
         return self.name
 
     class Meta:
         verbose_name = "Transformable Entity"
         verbose_name_plural = "Transformable Entities"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project", "external_id"],
+                name="unique_transformable_entity_external_id_per_project",
+            )
+        ]
 
 
 class Good(TermMixin):
@@ -199,9 +235,24 @@ class Good(TermMixin):
         help_text="Reference unit for the good.",
     )
 
+    external_id = models.CharField(
+        max_length=128,
+        blank=True,
+        null=True,
+        help_text="Identifier of the good in the imported workbook (MARCOT productId).",
+    )
+
     def __str__(self):
         return f"{self.name} ({self.project})"
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project", "external_id"],
+                name="unique_good_external_id_per_project",
+            )
+        ]
+
 
 class TransformableEntityContainConservedEntity(models.Model):
 
@@ -327,12 +378,25 @@ class Process(models.Model):
         blank=True,
     )
 
+    external_id = models.CharField(
+        max_length=128,
+        blank=True,
+        null=True,
+        help_text="Identifier of the process in the imported workbook (MARCOT activityId).",
+    )
+
     def __str__(self):
         return self.name
 
     class Meta:
         verbose_name = "Process"
         verbose_name_plural = "Processes"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project", "external_id"],
+                name="unique_process_external_id_per_project",
+            )
+        ]
 
 
 class EconomicFlow(models.Model):
@@ -370,6 +434,21 @@ class EconomicFlow(models.Model):
         help_text="True if the good is a byproduct of the process, False otherwise.",
     )
 
+    external_id = models.CharField(
+        max_length=128,
+        blank=True,
+        null=True,
+        help_text="Identifier of the flow in the imported workbook, unique per process.",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["process", "external_id"],
+                name="unique_economic_flow_external_id_per_process",
+            )
+        ]
+
 
 class ElementaryFlowCompartment(models.Model):
     project = models.ForeignKey(
@@ -396,9 +475,25 @@ class ElementaryFlowCompartment(models.Model):
         help_text="Parent compartment if this is a sub-compartment.",
     )
 
+    external_id = models.CharField(
+        max_length=256,
+        blank=True,
+        null=True,
+        help_text="Identifier of the compartment in the imported workbook "
+        "(MARCOT comp, or comp/subcomp).",
+    )
+
     def __str__(self):
         return f"{self.name} ({self.project.name})"
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project", "external_id"],
+                name="unique_compartment_external_id_per_project",
+            )
+        ]
+
 
 class ProductionFactor(models.Model):
 
@@ -544,3 +639,340 @@ class FinalDemand(models.Model):
                 fields=["project", "good"], name="unique_final_demand_per_project_good"
             )
         ]
+
+
+class ScenarioJob(models.Model):
+    """
+    Server-side enumeration of a scenario space (see apps.core.scenarios).
+
+    Each dimension of the space is a list of Term ids; whitelists/blacklists
+    map a dimension index to a Term id. Results are written by a Celery task
+    as compressed columnar chunks under MEDIA_ROOT.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCESS = "success"
+    STATUS_FAILURE = "failure"
+
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name="scenario_jobs",
+    )
+
+    domains = models.JSONField(
+        help_text="One list of Term ids per dimension of the scenario space.",
+    )
+
+    whitelists = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Rules {dimension index: Term id}; an assignment must match one of them.",
+    )
+
+    blacklists = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Rules {dimension index: Term id}; an assignment must match none of them.",
+    )
+
+    status = models.CharField(
+        max_length=16,
+        choices=[
+            (STATUS_PENDING, "Pending"),
+            (STATUS_RUNNING, "Running"),
+            (STATUS_SUCCESS, "Success"),
+            (STATUS_FAILURE, "Failure"),
+        ],
+        default=STATUS_PENDING,
+    )
+
+    task_id = models.CharField(
+        max_length=255,
+        blank=True,
+        null=True,
+    )
+
+    total = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Number of admissible combinations.",
+    )
+
+    produced = models.BigIntegerField(
+        default=0,
+        help_text="Number of combinations written so far.",
+    )
+
+    chunk_size = models.PositiveIntegerField(
+        help_text="Number of combinations per result chunk.",
+    )
+
+    chunk_count = models.PositiveIntegerField(
+        default=0,
+    )
+
+    error = models.TextField(
+        blank=True,
+        null=True,
+    )
+
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+    )
+
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+    )
+
+    def __str__(self):
+        return f"Scenario job #{self.pk} ({self.status})"
+
+    @property
+    def results_dir(self):
+        return os.path.join(settings.MEDIA_ROOT, "scenarios", str(self.pk))
+
+    def progress(self):
+        # Throughput and ETA are derived from the counters the task updates
+        # after each chunk, so polling never touches the result files.
+        end = self.finished_at or timezone.now()
+        elapsed = (end - self.started_at).total_seconds() if self.started_at else 0.0
+        throughput = self.produced / elapsed if elapsed > 0 else None
+        remaining = (self.total - self.produced) if self.total is not None else None
+        eta = None
+        if remaining is not None and throughput:
+            eta = remaining / throughput
+        return {
+            "produced": self.produced,
+            "total": self.total,
+            "percent": (100.0 * self.produced / self.total if self.total else None),
+            "elapsed_seconds": elapsed,
+            "throughput_per_second": throughput,
+            "eta_seconds": eta,
+        }
+
+    class Meta:
+        verbose_name = "Scenario Job"
+        verbose_name_plural = "Scenario Jobs"
+
+
+class SolveJob(models.Model):
+    """
+    Batch of final demands solved by Celery tasks against one factorization
+    of a project's technology matrix (see apps.core.matrices). The demands
+    are kept in a file under the job's directory, chunks of them are solved
+    by a pool of workers and the scaling vectors are merged into one .npz
+    archive under MEDIA_ROOT.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCESS = "success"
+    STATUS_FAILURE = "failure"
+
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name="solve_jobs",
+    )
+
+    data_version = models.PositiveIntegerField(
+        help_text="Project data version the demands were checked against.",
+    )
+
+    status = models.CharField(
+        max_length=16,
+        choices=[
+            (STATUS_PENDING, "Pending"),
+            (STATUS_RUNNING, "Running"),
+            (STATUS_SUCCESS, "Success"),
+            (STATUS_FAILURE, "Failure"),
+        ],
+        default=STATUS_PENDING,
+    )
+
+    task_id = models.CharField(
+        max_length=255,
+        blank=True,
+        null=True,
+    )
+
+    total = models.PositiveIntegerField(
+        help_text="Number of demands in the batch.",
+    )
+
+    solved = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of demands solved so far.",
+    )
+
+    error = models.TextField(
+        blank=True,
+        null=True,
+    )
+
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+    )
+
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+    )
+
+    def __str__(self):
+        return f"Solve job #{self.pk} ({self.status})"
+
+    @property
+    def directory(self):
+        """Demands and solved chunks, removed once the result is written."""
+        return os.path.join(settings.MEDIA_ROOT, "solves", str(self.pk))
+
+    @property
+    def demands_path(self):
+        return os.path.join(self.directory, "demands.npy")
+
+    def chunk_path(self, start):
+        return os.path.join(self.directory, f"scaling-{start}.npy")
+
+    @property
+    def result_path(self):
+        return os.path.join(settings.MEDIA_ROOT, "solves", f"{self.pk}.npz")
+
+    def progress(self):
+        end = self.finished_at or timezone.now()
+        elapsed = (end - self.started_at).total_seconds() if self.started_at else 0.0
+        return {
+            "solved": self.solved,
+            "total": self.total,
+            "percent": 100.0 * self.solved / self.total if self.total else None,
+            "elapsed_seconds": elapsed,
+        }
+
+    class Meta:
+        verbose_name = "Solve Job"
+        verbose_name_plural = "Solve Jobs"
+
+
+class ImportJob(models.Model):
+    """
+    Upload of a MARCOT workbook imported by a Celery task (see the
+    import_marcot command). Without a project the workbook becomes a new
+    project; with one, that project is updated in place.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCESS = "success"
+    STATUS_FAILURE = "failure"
+    STATUS_CANCELLED = "cancelled"
+
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+    file = models.FileField(
+        upload_to="imports/",
+        help_text="Uploaded MARCOT .xlsx workbook.",
+    )
+
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="import_jobs",
+        help_text="Project to update in place; set to the imported project once done.",
+    )
+
+    dry_run = models.BooleanField(
+        default=False,
+        help_text="Validate and report without keeping any change.",
+    )
+
+    status = models.CharField(
+        max_length=16,
+        choices=[
+            (STATUS_PENDING, "Pending"),
+            (STATUS_RUNNING, "Running"),
+            (STATUS_SUCCESS, "Success"),
+            (STATUS_FAILURE, "Failure"),
+            (STATUS_CANCELLED, "Cancelled"),
+        ],
+        default=STATUS_PENDING,
+    )
+
+    task_id = models.CharField(
+        max_length=255,
+        blank=True,
+        null=True,
+    )
+
+    sheets = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Per-sheet rows, timings and progress of the last run.",
+    )
+
+    report = models.TextField(
+        blank=True,
+        null=True,
+        help_text="Output of the import command (timings and change summary).",
+    )
+
+    error = models.TextField(
+        blank=True,
+        null=True,
+    )
+
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+    )
+
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+    )
+
+    def __str__(self):
+        return f"Import job #{self.pk} ({self.status})"
+
+    def progress(self, snapshot=None):
+        # While running, the import holds its database transaction open, so
+        # live figures come from the task state (`snapshot`); the stored
+        # `sheets` are only written once the task ends.
+        snapshot = snapshot or {}
+        sheets = snapshot.get("sheets", self.sheets)
+        percent = snapshot.get("percent")
+        if self.status == self.STATUS_SUCCESS:
+            percent = 100.0
+        end = self.finished_at or timezone.now()
+        elapsed = (end - self.started_at).total_seconds() if self.started_at else 0.0
+        rows = sum(s["rows"] for s in sheets)
+        return {
+            "sheet": snapshot.get("sheet"),
+            "percent": percent,
+            "rows": rows,
+            "elapsed_seconds": elapsed,
+            "rows_per_second": rows / elapsed if elapsed > 0 else None,
+            "sheets": sheets,
+        }
+
+    class Meta:
+        verbose_name = "Import Job"
+        verbose_name_plural = "Import Jobs"
@@ -0,0 +1,1070 @@
+"""
+Moteur de génération de scénarios: énumération des combinaisons de modalités
+(une par dimension) admissibles au regard de règles whitelist / blacklist.
+
+Une règle est un dict dim -> modalité. Une affectation est admissible si elle
+couvre au moins une WL (quand il y en a) et ne couvre aucune BL.
+"""
+
+import bisect
+import collections
+import concurrent.futures
+import itertools
+import os
+import random
+import sys
+
+
+class SpaceTooComplex(ValueError):
+    """
+    Comptage exact abandonné: la programmation dynamique dépasserait
+    CompiledSpace.MAX_STATES états (le problème est #P-difficile en général).
+    """
+
+
+def compatible_with_rule(partial, rule):
+    """Vrai si 'partial' ne contredit pas 'rule' (tous les dims fixés des 2 concordent)."""
+    for d, v in partial.items():
+        if d in rule and rule[d] != v:
+            return False
+    return True
+
+
+def matches_rule_complete(assign, rule):
+    """Vrai si 'assign' couvre entièrement la règle (toutes les clés de rule y sont identiques)."""
+    return all(assign.get(d, object()) == v for d, v in rule.items())
+
+
+def still_whitelisted(partial, whitelists):
+    """Vrai si au moins une WL reste possible en prolongeant 'partial'."""
+    if not whitelists:
+        return True
+    return any(compatible_with_rule(partial, wl) for wl in whitelists)
+
+
+def violates_blacklist(partial, blacklists):
+    """Vrai si une BL est déjà entièrement satisfaite par 'partial' -> prune immédiat."""
+    return any(matches_rule_complete(partial, bl) for bl in blacklists)
+
+
+def generate_dfs(domains, whitelists=None, blacklists=None):
+    """Itérateur de référence sur dict (re-scan de toutes les règles à chaque noeud)."""
+    whitelists = whitelists or []
+    blacklists = blacklists or []
+    n = len(domains)
+
+    def dfs(i, partial):
+        # Pruning précoce
+        if violates_blacklist(partial, blacklists):
+            return
+        if not still_whitelisted(partial, whitelists):
+            return
+
+        if i == n:
+            # feuille: exiger correspondance WL complète s'il y en a
+            if (not whitelists) or any(
+                matches_rule_complete(partial, wl) for wl in whitelists
+            ):
+                yield dict(partial)
+            return
+
+        for val in domains[i]:
+            partial[i] = val
+            yield from dfs(i + 1, partial)
+        partial.pop(i, None)
+
+    yield from dfs(0, {})
+
+
+class CompiledSpace:
+    """
+    Espace de combinaisons compilé.
+
+    Les modalités de chaque dimension sont internées en codes entiers (leur
+    position dans le domaine) et les règles sont pré-indexées par dimension et
+    par code: fixer la dimension d revient à un ET binaire avec le masque des
+    WL/BL encore compatibles avec ce code. Seules les règles touchées par la
+    dimension qu'on vient de fixer sont donc réévaluées.
+    """
+
+    def __init__(self, domains, whitelists=None, blacklists=None):
+        whitelists = whitelists or []
+        blacklists = blacklists or []
+        self.n = len(domains)
+        self.labels = [list(dom) for dom in domains]
+        self.sizes = [len(lab) for lab in self.labels]
+        # Une liste de WL non vide impose une correspondance, même si toutes
+        # ses règles sont impossibles (dans ce cas rien n'est admissible).
+        self.has_whitelists = bool(whitelists)
+
+        wls = [r for r in map(self._compile_rule, whitelists) if r is not None]
+        bls = [r for r in map(self._compile_rule, blacklists) if r is not None]
+        self.whitelists = wls
+        self.blacklists = bls
+
+        self.wl_init = (1 << len(wls)) - 1
+        self.bl_init = (1 << len(bls)) - 1
+        # BL vide => elle couvre toute affectation, y compris la racine.
+        self.root_blocked = any(not bl for bl in bls)
+
+        self.wl_keep = [self._keep_masks(wls, d) for d in range(self.n)]
+        self.bl_keep = [self._keep_masks(bls, d) for d in range(self.n)]
+        # BL complètement fixées une fois la dimension d atteinte.
+        self.bl_done = [0] * self.n
+        for j, bl in enumerate(bls):
+            if bl:
+                self.bl_done[max(bl)] |= 1 << j
+        # WL dont toutes les dimensions sont < d: déjà satisfaites si vivantes.
+        self.wl_sat = [0] * (self.n + 1)
+        for j, wl in enumerate(wls):
+            for d in range(max(wl) + 1 if wl else 0, self.n + 1):
+                self.wl_sat[d] |= 1 << j
+
+        # Codes regroupés par signature (masques WL, BL) pour le comptage:
+        # toutes les modalités non citées par une règle tombent dans la même classe.
+        self.classes = []
+        for d in range(self.n):
+            groups = {}
+            for wk, bk in zip(self.wl_keep[d], self.bl_keep[d]):
+                groups[wk, bk] = groups.get((wk, bk), 0) + 1
+            self.classes.append([(wk, bk, m) for (wk, bk), m in groups.items()])
+        self._memo = {}
+        self._cumulative = {}
+        self._count = None
+
+    def _compile_rule(self, rule):
+        """Règle dim->val en dim->frozenset(codes), ou None si elle ne peut jamais matcher."""
+        compiled = {}
+        for d, v in rule.items():
+            if not isinstance(d, int) or not 0 <= d < self.n:
+                return None
+            codes = frozenset(c for c, lab in enumerate(self.labels[d]) if lab == v)
+            if not codes:
+                return None
+            compiled[d] = codes
+        return compiled
+
+    def _keep_masks(self, rules, d):
+        """Pour chaque code de d, masque des règles qui restent compatibles."""
+        constrained = 0
+        allow = [0] * self.sizes[d]
+        for j, rule in enumerate(rules):
+            if d in rule:
+                constrained |= 1 << j
+                for c in rule[d]:
+                    allow[c] |= 1 << j
+        free = ((1 << len(rules)) - 1) & ~constrained
+        return [free | a for a in allow]
+
+    # ---------------------------------------------------------------------
+    # Comptage
+    # ---------------------------------------------------------------------
+
+    # Au-delà de ce nombre de règles, l'inclusion-exclusion (2^k sous-ensembles
+    # au pire) cède la place à la programmation dynamique sur les dimensions.
+    IE_MAX_RULES = 12
+
+    # Nombre maximal d'états d'une programmation dynamique (comptage, rang):
+    # au-delà, SpaceTooComplex plutôt que des minutes de calcul et de mémoire.
+    MAX_STATES = 200_000
+
+    def count(self, method=None):
+        """
+        Nombre exact d'affectations admissibles, sans énumération.
+        SpaceTooComplex si la programmation dynamique dépasse MAX_STATES états.
+        """
+        if method is None and self._count is not None:
+            return self._count
+        if self.root_blocked or (self.has_whitelists and not self.wl_init):
+            return 0
+        if method is None:
+            n_rules = len(self.whitelists) + len(self.blacklists)
+            method = "ie" if n_rules <= self.IE_MAX_RULES else "dp"
+        if method == "ie":
+            total = self._count_ie()
+        elif method == "dp":
+            total = self._count_dp()
+        else:
+            raise ValueError(f"Méthode de comptage inconnue: {method!r}")
+        self._count = total
+        return total
+
+    def _count_ie(self):
+        """
+        Inclusion-exclusion: |U(WL) - U(BL)| = somme signée de N(T u U) sur les
+        T non vides de WL (T vide s'il n'y a pas de WL) et les U de BL.
+        Un sous-ensemble dont les règles se contredisent vaut 0, ainsi que tous
+        ses sur-ensembles: la branche est coupée. N() est mémoïsé sur la
+        contrainte fusionnée, souvent partagée par plusieurs sous-ensembles.
+        """
+        rules = [(wl, True) for wl in self.whitelists]
+        rules += [(bl, False) for bl in self.blacklists]
+        sizes = self.sizes
+        cache = {}
+
+        def size_of(constraint):
+            key = frozenset(constraint.items())
+            if key not in cache:
+                total = 1
+                for d, size in enumerate(sizes):
+                    total *= len(constraint[d]) if d in constraint else size
+                cache[key] = total
+            return cache[key]
+
+        def walk(i, constraint, sign, has_wl):
+            total = 0
+            if has_wl or not self.has_whitelists:
+                total += sign * size_of(constraint)
+            for j in range(i, len(rules)):
+                rule, is_wl = rules[j]
+                if self.has_whitelists and not (has_wl or is_wl):
+                    # Les WL sont en tête: sans WL choisie, plus rien ne compte.
+                    break
+                merged = dict(constraint)
+                for d, codes in rule.items():
+                    merged[d] = merged[d] & codes if d in merged else codes
+                    if not merged[d]:
+                        break
+                else:
+                    # Seule la première WL choisie ne change pas le signe.
+                    first_wl = is_wl and not has_wl
+                    next_sign = sign if first_wl else -sign
+                    total += walk(j + 1, merged, next_sign, has_wl or is_wl)
+            return total
+
+        return walk(0, {}, 1, False)
+
+    def _count_dp(self):
+        """
+        Admissibles = évitent toutes les BL, moins celles qui évitent aussi
+        toutes les WL: deux comptes d'affectations "qui ne couvrent aucune
+        règle", beaucoup plus simples à factoriser (voir _count_avoiding).
+        """
+        total = self._count_avoiding(self.blacklists)
+        if self.has_whitelists and total:
+            total -= self._count_avoiding(self.blacklists + self.whitelists)
+        return total
+
+    def _count_avoiding(self, rules):
+        """
+        Nombre d'affectations ne couvrant aucune des règles compilées 'rules'.
+
+        Une règle sur une seule dimension retire simplement ses codes du
+        domaine. Les autres relient leurs dimensions: chaque composante
+        connexe se compte indépendamment (le total est le produit), par une
+        programmation dynamique dont l'état est l'ensemble des règles
+        entamées et encore couvertes. Les dimensions d'une composante sont
+        ordonnées pour garder ce nombre de règles "ouvertes" petit.
+        """
+        banned = [set() for _ in range(self.n)]
+        linked = []
+        for rule in {tuple(sorted(r.items())): r for r in rules}.values():
+            if not rule:
+                return 0  # règle vide: elle couvre toute affectation
+            if len(rule) == 1:
+                ((d, codes),) = rule.items()
+                banned[d] |= codes
+            else:
+                linked.append(rule)
+
+        # Composantes connexes des dimensions (union-find)
+        parent = list(range(self.n))
+
+        def find(d):
+            while parent[d] != d:
+                parent[d] = parent[parent[d]]
+                d = parent[d]
+            return d
+
+        for rule in linked:
+            first, *others = rule
+            for d in others:
+                parent[find(d)] = find(first)
+        components = collections.defaultdict(list)
+        for rule in linked:
+            components[find(next(iter(rule)))].append(rule)
+
+        total = 1
+        for d in range(self.n):
+            if find(d) == d and d not in components:
+                total *= self.sizes[d] - len(banned[d])
+        for component in components.values():
+            if not total:
+                break
+            total *= self._count_component(component, banned)
+        return total
+
+    def _count_component(self, rules, banned):
+        """Affectations des dimensions de 'rules' (connexes) n'en couvrant aucune."""
+        dims = sorted({d for rule in rules for d in rule})
+        order = []
+        placed = set()
+        # Ordre glouton: la dimension qui laisse le moins de règles ouvertes
+        # (entamées mais pas terminées), puis celle qui en ferme le plus.
+        while len(order) < len(dims):
+
+            def cost(d):
+                now = placed | {d}
+                open_rules = sum(
+                    1 for rule in rules if not rule.keys() <= now and rule.keys() & now
+                )
+                closed = sum(1 for rule in rules if d in rule and rule.keys() <= now)
+                return (open_rules, -closed, d)
+
+            d = min((d for d in dims if d not in placed), key=cost)
+            order.append(d)
+            placed.add(d)
+
+        position = {d: i for i, d in enumerate(order)}
+        all_rules = (1 << len(rules)) - 1
+        finishing = [0] * len(order)
+        for j, rule in enumerate(rules):
+            finishing[max(position[d] for d in rule)] |= 1 << j
+
+        states = {all_rules: 1}
+        for i, d in enumerate(order):
+            keep = self._keep_masks(rules, d)
+            groups = collections.Counter(
+                k for c, k in enumerate(keep) if c not in banned[d]
+            )
+            done = finishing[i]
+            nxt = {}
+            for mask, k in states.items():
+                for sig, mult in groups.items():
+                    m = mask & sig
+                    if m & done:
+                        continue  # règle entièrement couverte
+                    nxt[m] = nxt.get(m, 0) + k * mult
+            if len(nxt) > self.MAX_STATES:
+                raise SpaceTooComplex(
+                    f"Plus de {self.MAX_STATES} états pour compter l'espace"
+                )
+            states = nxt
+            if not states:
+                return 0
+        return sum(states.values())
+
+    def live_prefixes(self):
+        """
+        Nombre de préfixes non élagués à chaque profondeur 1..n (noeuds que le
+        DFS développe), calculé par propagation des états (WL, BL) sans énumérer.
+        """
+        counts = []
+        if self.root_blocked or (self.has_whitelists and not self.wl_init):
+            return [0] * self.n
+        states = {(self.wl_init, self.bl_init): 1}
+        for d in range(self.n):
+            done = self.bl_done[d]
+            sat = self.wl_sat[d + 1]
+            nxt = {}
+            for (w, b), k in states.items():
+                for wk, bk, mult in self.classes[d]:
+                    nw, nb = w & wk, b & bk
+                    if nb & done:
+                        continue
+                    if self.has_whitelists:
+                        if not nw:
+                            continue
+                        if nw & sat:
+                            nw = -1
+                    nxt[nw, nb] = nxt.get((nw, nb), 0) + k * mult
+            states = nxt
+            counts.append(sum(states.values()))
+        return counts
+
+    def _completions(self, d, w, b):
+        """Nombre de complétions admissibles depuis la profondeur d (mémoïsé)."""
+        if self.has_whitelists:
+            if w & self.wl_sat[d]:
+                w = -1
+            elif not w:
+                return 0
+        if d == self.n:
+            return 1
+        key = (d, w, b)
+        memo = self._memo
+        if key in memo:
+            return memo[key]
+        if len(memo) >= self.MAX_STATES:
+            raise SpaceTooComplex(
+                f"Plus de {self.MAX_STATES} états pour ranger l'espace"
+            )
+        done = self.bl_done[d]
+        total = 0
+        for wk, bk, mult in self.classes[d]:
+            if b & bk & done:
+                continue
+            total += mult * self._completions(d + 1, w & wk, b & bk)
+        memo[key] = total
+        return total
+
+    # ---------------------------------------------------------------------
+    # Enumération
+    # ---------------------------------------------------------------------
+
+    def iter_codes(self, start=0):
+        """
+        DFS itératif sur les codes, dans l'ordre canonique (produit lexicographique
+        des domaines), à partir de la start-ième affectation admissible.
+        La liste produite est réutilisée: la copier si besoin.
+        """
+        n = self.n
+        if self.root_blocked or (self.has_whitelists and not self.wl_init):
+            return
+        # Sans reprise, pas de comptage: la première affectation sort tout de suite.
+        if start and start >= self.count():
+            return
+        if n == 0:
+            yield []
+            return
+
+        sizes = self.sizes
+        wl_keep, bl_keep, bl_done = self.wl_keep, self.bl_keep, self.bl_done
+        check_wl = self.has_whitelists
+        last = n - 1
+
+        codes = [-1] * n
+        wl_live = [0] * n
+        bl_live = [0] * n
+        wl_live[0], bl_live[0] = self.wl_init, self.bl_init
+
+        d = 0
+        if start:
+            # Reprise directe: on reconstruit la pile du DFS le long du chemin
+            # de la start-ième feuille puis on continue depuis cette feuille.
+            codes = self._unrank_codes(start)
+            for i in range(last):
+                c = codes[i]
+                wl_live[i + 1] = wl_live[i] & wl_keep[i][c]
+                bl_live[i + 1] = bl_live[i] & bl_keep[i][c]
+            yield codes
+            d = last
+
+        while d >= 0:
+            w0, b0 = wl_live[d], bl_live[d]
+            wk, bk, done = wl_keep[d], bl_keep[d], bl_done[d]
+
+            if d == last:
+                # Feuilles: toute WL encore vivante est entièrement couverte.
+                for c in range(codes[d] + 1, sizes[d]):
+                    if check_wl and not w0 & wk[c]:
+                        continue
+                    if b0 & bk[c] & done:
+                        continue
+                    codes[d] = c
+                    yield codes
+                codes[d] = -1
+                d -= 1
+                continue
+
+            c = codes[d] + 1
+            size = sizes[d]
+            while c < size:
+                w = w0 & wk[c]
+                if w or not check_wl:
+                    b = b0 & bk[c]
+                    if not b & done:
+                        break
+                c += 1
+
+            if c == size:
+                codes[d] = -1
+                d -= 1
+                continue
+
+            codes[d] = c
+            d += 1
+            wl_live[d], bl_live[d] = w, b
+
+    def assignments(self, start=0, stop=None):
+        """Affectations admissibles (dict dim->val) de rang start (inclus) à stop (exclu)."""
+        labels = self.labels
+        codes_iter = self.iter_codes(start)
+        if stop is not None:
+            codes_iter = itertools.islice(codes_iter, max(stop - start, 0))
+        for codes in codes_iter:
+            yield {d: labels[d][c] for d, c in enumerate(codes)}
+
+    def __iter__(self):
+        return self.assignments()
+
+    # ---------------------------------------------------------------------
+    # Sortie par lots NumPy
+    # ---------------------------------------------------------------------
+
+    def _iter_prefixes(self, depth):
+        """Préfixes admissibles de longueur depth, avec les masques WL/BL encore vivants."""
+        if self.root_blocked or (self.has_whitelists and not self.wl_init):
+            return
+        if depth == 0:
+            yield [], self.wl_init, self.bl_init
+            return
+
+        sizes = self.sizes
+        wl_keep, bl_keep, bl_done = self.wl_keep, self.bl_keep, self.bl_done
+        check_wl = self.has_whitelists
+        last = depth - 1
+
+        codes = [-1] * depth
+        wl_live = [0] * depth
+        bl_live = [0] * depth
+        wl_live[0], bl_live[0] = self.wl_init, self.bl_init
+
+        d = 0
+        while d >= 0:
+            w0, b0 = wl_live[d], bl_live[d]
+            wk, bk, done = wl_keep[d], bl_keep[d], bl_done[d]
+            c = codes[d] + 1
+            size = sizes[d]
+            while c < size:
+                w = w0 & wk[c]
+                if w or not check_wl:
+                    b = b0 & bk[c]
+                    if not b & done:
+                        break
+                c += 1
+
+            if c == size:
+                codes[d] = -1
+                d -= 1
+                continue
+
+            codes[d] = c
+            if d == last:
+                yield codes, w, b
+            else:
+                d += 1
+                wl_live[d], bl_live[d] = w, b
+
+    def batches(self, batch_size=65536):
+        """
+        Affectations admissibles en tableaux NumPy (lignes = affectations,
+        colonnes = dimensions, valeurs = codes), dans l'ordre canonique.
+
+        Les dimensions de fin dont le produit tient dans batch_size forment la
+        "queue": son produit cartésien est construit une seule fois de façon
+        vectorisée, puis filtré par masques pour chaque préfixe admissible
+        (un masque par état WL/BL, mis en cache). La mémoire reste de l'ordre
+        de batch_size lignes quelle que soit la taille de l'espace: la queue,
+        un masque par règle et un cache de masques d'au plus 4 * batch_size
+        booléens au total.
+        """
+        import numpy as np
+
+        if batch_size < 1:
+            raise ValueError(f"batch_size doit être >= 1: {batch_size!r}")
+
+        n = self.n
+        sizes = self.sizes
+        dtype = (
+            np.int32 if max(sizes, default=0) <= np.iinfo(np.int32).max else np.int64
+        )
+
+        # Plus petite profondeur t telle que le produit des dimensions t..n-1 <= batch_size.
+        t, tail_size = n, 1
+        while t > 0 and tail_size * sizes[t - 1] <= batch_size:
+            t -= 1
+            tail_size *= sizes[t]
+        if t < n:
+            tail = np.indices(sizes[t:], dtype=dtype).reshape(n - t, -1).T
+        else:
+            tail = np.zeros((1, 0), dtype=dtype)
+
+        def tail_matches(rule):
+            match = np.ones(len(tail), dtype=bool)
+            for d, codes in rule.items():
+                if d >= t:
+                    match &= np.isin(tail[:, d - t], list(codes))
+            return match
+
+        wl_match = [tail_matches(wl) for wl in self.whitelists]
+        bl_match = [tail_matches(bl) for bl in self.blacklists]
+
+        def bits(mask):
+            j = 0
+            while mask:
+                if mask & 1:
+                    yield j
+                mask >>= 1
+                j += 1
+
+        # Nombre de masques en cache: au plus 4 * batch_size booléens au total
+        cache_size = min(1024, max(1, 4 * batch_size // len(tail)))
+        keep_cache = {}
+
+        def keep_mask(w, b):
+            key = (w, b)
+            if key not in keep_cache:
+                if len(keep_cache) >= cache_size:
+                    keep_cache.clear()
+                keep = np.ones(len(tail), dtype=bool)
+                if self.has_whitelists:
+                    ok = np.zeros(len(tail), dtype=bool)
+                    for j in bits(w):
+                        ok |= wl_match[j]
+                    keep &= ok
+                for j in bits(b):
+                    keep &= ~bl_match[j]
+                keep_cache[key] = None if keep.all() else keep
+            return keep_cache[key]
+
+        out = np.empty((batch_size, n), dtype=dtype)
+        fill = 0
+        for prefix, w, b in self._iter_prefixes(t):
+            keep = keep_mask(w, b)
+            rows = tail if keep is None else tail[keep]
+            pos = 0
+            while pos < len(rows):
+                take = min(len(rows) - pos, batch_size - fill)
+                out[fill : fill + take, :t] = prefix
+                out[fill : fill + take, t:] = rows[pos : pos + take]
+                fill += take
+                pos += take
+                if fill == batch_size:
+                    yield out
+                    out = np.empty((batch_size, n), dtype=dtype)
+                    fill = 0
+        if fill:
+            yield out[:fill]
+
+    def label_tables(self):
+        """Tables code -> modalité par dimension (tableaux NumPy d'objets)."""
+        import numpy as np
+
+        tables = []
+        for labels in self.labels:
+            table = np.empty(len(labels), dtype=object)
+            table[:] = labels
+            tables.append(table)
+        return tables
+
+    # ---------------------------------------------------------------------
+    # Rang / accès direct
+    # ---------------------------------------------------------------------
+
+    def _branch_count(self, d, w, b, c):
+        """Nombre de feuilles admissibles sous le code c fixé à la profondeur d."""
+        bk = self.bl_keep[d][c]
+        if b & bk & self.bl_done[d]:
+            return 0
+        return self._completions(d + 1, w & self.wl_keep[d][c], b & bk)
+
+    def rank(self, assignment):
+        """Position de 'assignment' dans l'ordre de generate() (ValueError si non admissible)."""
+        if len(assignment) != self.n:
+            raise ValueError(f"Affectation incomplète ou invalide: {assignment!r}")
+        w, b = self.wl_init, self.bl_init
+        k = 0
+        for d in range(self.n):
+            try:
+                code = self.labels[d].index(assignment[d])
+            except (KeyError, ValueError):
+                raise ValueError(f"Affectation incomplète ou invalide: {assignment!r}")
+            for c in range(code):
+                k += self._branch_count(d, w, b, c)
+            if not self._branch_count(d, w, b, code):
+                raise ValueError(f"Affectation non admissible: {assignment!r}")
+            w &= self.wl_keep[d][code]
+            b &= self.bl_keep[d][code]
+        if self.count() == 0:
+            raise ValueError(f"Affectation non admissible: {assignment!r}")
+        return k
+
+    def _unrank_codes(self, k):
+        """Codes de la k-ième affectation admissible (descente pondérée par les comptes)."""
+        if not 0 <= k < self.count():
+            raise IndexError(f"Rang hors de l'espace admissible: {k}")
+        w, b = self.wl_init, self.bl_init
+        codes = []
+        for d in range(self.n):
+            cumulative = self._branch_cumulative(d, w, b)
+            c = bisect.bisect_right(cumulative, k)
+            if c:
+                k -= cumulative[c - 1]
+            codes.append(c)
+            w &= self.wl_keep[d][c]
+            b &= self.bl_keep[d][c]
+        return codes
+
+    def _branch_cumulative(self, d, w, b):
+        """
+        Comptes cumulés des branches sous chaque code de d, mis en cache par état:
+        une descente ne coûte ensuite qu'une recherche dichotomique par dimension.
+        """
+        key = (d, w, b)
+        cumulative = self._cumulative.get(key)
+        if cumulative is None:
+            counts = (self._branch_count(d, w, b, c) for c in range(self.sizes[d]))
+            cumulative = list(itertools.accumulate(counts))
+            self._cumulative[key] = cumulative
+        return cumulative
+
+    def sample(self, n, seed=None, replace=True):
+        """
+        n affectations tirées uniformément parmi les admissibles, en tirant des
+        rangs puis en les décodant: O(n x dimensions), indépendamment de la taille
+        de l'espace. Résultat déterministe pour une graine donnée.
+        """
+        total = self.count()
+        rng = random.Random(seed)
+        if replace:
+            if n and not total:
+                raise ValueError("Aucune affectation admissible à échantillonner")
+            ranks = [rng.randrange(total) for _ in range(n)]
+        elif n > total:
+            raise ValueError(f"Echantillon sans remise de {n} > {total} admissibles")
+        elif total <= sys.maxsize:
+            ranks = rng.sample(range(total), n)
+        else:
+            # range() trop grand pour random.sample: rejet des doublons, rares
+            # puisque n reste de toute façon très petit devant l'espace.
+            seen = set()
+            ranks = []
+            while len(ranks) < n:
+                k = rng.randrange(total)
+                if k not in seen:
+                    seen.add(k)
+                    ranks.append(k)
+        return [self.unrank(k) for k in ranks]
+
+    def unrank(self, k):
+        """k-ième affectation admissible (dict dim->val) dans l'ordre de generate()."""
+        return {d: self.labels[d][c] for d, c in enumerate(self._unrank_codes(k))}
+
+
+def generate(domains, whitelists=None, blacklists=None, start=0, stop=None):
+    """
+    Itérateur sur les affectations admissibles (dict dim->val).
+    start/stop sélectionnent une tranche [start, stop) de l'ordre canonique;
+    start est atteint directement, sans parcourir le préfixe.
+    """
+    yield from CompiledSpace(domains, whitelists, blacklists).assignments(start, stop)
+
+
+def count(domains, whitelists=None, blacklists=None):
+    """Nombre d'affectations que produirait generate(), sans les énumérer."""
+    return CompiledSpace(domains, whitelists, blacklists).count()
+
+
+def rank(domains, whitelists, blacklists, assignment):
+    """Rang de 'assignment' parmi les affectations produites par generate()."""
+    return CompiledSpace(domains, whitelists, blacklists).rank(assignment)
+
+
+def unrank(domains, whitelists, blacklists, k):
+    """Affectation de rang k, telle que produite par generate()."""
+    return CompiledSpace(domains, whitelists, blacklists).unrank(k)
+
+
+def sample(domains, whitelists, blacklists, n, seed=None, replace=True):
+    """n affectations admissibles tirées uniformément (voir CompiledSpace.sample)."""
+    return CompiledSpace(domains, whitelists, blacklists).sample(n, seed, replace)
+
+
+def generate_batches(domains, whitelists=None, blacklists=None, batch_size=65536):
+    """
+    Comme generate(), mais par lots: produit des couples (codes, tables) où codes
+    est un tableau NumPy 2-D d'au plus batch_size affectations et tables[d][code]
+    redonne la modalité de la dimension d.
+    """
+    space = CompiledSpace(domains, whitelists, blacklists)
+    tables = space.label_tables()
+    for batch in space.batches(batch_size):
+        yield batch, tables
+
+
+# -------- Planification de l'ordre des dimensions --------
+
+
+def plan_order(domains, whitelists=None, blacklists=None):
+    """
+    Ordre de parcours des dimensions: les plus contraintes d'abord.
+
+    Une dimension citée par beaucoup de règles (WL en priorité, puisqu'une WL
+    élague dès qu'on fixe une de ses dimensions) est fixée tôt; à égalité le
+    plus petit domaine passe devant. Les dimensions libres gardent leur ordre.
+    """
+    whitelists = whitelists or []
+    blacklists = blacklists or []
+    n = len(domains)
+    wl_hits = [0] * n
+    bl_hits = [0] * n
+    for rules, hits in ((whitelists, wl_hits), (blacklists, bl_hits)):
+        for rule in rules:
+            for d in rule:
+                if isinstance(d, int) and 0 <= d < n:
+                    hits[d] += 1
+
+    def score(d):
+        return (-(wl_hits[d] + bl_hits[d]), -wl_hits[d], len(domains[d]), d)
+
+    return sorted(range(n), key=score)
+
+
+def _reorder(domains, whitelists, blacklists, order):
+    """Domaines et règles réindexés pour parcourir les dimensions selon 'order'."""
+    depth_of = {d: i for i, d in enumerate(order)}
+
+    def remap(rule):
+        # Les clés hors domaine restent hors domaine (règle jamais satisfaite).
+        return {
+            depth_of.get(d, d) if isinstance(d, int) else d: v for d, v in rule.items()
+        }
+
+    return (
+        [domains[d] for d in order],
+        [remap(wl) for wl in whitelists or []],
+        [remap(bl) for bl in blacklists or []],
+    )
+
+
+def planned_space(domains, whitelists=None, blacklists=None, order=None):
+    """Espace compilé parcourant les dimensions selon 'order' (par défaut plan_order())."""
+    if order is None:
+        order = plan_order(domains, whitelists, blacklists)
+    return CompiledSpace(*_reorder(domains, whitelists, blacklists, order))
+
+
+def generate_planned(domains, whitelists=None, blacklists=None, order=None):
+    """
+    Comme generate(), mais en fixant les dimensions selon 'order' (par défaut
+    plan_order()). Les affectations sont rendues dans l'indexation d'origine;
+    l'ordre de production suit en revanche l'ordre planifié.
+    """
+    if order is None:
+        order = plan_order(domains, whitelists, blacklists)
+    space = planned_space(domains, whitelists, blacklists, order)
+    labels = space.labels
+    n = len(order)
+    depth_of = sorted(range(n), key=order.__getitem__)
+    for codes in space.iter_codes():
+        yield {d: labels[i][codes[i]] for d, i in zip(range(n), depth_of)}
+
+
+def explain(domains, whitelists=None, blacklists=None, order=None):
+    """
+    Ordre choisi et fraction de l'arbre de recherche élaguée, pour l'ordre
+    d'origine et l'ordre planifié (noeuds comptés sans énumération).
+    """
+    if order is None:
+        order = plan_order(domains, whitelists, blacklists)
+
+    full = 0
+    width = 1
+    for dom in domains:
+        width *= len(dom)
+        full += width
+
+    def visited(space):
+        return sum(space.live_prefixes())
+
+    natural = visited(CompiledSpace(domains, whitelists, blacklists))
+    planned = visited(planned_space(domains, whitelists, blacklists, order))
+    return {
+        "order": list(order),
+        "tree_nodes": full,
+        "natural_nodes": natural,
+        "planned_nodes": planned,
+        "natural_pruned": 1 - natural / full if full else 0.0,
+        "planned_pruned": 1 - planned / full if full else 0.0,
+    }
+
+
+# -------- Construction directe depuis les whitelists --------
+
+
+def generate_from_whitelists(domains, whitelists=None, blacklists=None):
+    """
+    Construit directement les affectations admissibles à partir des WL au lieu
+    de générer puis tester: pour chaque WL, ses dimensions sont fixées et seules
+    les dimensions libres sont parcourues, moins les affectations couvertes par
+    une BL. Une affectation couverte par plusieurs WL n'est produite qu'une fois,
+    avec la première: les WL précédentes sont traitées comme des BL.
+
+    Le coût est proportionnel à la sortie et non à la taille de l'espace.
+    Les affectations sont groupées par WL (ordre canonique au sein de chaque WL).
+    """
+    whitelists = whitelists or []
+    blacklists = list(blacklists or [])
+    if not whitelists:
+        yield from generate(domains, None, blacklists)
+        return
+
+    labels = [list(dom) for dom in domains]
+    n = len(labels)
+    for i, wl in enumerate(whitelists):
+        if any(not isinstance(d, int) or not 0 <= d < n for d in wl):
+            continue
+        pinned = [
+            [lab for lab in labels[d] if lab == wl[d]] if d in wl else labels[d]
+            for d in range(n)
+        ]
+        yield from CompiledSpace(pinned, None, blacklists + whitelists[:i])
+
+
+# -------- Enumération multi-processus --------
+
+# Espace compilé propre à chaque processus worker (voir _init_shard_worker).
+_worker_space = None
+
+
+def _init_shard_worker(labels, whitelists, blacklists):
+    global _worker_space
+    _worker_space = CompiledSpace(labels, whitelists, blacklists)
+
+
+def _enumerate_shard(start, stop):
+    """
+    Codes des affectations de rang [start, stop), calculés dans un worker et
+    renvoyés en un seul tableau NumPy (un tampon à sérialiser, pas une liste
+    de tuples à reconstruire objet par objet dans le parent).
+    """
+    import numpy as np
+
+    space = _worker_space
+    codes_iter = itertools.islice(space.iter_codes(start), stop - start)
+    flat = np.fromiter(
+        itertools.chain.from_iterable(codes_iter),
+        dtype=np.int64,
+        count=(stop - start) * space.n,
+    )
+    return flat.reshape(stop - start, space.n)
+
+
+def generate_parallel_batches(
+    domains,
+    whitelists=None,
+    blacklists=None,
+    workers=None,
+    ordered=True,
+    shard_size=None,
+    max_pending=None,
+):
+    """
+    Variante multi-processus de generate_batches(): produit des couples
+    (codes, tables), un tableau de codes par tranche.
+
+    L'espace admissible est découpé en tranches de rangs [k, k + shard_size):
+    grâce au comptage, chaque tranche contient exactement le même nombre
+    d'affectations, quel que soit le déséquilibre de l'arbre, et un worker
+    s'y positionne directement via unrank. ordered=True restitue l'ordre
+    canonique de generate(); ordered=False rend les tranches dès qu'elles
+    sont prêtes. Au plus max_pending tranches sont en vol (mémoire bornée),
+    et arrêter l'itération annule les tranches non démarrées.
+    """
+    space = CompiledSpace(domains, whitelists, blacklists)
+    total = space.count()
+    if not total:
+        return
+    workers = workers or os.cpu_count() or 1
+    if shard_size is None:
+        # ~8 tranches par worker pour lisser, plafonnées pour la mémoire.
+        shard_size = min(max(-(-total // (workers * 8)), 1), 100_000)
+    max_pending = max_pending or workers * 2
+    tables = space.label_tables()
+    shards = ((k, min(k + shard_size, total)) for k in range(0, total, shard_size))
+
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_shard_worker,
+        # Les domaines figés en listes: l'ordre d'itération d'un set peut
+        # différer d'un processus à l'autre (hash randomisé).
+        initargs=(space.labels, whitelists, blacklists),
+    )
+    pending = collections.deque()
+    try:
+        for start, stop in itertools.islice(shards, max_pending):
+            pending.append(executor.submit(_enumerate_shard, start, stop))
+
+        while pending:
+            if ordered:
+                done = pending.popleft()
+            else:
+                ready, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                done = ready.pop()
+                pending.remove(done)
+
+            for start, stop in itertools.islice(shards, 1):
+                pending.append(executor.submit(_enumerate_shard, start, stop))
+
+            yield done.result(), tables
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_parallel(domains, whitelists=None, blacklists=None, **options):
+    """
+    Variante multi-processus de generate(), mêmes options que
+    generate_parallel_batches(). Les workers énumèrent, mais les dicts sont
+    construits ici, dans un seul processus: c'est ce qui borne le gain dès
+    que le consommateur suit. Pour le débit, lire les tableaux de
+    generate_parallel_batches() directement.
+    """
+    labels = None
+    for batch, tables in generate_parallel_batches(
+        domains, whitelists, blacklists, **options
+    ):
+        if labels is None:
+            labels = [table.tolist() for table in tables]
+        for row in batch.tolist():
+            yield {d: labels[d][c] for d, c in enumerate(row)}
+
+
+# -------- Stockage des résultats par morceaux --------
+
+
+def chunk_path(directory, index):
+    return os.path.join(directory, f"chunk-{index:06d}.npz")
+
+
+def write_chunk(directory, index, batch):
+    """Ecrit un lot de codes (sortie de CompiledSpace.batches) en colonnes compressées."""
+    import numpy as np
+
+    columns = {f"d{d}": batch[:, d] for d in range(batch.shape[1])}
+    # np.savez_compressed ajoute .npz si absent: on passe par un fichier ouvert.
+    with open(chunk_path(directory, index), "wb") as fh:
+        np.savez_compressed(fh, **columns)
+
+
+def read_rows(directory, chunk_size, n_dims, offset, limit):
+    """
+    Lignes de codes [offset, offset + limit) d'un résultat découpé en morceaux de
+    chunk_size lignes. Seuls les morceaux concernés sont lus.
+    """
+    import numpy as np
+
+    parts = []
+    index, skip = divmod(offset, chunk_size)
+    while limit > 0:
+        path = chunk_path(directory, index)
+        if not os.path.exists(path):
+            break
+        with np.load(path) as chunk:
+            columns = [chunk[f"d{d}"][skip : skip + limit] for d in range(n_dims)]
+        rows = np.stack(columns, axis=1) if columns else np.zeros((0, 0), dtype=int)
+        if not len(rows):
+            break
+        parts.append(rows)
+        limit -= len(rows)
+        index, skip = index + 1, 0
+    if not parts:
+        return np.zeros((0, n_dims), dtype=np.int32)
+    return np.concatenate(parts)
+
+
+def brute_force(domains, whitelists=None, blacklists=None):
+    """Enumération naïve du produit cartésien filtré (référence pour les vérifications)."""
+    whitelists = whitelists or []
+    blacklists = blacklists or []
+    for values in itertools.product(*domains):
+        assign = dict(enumerate(values))
+        if violates_blacklist(assign, blacklists):
+            continue
+        if whitelists and not any(
+            matches_rule_complete(assign, wl) for wl in whitelists
+        ):
+            continue
+        yield assign
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 from .models import (
@@ -16,7 +17,11 @@ from .models import (
     EconomicFlow,
     ElementaryFlowCompartment,
     ElementaryFlow,
+    ScenarioJob,
+    SolveJob,
+    ImportJob,
 )
+from .tasks import import_workbook
 
 
 class ProjectConsistencySerializerMixin:
@@ -58,8 +63,16 @@ class ProjectConsistencySerializerMixin:
 class ProjectSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Project
-        fields = ["id", "url", "name", "description", "created_at", "updated_at"]
-        read_only_fields = ["id", "url", "created_at", "updated_at"]
+        fields = [
+            "id",
+            "url",
+            "name",
+            "description",
+            "created_at",
+            "updated_at",
+            "data_version",
+        ]
+        read_only_fields = ["id", "url", "created_at", "updated_at", "data_version"]
 
 
 class DimensionSerializer(serializers.HyperlinkedModelSerializer):
@@ -371,3 +384,267 @@ class ElementaryFlowSerializer(
             "direction",
         ]
         read_only_fields = ["id", "url"]
+
+
+class ScenarioJobSerializer(serializers.HyperlinkedModelSerializer):
+    # Each dimension is either a list of Term ids or {"taxonomy": <id>},
+    # expanded to all the terms of that taxonomy.
+    progress = serializers.SerializerMethodField()
+
+    def get_progress(self, obj):
+        return obj.progress()
+
+    def validate_domains(self, value):
+        if not isinstance(value, list) or not value:
+            raise serializers.ValidationError(
+                "Expected a non-empty list of dimensions."
+            )
+        if len(value) > settings.SCENARIO_MAX_DIMENSIONS:
+            raise serializers.ValidationError(
+                f"At most {settings.SCENARIO_MAX_DIMENSIONS} dimensions are allowed."
+            )
+
+        def is_id(x):
+            return isinstance(x, int) and not isinstance(x, bool)
+
+        domains = []
+        for i, dim in enumerate(value):
+            if isinstance(dim, dict) and is_id(dim.get("taxonomy")):
+                term_ids = list(
+                    Term.objects.filter(taxonomy_id=dim["taxonomy"])
+                    .order_by("id")
+                    .values_list("id", flat=True)
+                )
+            elif isinstance(dim, list) and all(is_id(t) for t in dim):
+                term_ids = list(dict.fromkeys(dim))
+                known = set(
+                    Term.objects.filter(id__in=term_ids).values_list("id", flat=True)
+                )
+                missing = [t for t in term_ids if t not in known]
+                if missing:
+                    raise serializers.ValidationError(
+                        f"Dimension {i}: unknown term ids {missing}."
+                    )
+            else:
+                raise serializers.ValidationError(
+                    f"Dimension {i}: expected a list of term ids or {{'taxonomy': id}}."
+                )
+            if not term_ids:
+                raise serializers.ValidationError(f"Dimension {i} has no terms.")
+            domains.append(term_ids)
+        return domains
+
+    def _validate_rules(self, value):
+        if not isinstance(value, list) or not all(isinstance(r, dict) for r in value):
+            raise serializers.ValidationError(
+                "Expected a list of {dimension index: term id} objects."
+            )
+        rules = []
+        for rule in value:
+            try:
+                rules.append({int(d): v for d, v in rule.items()})
+            except (TypeError, ValueError):
+                raise serializers.ValidationError(
+                    f"Invalid dimension index in rule {rule}."
+                )
+        return rules
+
+    def validate_whitelists(self, value):
+        return self._validate_rules(value)
+
+    def validate_blacklists(self, value):
+        return self._validate_rules(value)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        domains = attrs["domains"]
+        for field in ("whitelists", "blacklists"):
+            for rule in attrs.get(field, []):
+                for d, term_id in rule.items():
+                    if not 0 <= d < len(domains) or term_id not in domains[d]:
+                        raise serializers.ValidationError(
+                            {field: f"Rule {rule} does not match the dimensions."}
+                        )
+
+        # Counting the space can take seconds: the task does it and fails the
+        # job if it's too large. Only the cheap limits are checked here.
+        n_rules = len(attrs.get("whitelists", [])) + len(attrs.get("blacklists", []))
+        if n_rules > settings.SCENARIO_MAX_RULES:
+            raise serializers.ValidationError(
+                f"At most {settings.SCENARIO_MAX_RULES} rules are allowed."
+            )
+        return attrs
+
+    class Meta:
+        model = ScenarioJob
+        fields = [
+            "id",
+            "url",
+            "project",
+            "domains",
+            "whitelists",
+            "blacklists",
+            "status",
+            "total",
+            "produced",
+            "chunk_size",
+            "chunk_count",
+            "progress",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = [
+            "id",
+            "url",
+            "status",
+            "total",
+            "produced",
+            "chunk_size",
+            "chunk_count",
+            "progress",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+
+class SolveJobSerializer(serializers.HyperlinkedModelSerializer):
+    # Created by POST /projects/<id>/solve-batch/ for large batches; the
+    # demands themselves are not echoed back.
+    progress = serializers.SerializerMethodField()
+
+    def get_progress(self, obj):
+        return obj.progress()
+
+    class Meta:
+        model = SolveJob
+        fields = [
+            "id",
+            "url",
+            "project",
+            "status",
+            "data_version",
+            "total",
+            "solved",
+            "progress",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class ImportJobSerializer(serializers.HyperlinkedModelSerializer):
+    # Live progress comes from the task state while the import runs.
+    progress = serializers.SerializerMethodField()
+
+    def get_progress(self, obj):
+        snapshot = None
+        if obj.status == ImportJob.STATUS_RUNNING and obj.task_id:
+            result = import_workbook.AsyncResult(obj.task_id)
+            if result.state == "PROGRESS" and isinstance(result.info, dict):
+                snapshot = result.info
+        return obj.progress(snapshot)
+
+    def validate_file(self, value):
+        if not value.name.lower().endswith(".xlsx"):
+            raise serializers.ValidationError("Expected an .xlsx workbook.")
+        return value
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            "id",
+            "url",
+            "file",
+            "project",
+            "dry_run",
+            "status",
+            "progress",
+            "report",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = [
+            "id",
+            "url",
+            "status",
+            "progress",
+            "report",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+
+class SolveSerializer(serializers.Serializer):
+    # Omitted: the project's FinalDemand rows are used.
+    demand = serializers.DictField(
+        child=serializers.FloatField(),
+        required=False,
+        help_text="Final demand as {good id: quantity}.",
+    )
+
+    def validate_demand(self, value):
+        try:
+            return {int(good_id): quantity for good_id, quantity in value.items()}
+        except ValueError:
+            raise serializers.ValidationError("Keys must be good ids.")
+
+
+class SolveBatchSerializer(serializers.Serializer):
+    # Either a dense matrix (one row of quantities per scenario, columns
+    # matching good_ids) or overrides applied on top of the FinalDemand rows.
+    good_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    demands = serializers.ListField(
+        child=serializers.ListField(child=serializers.FloatField()),
+        required=False,
+        help_text="One row of quantities per scenario, in good_ids order.",
+    )
+    overrides = serializers.ListField(
+        child=serializers.DictField(child=serializers.FloatField()),
+        required=False,
+        help_text="One {good id: quantity} mapping per scenario.",
+    )
+
+    def validate(self, attrs):
+        if ("demands" in attrs) == ("overrides" in attrs):
+            raise serializers.ValidationError(
+                "Expected either good_ids and demands, or overrides."
+            )
+        if "overrides" in attrs:
+            try:
+                mappings = [
+                    {int(good_id): q for good_id, q in override.items()}
+                    for override in attrs["overrides"]
+                ]
+            except ValueError:
+                raise serializers.ValidationError(
+                    {"overrides": "Keys must be good ids."}
+                )
+        else:
+            good_ids = attrs.get("good_ids")
+            if good_ids is None:
+                raise serializers.ValidationError(
+                    {"good_ids": "Required with demands."}
+                )
+            if len(set(good_ids)) != len(good_ids):
+                raise serializers.ValidationError(
+                    {"good_ids": "Good ids must be unique."}
+                )
+            if any(len(row) != len(good_ids) for row in attrs["demands"]):
+                raise serializers.ValidationError(
+                    {"demands": f"Every row must have {len(good_ids)} quantities."}
+                )
+            mappings = [dict(zip(good_ids, row)) for row in attrs["demands"]]
+        if not mappings:
+            raise serializers.ValidationError("No scenario to solve.")
+        attrs["mappings"] = mappings
+        return attrs
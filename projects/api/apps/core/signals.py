@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .matrices import bump_data_version_on_commit
+from .models import EconomicFlow, ElementaryFlow, Project
+
+
+# Economic and elementary flows saved or deleted one at a time (API, admin,
+# cascades) invalidate the project's cached matrices, once per transaction.
+# Bulk writes bypass post_save: the import_marcot command bumps the version
+# itself once it is done.
+
+
+@receiver(post_save, sender=EconomicFlow)
+@receiver(post_save, sender=ElementaryFlow)
+def flow_saved(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        bump_data_version_on_commit(instance.process_id, using)
+
+
+@receiver(post_delete, sender=EconomicFlow)
+@receiver(post_delete, sender=ElementaryFlow)
+def flow_deleted(sender, instance, origin=None, using=None, **kwargs):
+    # Nothing left to invalidate when the whole project is being deleted
+    if not isinstance(origin, Project):
+        bump_data_version_on_commit(instance.process_id, using)
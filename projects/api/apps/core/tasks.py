@@ -0,0 +1,284 @@
+import io
+import logging
+import os
+import shutil
+import zipfile
+
+import numpy as np
+from celery import chord, shared_task
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .management.commands.import_marcot import Command as ImportMarcotCommand
+from .matrices import read_demands, solve_demands, technology_matrix
+from .models import ImportJob, ScenarioJob, SolveJob
+from .scenarios import CompiledSpace, write_chunk
+
+logger = logging.getLogger(__name__)
+
+
+def scenario_rules(rules):
+    # JSON object keys are strings: dimension indexes back to ints.
+    return [{int(d): v for d, v in rule.items()} for rule in rules or []]
+
+
+@shared_task(bind=True)
+def enumerate_scenarios(self, job_id):
+    """
+    Enumerate a ScenarioJob's space chunk by chunk.
+
+    The space is counted first: the job fails without writing anything if it
+    holds more than SCENARIO_MAX_COMBINATIONS combinations, or if it is too
+    complex to count (SpaceTooComplex).
+
+    Each NumPy batch from CompiledSpace.batches() is written as one compressed
+    columnar chunk; counters are updated after every chunk so clients can poll
+    progress while memory stays bounded by the chunk size.
+    """
+    job = ScenarioJob.objects.get(pk=job_id)
+    job.status = ScenarioJob.STATUS_RUNNING
+    job.started_at = timezone.now()
+    job.produced = 0
+    job.chunk_count = 0
+    job.save(update_fields=["status", "started_at", "produced", "chunk_count"])
+
+    try:
+        space = CompiledSpace(
+            job.domains,
+            scenario_rules(job.whitelists),
+            scenario_rules(job.blacklists),
+        )
+        total = space.count()
+        if total > settings.SCENARIO_MAX_COMBINATIONS:
+            raise ValueError(
+                f"The scenario space has {total} combinations, more than the "
+                f"{settings.SCENARIO_MAX_COMBINATIONS} allowed."
+            )
+        job.total = total
+        job.save(update_fields=["total"])
+
+        directory = job.results_dir
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+        for index, batch in enumerate(space.batches(job.chunk_size)):
+            write_chunk(directory, index, batch)
+            job.produced += len(batch)
+            job.chunk_count = index + 1
+            job.save(update_fields=["produced", "chunk_count"])
+            self.update_state(state="PROGRESS", meta=job.progress())
+
+    except Exception as exc:
+        job.status = ScenarioJob.STATUS_FAILURE
+        job.error = str(exc)
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "finished_at"])
+        raise
+
+    job.status = ScenarioJob.STATUS_SUCCESS
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "finished_at"])
+    return job.progress()
+
+
+def import_sheets(command):
+    """Per-sheet counters of an import_marcot run, [] if it never started."""
+    return command.report.snapshot()["sheets"] if hasattr(command, "report") else []
+
+
+def log_import_stats(job, command):
+    if not hasattr(command, "report"):
+        return
+    stats = command.report.json()
+    for sheet in stats["sheets"]:
+        logger.info(
+            "Import job %s: sheet %s, %d rows in %.3fs",
+            job.pk,
+            sheet["sheet"],
+            sheet["rows"],
+            sheet["seconds"],
+            extra={"import_job": job.pk, "import_stats": sheet},
+        )
+    total = stats["total"]
+    logger.info(
+        "Import job %s: %d rows, %d queries in %.3fs",
+        job.pk,
+        total["rows"],
+        total["queries"],
+        total["seconds"],
+        extra={"import_job": job.pk, "import_stats": total},
+    )
+
+
+@shared_task(bind=True)
+def import_workbook(self, job_id):
+    """
+    Run the import_marcot command on an ImportJob's upload.
+
+    The import is one database transaction, so progress snapshots (per sheet
+    rows, rows/sec and percentage) go to the task state for clients to poll;
+    the job row itself is only updated before and after.
+
+    The command runs with --stats: its per-sheet and per-stage counters are
+    logged (as `extra` fields) whether the import succeeds or fails.
+    """
+    started = ImportJob.objects.filter(
+        pk=job_id, status=ImportJob.STATUS_PENDING
+    ).update(status=ImportJob.STATUS_RUNNING, started_at=timezone.now())
+    job = ImportJob.objects.get(pk=job_id)
+    if not started:
+        # Cancelled before the task started.
+        return job.progress()
+
+    def progress(snapshot):
+        self.update_state(state="PROGRESS", meta=snapshot)
+
+    command = ImportMarcotCommand()
+    out = io.StringIO()
+    try:
+        # The import and the job's transition to SUCCESS commit together, the
+        # transition being conditional like the cancel endpoint's: a job
+        # cancelled meanwhile (revoke doesn't stop a running task) is not
+        # marked SUCCESS and its import is rolled back.
+        with transaction.atomic():
+            call_command(
+                command,
+                job.file.path,
+                project=job.project_id,
+                dry_run=job.dry_run,
+                progress=progress,
+                stats=True,
+                stdout=out,
+            )
+            finished = ImportJob.objects.filter(
+                pk=job_id, status=ImportJob.STATUS_RUNNING
+            ).update(
+                status=ImportJob.STATUS_SUCCESS,
+                project=job.project if job.dry_run else command.project,
+                report=out.getvalue(),
+                sheets=import_sheets(command),
+                finished_at=timezone.now(),
+            )
+            if not finished:
+                transaction.set_rollback(True)
+    except Exception as exc:
+        log_import_stats(job, command)
+        ImportJob.objects.filter(pk=job_id, status=ImportJob.STATUS_RUNNING).update(
+            status=ImportJob.STATUS_FAILURE,
+            error=str(exc),
+            report=out.getvalue(),
+            sheets=import_sheets(command),
+            finished_at=timezone.now(),
+        )
+        raise
+
+    log_import_stats(job, command)
+    job.refresh_from_db()
+    return job.progress()
+
+
+def fail_solve_job(job_id, exc):
+    """Record the first error of a running SolveJob."""
+    SolveJob.objects.filter(pk=job_id, status=SolveJob.STATUS_RUNNING).update(
+        status=SolveJob.STATUS_FAILURE, error=str(exc), finished_at=timezone.now()
+    )
+
+
+@shared_task(bind=True)
+def solve_batch_job(self, job_id):
+    """
+    Solve a SolveJob's demands across the worker pool: one
+    solve_batch_chunk task per SOLVE_BATCH_SIZE demands, merged by
+    merge_solve_chunks once they have all run (a chord).
+
+    A job run eagerly (no worker) runs its chunks in process too.
+    """
+    job = SolveJob.objects.get(pk=job_id)
+    job.status = SolveJob.STATUS_RUNNING
+    job.started_at = timezone.now()
+    job.solved = 0
+    job.save(update_fields=["status", "started_at", "solved"])
+
+    size = settings.SOLVE_BATCH_SIZE
+    workflow = chord(
+        [
+            solve_batch_chunk.si(job.pk, start, min(start + size, job.total))
+            for start in range(0, job.total, size)
+        ],
+        merge_solve_chunks.s(job.pk),
+    )
+    try:
+        if self.request.is_eager:
+            workflow.apply().get()
+        else:
+            workflow.apply_async()
+    except Exception as exc:
+        fail_solve_job(job.pk, exc)
+        raise
+    return job.progress()
+
+
+@shared_task
+def solve_batch_chunk(job_id, start, stop):
+    """
+    Solve demands start to stop - 1 of a SolveJob against the project's
+    factorization and save their scaling vectors as one .npy file. Fails
+    the job if the project's data changed since it was submitted.
+    """
+    job = SolveJob.objects.get(pk=job_id)
+    path = job.chunk_path(start)
+    try:
+        mappings = read_demands(job.demands_path, start, stop)
+        scaling = solve_demands(job.project_id, mappings, job.data_version)
+        # Written aside then renamed: a chunk file is always complete.
+        with open(f"{path}.part", "wb") as fh:
+            np.save(fh, scaling)
+        os.replace(f"{path}.part", path)
+    except Exception as exc:
+        fail_solve_job(job_id, exc)
+        raise
+    SolveJob.objects.filter(pk=job_id).update(solved=F("solved") + stop - start)
+    return path
+
+
+@shared_task
+def merge_solve_chunks(paths, job_id):
+    """
+    Chord callback: write the chunks' scaling vectors (demands x processes,
+    in order) and the process ids of their columns as one .npz archive,
+    one chunk in memory at a time, then remove the job's directory.
+    """
+    job = SolveJob.objects.get(pk=job_id)
+    try:
+        process_ids = technology_matrix(job.project_id, job.data_version).process_ids
+        partial = f"{job.result_path}.part"
+        # The same layout as np.savez, with "scaling" streamed chunk by chunk
+        with zipfile.ZipFile(partial, "w", allowZip64=True) as archive:
+            with archive.open("scaling.npy", "w", force_zip64=True) as fh:
+                np.lib.format.write_array_header_1_0(
+                    fh,
+                    {
+                        "descr": np.lib.format.dtype_to_descr(np.dtype(np.float64)),
+                        "fortran_order": False,
+                        "shape": (job.total, len(process_ids)),
+                    },
+                )
+                for path in paths:
+                    chunk = np.load(path)
+                    fh.write(np.ascontiguousarray(chunk, dtype=np.float64).tobytes())
+            with archive.open("process_ids.npy", "w") as fh:
+                np.lib.format.write_array(fh, process_ids)
+        os.replace(partial, job.result_path)
+    except Exception as exc:
+        fail_solve_job(job_id, exc)
+        raise
+    shutil.rmtree(job.directory, ignore_errors=True)
+
+    SolveJob.objects.filter(pk=job_id, status=SolveJob.STATUS_RUNNING).update(
+        status=SolveJob.STATUS_SUCCESS, finished_at=timezone.now()
+    )
+    job.refresh_from_db()
+    return job.progress()
@@ -1,3 +1,899 @@
-from django.test import TestCase
+import contextlib
+import io
+import os
+import random
+import shutil
+import string
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .models import (
+    Dimension,
+    EconomicFlow,
+    ElementaryFlow,
+    ElementaryFlowCompartment,
+    ElementaryFlowType,
+    FinalDemand,
+    Good,
+    GoodContainGood,
+    ImportJob,
+    Process,
+    ProductionFactor,
+    Project,
+    ScenarioJob,
+    SolveJob,
+    Taxonomy,
+    Term,
+    Unit,
+)
+from .bom import explode
+from .marcot import COLUMNAR_FORMATS, RowError, convert_workbook
+from .matrices import MatrixError, _solver, write_demands
+from .scenarios import (
+    CompiledSpace,
+    SpaceTooComplex,
+    brute_force,
+    generate,
+    generate_batches,
+    generate_dfs,
+    generate_from_whitelists,
+    generate_parallel,
+    generate_parallel_batches,
+    generate_planned,
+    sample,
+)
+from .tasks import (
+    enumerate_scenarios,
+    import_workbook,
+    solve_batch_chunk,
+    solve_batch_job,
+)
+from .views import ImportJobViewSet
+
+LABELS = list(string.ascii_uppercase) + ["A" + c for c in string.ascii_uppercase[:24]]
+
+
+def random_space(rng, n_rules, dims=18, width=50, max_len=3):
+    """`dims` dimensions of `width` labels, `n_rules` whitelists and blacklists."""
+    domains = [LABELS[:width] for _ in range(dims)]
+
+    def rule():
+        picked = rng.sample(range(dims), rng.randint(1, max_len))
+        return {d: rng.choice(domains[d]) for d in picked}
+
+    return (
+        domains,
+        [rule() for _ in range(n_rules)],
+        [rule() for _ in range(n_rules)],
+    )
+
+
+def square_project(n=3):
+    """
+    Project of n goods and n processes where process i makes one unit of
+    good i from half a unit of good i + 1, with a final demand of 10 g0.
+    """
+    project = Project.objects.create(name="Square")
+    dimension = Dimension.objects.create(project=project, name="Mass")
+    unit, _ = Unit.objects.get_or_create(
+        symbol="kg", defaults={"name": "kilogram", "dimension": dimension}
+    )
+    goods = [
+        Good.objects.create(project=project, name=f"g{i}", reference_unit=unit)
+        for i in range(n)
+    ]
+    processes = [
+        Process.objects.create(project=project, name=f"p{i}") for i in range(n)
+    ]
+    for i, process in enumerate(processes):
+        EconomicFlow.objects.create(
+            process=process, good=goods[i], unit=unit, direction="output", quantity=1
+        )
+        if i + 1 < n:
+            EconomicFlow.objects.create(
+                process=process,
+                good=goods[i + 1],
+                unit=unit,
+                direction="input",
+                quantity=0.5,
+            )
+    FinalDemand.objects.create(project=project, good=goods[0], unit=unit, quantity=10)
+    project.refresh_from_db()
+    return project, goods, processes
+
+
+class CompiledSpaceTests(SimpleTestCase):
+    """The compiled engine against the brute force, on small random spaces."""
+
+    trials = 500
+
+    def random_cases(self, seed=0):
+        rng = random.Random(seed)
+        modalities = "ABCDEF"
+
+        def random_rule(n):
+            rule = {}
+            for _ in range(rng.randint(0, 3)):
+                # n included: a dimension out of range, the rule never matches
+                rule[rng.randint(0, n)] = rng.choice(modalities)
+            return rule
+
+        for _ in range(self.trials):
+            n = rng.randint(0, 5)
+            domains = [rng.sample(modalities[:5], rng.randint(1, 4)) for _ in range(n)]
+            whitelists = [random_rule(n) for _ in range(rng.randint(0, 4))]
+            blacklists = [random_rule(n) for _ in range(rng.randint(0, 4))]
+            expected = list(brute_force(domains, whitelists, blacklists))
+            yield rng, domains, whitelists, blacklists, expected
+
+    def test_generate_matches_brute_force(self):
+        for _, domains, whitelists, blacklists, expected in self.random_cases():
+            space = CompiledSpace(domains, whitelists, blacklists)
+            self.assertEqual(list(space), expected, (domains, whitelists, blacklists))
+
+    def test_count_methods(self):
+        for _, domains, whitelists, blacklists, expected in self.random_cases():
+            for method in ("ie", "dp"):
+                space = CompiledSpace(domains, whitelists, blacklists)
+                self.assertEqual(
+                    space.count(method),
+                    len(expected),
+                    (method, domains, whitelists, blacklists),
+                )
+
+    def test_rank_unrank_round_trip(self):
+        for rng, domains, whitelists, blacklists, expected in self.random_cases():
+            space = CompiledSpace(domains, whitelists, blacklists)
+            for k, assign in enumerate(expected):
+                self.assertEqual(space.rank(assign), k)
+                self.assertEqual(space.unrank(k), assign)
+            k = rng.randint(0, len(expected))
+            self.assertEqual(list(space.assignments(k, k + 3)), expected[k : k + 3])
+
+    def test_sample(self):
+        for rng, domains, whitelists, blacklists, expected in self.random_cases():
+            if not expected:
+                continue
+            seed = rng.random()
+            drawn = sample(domains, whitelists, blacklists, 5, seed)
+            self.assertEqual(drawn, sample(domains, whitelists, blacklists, 5, seed))
+            self.assertTrue(all(assign in expected for assign in drawn))
+            space = CompiledSpace(domains, whitelists, blacklists)
+            everything = space.sample(len(expected), seed, replace=False)
+            self.assertCountEqual(map(repr, everything), map(repr, expected))
+
+    def test_variants(self):
+        for _, domains, whitelists, blacklists, expected in self.random_cases():
+            for variant in (generate_planned, generate_from_whitelists):
+                got = variant(domains, whitelists, blacklists)
+                self.assertCountEqual(map(repr, got), map(repr, expected), variant)
+            live = CompiledSpace(domains, whitelists, blacklists).live_prefixes()
+            if domains:
+                self.assertEqual(live[-1], len(expected))
+
+    def test_batches(self):
+        for rng, domains, whitelists, blacklists, expected in self.random_cases():
+            batches = generate_batches(
+                domains, whitelists, blacklists, batch_size=rng.randint(1, 40)
+            )
+            rows = [
+                dict(enumerate(tables[d][c] for d, c in enumerate(row)))
+                for batch, tables in batches
+                for row in batch
+            ]
+            self.assertEqual(rows, expected, (domains, whitelists, blacklists))
+
+    def test_batch_size_must_be_positive(self):
+        space = CompiledSpace([list("AB")])
+        for batch_size in (0, -1):
+            with self.assertRaises(ValueError):
+                next(space.batches(batch_size))
+
+
+class ParallelGenerationTests(SimpleTestCase):
+    domains = [list("ABCD"), list("ABC"), list("ABCDE"), list("AB")]
+    whitelists = [{0: "A"}, {1: "B", 2: "C"}]
+    blacklists = [{0: "A", 3: "B"}, {2: "E"}]
+
+    def test_same_order_as_generate(self):
+        expected = list(generate(self.domains, self.whitelists, self.blacklists))
+        got = generate_parallel(
+            self.domains, self.whitelists, self.blacklists, workers=2, shard_size=7
+        )
+        self.assertEqual(list(got), expected)
+
+    def test_batches(self):
+        expected = list(generate(self.domains, self.whitelists, self.blacklists))
+        batches = list(
+            generate_parallel_batches(
+                self.domains, self.whitelists, self.blacklists, workers=2, ordered=False
+            )
+        )
+        rows = [
+            dict(enumerate(tables[d][c] for d, c in enumerate(row)))
+            for batch, tables in batches
+            for row in batch
+        ]
+        self.assertCountEqual(map(repr, rows), map(repr, expected))
+
+
+class LazyGenerationTests(SimpleTestCase):
+    def test_first_assignment_without_counting(self):
+        # A space too complex to count still yields its first assignment at once.
+        domains, whitelists, blacklists = random_space(random.Random(0), 80)
+        with mock.patch.object(CompiledSpace, "count", side_effect=AssertionError):
+            first = next(generate(domains, whitelists, blacklists))
+        self.assertEqual(first, next(generate_dfs(domains, whitelists, blacklists)))
+
+    def test_resume_past_the_end(self):
+        space = CompiledSpace([["A", "B"], ["C"]], blacklists=[{0: "A"}])
+        self.assertEqual(list(space.assignments(0)), [{0: "B", 1: "C"}])
+        self.assertEqual(list(space.assignments(1)), [])
+        self.assertEqual(list(space.assignments(5)), [])
+
+
+class CountScalingTests(SimpleTestCase):
+    """Counting many rules stays polynomial, or gives up quickly."""
+
+    budget = 10  # seconds, generous for slow CI machines (~2s here)
+
+    def assertCountsWithin(self, n_rules, max_len):
+        domains, whitelists, blacklists = random_space(
+            random.Random(0), n_rules, max_len=max_len
+        )
+        start = time.perf_counter()
+        total = CompiledSpace(domains, whitelists, blacklists).count()
+        self.assertLess(time.perf_counter() - start, self.budget)
+        return total
+
+    def test_many_rules(self):
+        for n_rules, max_len in ((30, 3), (50, 2), (50, 3)):
+            with self.subTest(n_rules=n_rules, max_len=max_len):
+                self.assertGreater(self.assertCountsWithin(n_rules, max_len), 0)
+
+    def test_independent_rules(self):
+        # One-dimension rules only: the count is a product, whatever their number.
+        domains = [LABELS] * 18
+        blacklists = [{d: c} for d in range(18) for c in LABELS[:10]]
+        space = CompiledSpace(domains, blacklists=blacklists)
+        self.assertEqual(space.count(), 40**18)
+
+    def test_too_complex(self):
+        domains, whitelists, blacklists = random_space(random.Random(0), 80)
+        start = time.perf_counter()
+        with self.assertRaises(SpaceTooComplex):
+            CompiledSpace(domains, whitelists, blacklists).count()
+        self.assertLess(time.perf_counter() - start, self.budget)
+
+
+class ScenarioJobTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name="Scenarios")
+        taxonomy = Taxonomy.objects.create(name="Modalities")
+        self.terms = [
+            Term.objects.create(taxonomy=taxonomy, name=name).pk for name in "ABCD"
+        ]
+        self.taxonomy = taxonomy.pk
+
+    def post(self, **data):
+        data.setdefault("domains", [{"taxonomy": self.taxonomy}] * 2)
+        data["project"] = reverse("project-detail", args=[self.project.pk])
+        return self.client.post(reverse("scenariojob-list"), data, format="json")
+
+    def test_submission_does_not_count(self):
+        with mock.patch.object(CompiledSpace, "count", side_effect=AssertionError):
+            response = self.post(blacklists=[{0: self.terms[0]}])
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertIsNone(response.data["total"])
+
+    @override_settings(SCENARIO_MAX_RULES=1, SCENARIO_MAX_DIMENSIONS=2)
+    def test_submission_limits(self):
+        rules = [{0: self.terms[0]}, {1: self.terms[1]}]
+        response = self.post(blacklists=rules)
+        self.assertEqual(response.status_code, 400)
+        response = self.post(domains=[{"taxonomy": self.taxonomy}] * 3)
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_domains(self):
+        for domains in (
+            [{"taxonomy": "abc"}],
+            [{"taxonomy": None}],
+            [{"taxonomy": [self.taxonomy]}],
+            [[self.terms[0], "abc"]],
+            [[True]],
+        ):
+            with self.subTest(domains=domains):
+                response = self.post(domains=domains)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("domains", response.data)
+
+    @override_settings(SCENARIO_MAX_COMBINATIONS=10)
+    def test_task_fails_too_large_space(self):
+        job = ScenarioJob.objects.create(
+            project=self.project, domains=[self.terms] * 2, chunk_size=100
+        )
+        with self.assertRaises(ValueError):
+            enumerate_scenarios.apply(args=[job.pk], throw=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ScenarioJob.STATUS_FAILURE)
+        self.assertIn("16 combinations", job.error)
+        self.assertEqual(job.produced, 0)
+
+
+@mock.patch("apps.core.views.import_workbook.AsyncResult")
+class ImportJobCancelTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.job = ImportJob.objects.create(file="imports/marcot.xlsx", task_id="t")
+
+    def cancel(self):
+        url = reverse("importjob-cancel", args=[self.job.pk])
+        return self.client.post(url)
+
+    def test_cancel(self, async_result):
+        response = self.cancel()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], ImportJob.STATUS_CANCELLED)
+        async_result.assert_called_once_with("t")
+        self.assertEqual(self.cancel().status_code, 400)
+        async_result.assert_called_once()
+
+    def test_cancel_finished_job(self, async_result):
+        # The task finishes between the view loading the job and cancelling it.
+        finished = ImportJob.STATUS_SUCCESS
+        get_object = ImportJobViewSet.get_object
+
+        def stale_get_object(view):
+            job = get_object(view)
+            ImportJob.objects.filter(pk=job.pk).update(status=finished)
+            return job
+
+        with mock.patch.object(ImportJobViewSet, "get_object", stale_get_object):
+            response = self.cancel()
+        self.assertEqual(response.status_code, 400)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, finished)
+        async_result.assert_not_called()
+
+    def test_cancel_during_import(self, async_result):
+        # revoke() doesn't stop a running task: the cancel lands while the
+        # command runs, and the task must neither commit nor report SUCCESS.
+        # (Here the cancel shares the task's connection, so the rollback
+        # undoes it too; the API's own request commits it separately.)
+        def import_then_cancel(command, *args, **options):
+            command.project = Project.objects.create(name="Imported")
+            self.assertEqual(self.cancel().status_code, 200)
+
+        with mock.patch("apps.core.tasks.call_command", import_then_cancel):
+            import_workbook.apply(args=[self.job.pk], throw=True)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ImportJob.STATUS_RUNNING)
+        self.assertIsNone(self.job.finished_at)
+        self.assertFalse(Project.objects.exists())
+
+    def test_task_skips_cancelled_job(self, async_result):
+        self.cancel()
+        import_workbook.apply(args=[self.job.pk], throw=True)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ImportJob.STATUS_CANCELLED)
+        self.assertIsNone(self.job.started_at)
+
+
+class ImportMarcotTests(TestCase):
+    """import_marcot on small generated workbooks: goods, activities and tr."""
+
+    GOODS = [("G1", "Grain"), ("G2", "Flour"), ("G3", "Bread")]
+    ACTIVITIES = [("A1", "Milling"), ("A2", "Baking")]
+    # cons_in, trans_in, goods_in ID, act, trans_out, out ID, value
+    TR = [
+        (None, None, "G1", "Milling", None, "G2", 2.0),
+        ("C", None, "G2", "Baking", "CO2", "G3", 0.5),
+        ("C", None, "G2", "Baking", "CH4", "G3", 0.25),
+    ]
+    COMPARTMENTS = [("air", "urban"), ("air", "rural"), ("water", None)]
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def workbook(self, tr=TR, name="marcot.xlsx", compartments=COMPARTMENTS):
+        from openpyxl import Workbook
+
+        wb = Workbook()
+        wb.remove(wb.active)
+        sheets = {
+            "l_goods": (
+                ("productId", "name", "reference_property", "unit"),
+                [(pid, label, "Mass", "kg") for pid, label in self.GOODS],
+            ),
+            "l_act": (("activityId", "name"), self.ACTIVITIES),
+            "tr": (
+                (
+                    "cons_in",
+                    "trans_in",
+                    "goods_in ID",
+                    "act",
+                    "trans_out\n(opt.)",
+                    "out ID",
+                    "value",
+                ),
+                tr,
+            ),
+            "background_biosphere": (("comp", "subcomp"), compartments),
+        }
+        for sheet, (header, rows) in sheets.items():
+            ws = wb.create_sheet(sheet)
+            ws.append(header)
+            for row in rows:
+                ws.append(row)
+        path = os.path.join(self.tmp, name)
+        wb.save(path)
+        return path
+
+    def call(self, path, *args):
+        out = io.StringIO()
+        # The loaders print their progress
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command("import_marcot", path, *args, stdout=out)
+        return out.getvalue()
+
+    def flows(self, project):
+        return dict(
+            EconomicFlow.objects.filter(process__project=project).values_list(
+                "external_id", "quantity"
+            )
+        )
+
+    def test_reimport(self):
+        self.call(self.workbook())
+        project = Project.objects.get()
+        self.assertEqual(len(self.flows(project)), 6)
+        kept = EconomicFlow.objects.get(process__name="Milling", direction="input").pk
+        version = Project.objects.get().data_version
+
+        # No-op: nothing written, cached matrices stay valid
+        out = self.call(self.workbook(), "--project", str(project.pk))
+        self.assertIn("Economic flows: 0 inserted, 0 updated, 0 deleted", out)
+        self.assertEqual(Project.objects.get().data_version, version)
+
+        tr = [
+            (None, None, "G1", "Milling", None, "G2", 3.0),  # updated
+            ("C", None, "G2", "Baking", "CO2", "G3", 0.5),  # unchanged
+            # CH4 row deleted, N2O row inserted
+            ("N", None, "G2", "Baking", "N2O", "G3", 0.125),
+        ]
+        out = self.call(self.workbook(tr), "--project", str(project.pk))
+        self.assertIn("Economic flows: 2 inserted, 2 updated, 2 deleted", out)
+        self.assertEqual(Project.objects.count(), 1)
+        self.assertGreater(Project.objects.get().data_version, version)
+        self.assertEqual(
+            EconomicFlow.objects.get(process__name="Milling", direction="input").pk,
+            kept,
+        )
+        self.assertEqual(
+            sorted(
+                EconomicFlow.objects.filter(process__project=project).values_list(
+                    "process__name", "direction", "quantity"
+                )
+            ),
+            [
+                ("Baking", "input", 0.125),
+                ("Baking", "input", 0.5),
+                ("Baking", "output", 0.125),
+                ("Baking", "output", 0.5),
+                ("Milling", "input", 3.0),
+                ("Milling", "output", 3.0),
+            ],
+        )
+
+    def test_reimport_in_chunks(self):
+        self.call(self.workbook())
+        project = Project.objects.get()
+        tr = [
+            (None, None, "G1", "Milling", None, "G2", 3.0),
+            ("C", None, "G2", "Baking", "CO2", "G3", 0.5),
+            ("N", None, "G2", "Baking", "N2O", "G3", 0.125),
+        ]
+        # One row per chunk: matched, changed and deleted rows span chunks
+        args = ["--project", str(project.pk), "--batch-size", "1"]
+        out = self.call(self.workbook(tr), *args, "--copy-threshold", "0")
+        self.assertIn(
+            "Economic flows: 2 inserted, 2 updated, 2 deleted, 2 unchanged", out
+        )
+        self.assertEqual(
+            sorted(self.flows(project).values()), [0.125, 0.125, 0.5, 0.5, 3.0, 3.0]
+        )
+
+    def test_reimport_keeps_api_compartments(self):
+        self.call(self.workbook())
+        project = Project.objects.get()
+        self.assertEqual(
+            sorted(
+                ElementaryFlowCompartment.objects.values_list(
+                    "external_id", "parent_compartment__name"
+                )
+            ),
+            [
+                ("air", None),
+                ("air/rural", "air"),
+                ("air/urban", "air"),
+                ("water", None),
+            ],
+        )
+        client = APIClient()
+        response = client.post(
+            reverse("elementaryflowcompartment-list"),
+            {
+                "project": reverse("project-detail", args=[project.pk]),
+                "name": "user-made",
+            },
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        compartment = ElementaryFlowCompartment.objects.get(pk=response.data["id"])
+        flow_type = ElementaryFlowType.objects.create(
+            production_factor=ProductionFactor.objects.create(
+                project=project, name="CO2"
+            ),
+            compartment=compartment,
+        )
+        ElementaryFlow.objects.create(
+            elementary_flow_type=flow_type,
+            process=Process.objects.get(name="Baking"),
+            quantity=1,
+            unit=Unit.objects.get(symbol="kg"),
+            direction="output",
+        )
+
+        # The sheet loses a compartment: only the imported one goes
+        out = self.call(
+            self.workbook(compartments=self.COMPARTMENTS[:2]),
+            "--project",
+            str(project.pk),
+        )
+        self.assertIn(
+            "Elementary flow compartments: 0 inserted, 0 updated, 1 deleted, 3 unchanged",
+            out,
+        )
+        self.assertFalse(ElementaryFlowCompartment.objects.filter(name="water"))
+        self.assertTrue(ElementaryFlowCompartment.objects.filter(pk=compartment.pk))
+        self.assertEqual(ElementaryFlow.objects.count(), 1)
+
+    def test_duplicate_tr_rows(self):
+        path = self.workbook(self.TR + [self.TR[1]])
+        with self.assertRaisesMessage(CommandError, "Validation failed: 1 error(s)"):
+            self.call(path, "--validate")
+        with self.assertRaisesMessage(Exception, "Duplicate row violates"):
+            self.call(path)
+        self.assertFalse(Project.objects.exists())
+
+    def test_validate(self):
+        out = self.call(self.workbook(), "--validate")
+        self.assertIn("Validation passed", out)
+        tr = self.TR + [(None, None, "G9", "Baking", None, "G3", 1.0)]
+        path = self.workbook(tr)
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, "Validation failed"):
+            call_command("import_marcot", path, "--validate", stdout=out)
+        with self.assertRaises(RowError) as raised:
+            self.call(path)
+        # Same rule, same message
+        self.assertIn(f"[tr] {raised.exception}", out.getvalue())
+        self.assertFalse(Project.objects.exists())
+
+    def test_columnar_sources(self):
+        # Ids that read as numbers are kept as written, as in the workbook
+        self.GOODS = [("001", "Grain"), ("1.10", "Flour"), (3, "Bread")]
+        path = self.workbook(
+            tr=[
+                (None, None, "001", "Milling", None, "1.10", 2.0),
+                ("C", None, "1.10", "Baking", "CO2", 3, 0.5),
+                ("C", None, "1.10", "Baking", "CH4", 3, 0.25),
+            ]
+        )
+        self.call(path)
+        expected = self.flows(Project.objects.get())
+        self.assertEqual(
+            set(Good.objects.values_list("external_id", flat=True)),
+            {"001", "1.10", "3"},
+        )
+        for fmt in COLUMNAR_FORMATS:
+            with self.subTest(fmt=fmt):
+                directory = os.path.join(self.tmp, fmt)
+                convert_workbook(path, directory, fmt)
+                self.call(directory)
+                project = Project.objects.latest("pk")
+                self.assertEqual(self.flows(project), expected)
+                # Same keys as the workbook's: re-importing it is a no-op
+                out = self.call(path, "--project", str(project.pk))
+                self.assertIn("Economic flows: 0 inserted, 0 updated, 0 deleted", out)
+
+
+class DataVersionTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project, self.goods, self.processes = square_project(4)
+
+    def version(self):
+        self.project.refresh_from_db()
+        return self.project.data_version
+
+    def test_one_bump_per_transaction(self):
+        before = self.version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            EconomicFlow.objects.filter(process__project=self.project).delete()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.version(), before + 1)
+
+    def test_save_bumps_on_commit(self):
+        before = self.version()
+        flow = EconomicFlow.objects.filter(process=self.processes[0]).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            flow.quantity = 2
+            flow.save()
+            flow.save()
+            self.assertEqual(self.version(), before)
+        self.assertEqual(self.version(), before + 1)
+
+    def test_project_delete(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.project.delete()
+        self.assertEqual(callbacks, [])
+
+
+class MatrixEndpointTests(TestCase):
+    """Solve, inventory and solve-batch on a 3-process chain (see square_project)."""
+
+    def setUp(self):
+        # Ids are reused once a test's transaction is rolled back
+        cache.clear()
+        _solver.cache_clear()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project, self.goods, self.processes = square_project(3)
+            self.add_emissions()
+
+    def add_emissions(self):
+        factor = ProductionFactor.objects.create(project=self.project, name="CO2")
+        compartment = ElementaryFlowCompartment.objects.create(
+            project=self.project, name="Air"
+        )
+        self.co2 = ElementaryFlowType.objects.create(
+            production_factor=factor, compartment=compartment
+        )
+        unit = self.goods[0].reference_unit
+        for process, quantity in ((self.processes[0], 2), (self.processes[2], 1)):
+            ElementaryFlow.objects.create(
+                elementary_flow_type=self.co2,
+                process=process,
+                quantity=quantity,
+                unit=unit,
+                direction="output",
+            )
+
+    def url(self, name):
+        return reverse(f"project-{name}", args=[self.project.pk])
+
+    def test_solve_final_demand(self):
+        response = self.client.get(self.url("solve"))
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["process_ids"], [p.pk for p in self.processes])
+        np.testing.assert_allclose(response.data["scaling"], [10, 5, 2.5])
+
+    def test_solve_posted_demand(self):
+        demand = {"demand": {str(self.goods[2].pk): 4}}
+        response = self.client.post(self.url("solve"), demand, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        np.testing.assert_allclose(response.data["scaling"], [0, 0, 4])
+
+        demand = {"demand": {"0": 1}}
+        response = self.client.post(self.url("solve"), demand, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_solve_non_square(self):
+        process = Process.objects.create(project=self.project, name="extra")
+        EconomicFlow.objects.create(
+            process=process,
+            good=self.goods[0],
+            unit=self.goods[0].reference_unit,
+            direction="input",
+            quantity=1,
+        )
+        response = self.client.get(self.url("solve"))
+        self.assertEqual(response.status_code, 400)
+
+    def test_inventory(self):
+        response = self.client.get(self.url("inventory"))
+        self.assertEqual(response.status_code, 200, response.data)
+        (result,) = response.data["results"]
+        self.assertEqual(result["elementary_flow_type"], self.co2.pk)
+        self.assertEqual(result["compartment"], "Air")
+        self.assertAlmostEqual(result["quantity"], 2 * 10 + 1 * 2.5)
+
+    def solve_batch(self, data):
+        response = self.client.post(self.url("solve-batch"), data, format="json")
+        self.assertEqual(response.status_code, 200, getattr(response, "data", None))
+        archive = np.load(io.BytesIO(response.content))
+        self.assertEqual(
+            archive["process_ids"].tolist(), [p.pk for p in self.processes]
+        )
+        return archive["scaling"]
+
+    def test_solve_batch(self):
+        good_ids = [self.goods[0].pk, self.goods[2].pk]
+        scaling = self.solve_batch({"good_ids": good_ids, "demands": [[1, 0], [0, 4]]})
+        np.testing.assert_allclose(scaling, [[1, 0.5, 0.25], [0, 0, 4]])
+
+        overrides = [{}, {str(self.goods[0].pk): 2}]
+        scaling = self.solve_batch({"overrides": overrides})
+        np.testing.assert_allclose(scaling, [[10, 5, 2.5], [2, 1, 0.5]])
+
+    def test_cache_invalidation(self):
+        first = self.client.get(self.url("solve")).data
+        flow = EconomicFlow.objects.get(process=self.processes[0], direction="input")
+        with self.captureOnCommitCallbacks(execute=True):
+            flow.quantity = 1
+            flow.save()
+        second = self.client.get(self.url("solve")).data
+        self.assertGreater(second["data_version"], first["data_version"])
+        np.testing.assert_allclose(second["scaling"], [10, 10, 5])
+
+    def use_media_root(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+
+    @override_settings(SOLVE_BATCH_SIZE=1)
+    def test_solve_job(self):
+        self.use_media_root()
+        overrides = [{}, {str(self.goods[0].pk): 2}]
+        with mock.patch("apps.core.views.solve_batch_job.delay") as delay:
+            delay.return_value.id = "t"
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    self.url("solve-batch"), {"overrides": overrides}, format="json"
+                )
+        self.assertEqual(response.status_code, 202, response.data)
+        job = SolveJob.objects.get(pk=response.data["id"])
+        delay.assert_called_once_with(job.pk)
+        self.assertEqual((job.status, job.total, job.task_id), ("pending", 2, "t"))
+
+        result_url = reverse("solvejob-result", args=[job.pk])
+        self.assertEqual(self.client.get(result_url).status_code, 400)
+        # One chunk task per demand, merged by the chord callback
+        with mock.patch(
+            "apps.core.tasks.solve_batch_chunk.run",
+            side_effect=solve_batch_chunk.run,
+        ) as chunk:
+            solve_batch_job.apply(args=[job.pk], throw=True)
+        self.assertEqual(
+            sorted(call.args[1:] for call in chunk.call_args_list), [(0, 1), (1, 2)]
+        )
+        self.assertFalse(os.path.exists(job.directory))
+        response = self.client.get(reverse("solvejob-detail", args=[job.pk]))
+        self.assertEqual(response.data["status"], SolveJob.STATUS_SUCCESS)
+        self.assertEqual(response.data["solved"], 2)
+        response = self.client.get(result_url)
+        archive = np.load(io.BytesIO(b"".join(response.streaming_content)))
+        np.testing.assert_allclose(archive["scaling"], [[10, 5, 2.5], [2, 1, 0.5]])
+        np.testing.assert_array_equal(
+            archive["process_ids"], sorted(p.pk for p in self.processes)
+        )
+
+    def test_solve_job_data_changed(self):
+        self.use_media_root()
+        version = self.project.data_version
+        job = SolveJob.objects.create(
+            project=self.project, data_version=version, total=1
+        )
+        write_demands(job.demands_path, [{}])
+        flow = EconomicFlow.objects.get(process=self.processes[0], direction="input")
+        with self.captureOnCommitCallbacks(execute=True):
+            flow.quantity = 1
+            flow.save()
+        with self.assertRaises(MatrixError):
+            solve_batch_job.apply(args=[job.pk], throw=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, SolveJob.STATUS_FAILURE)
+        self.assertIn("changed", job.error)
+
+
+class BillOfMaterialsTests(TestCase):
+    """
+    apps.core.bom's recursive query runs on the test database: PostgreSQL in
+    CI (docker compose), SQLite when run without it.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name="BOM")
+        dimension = Dimension.objects.create(project=self.project, name="Mass")
+        self.unit, _ = Unit.objects.get_or_create(
+            symbol="kg", defaults={"name": "kilogram", "dimension": dimension}
+        )
+
+    def good(self, name):
+        return Good.objects.create(
+            project=self.project, name=name, reference_unit=self.unit
+        )
+
+    def contains(self, parent, child, quantity=1):
+        GoodContainGood.objects.create(
+            parent_good=parent, child_good=child, quantity=quantity, unit=self.unit
+        )
+
+    def results(self, good, max_depth):
+        return {r["name"]: r for r in explode(good.pk, max_depth)}
+
+    def test_chain(self):
+        a, b, c = self.good("a"), self.good("b"), self.good("c")
+        self.contains(a, b, 2)
+        self.contains(b, c, 3)
+        results = self.results(a, 5)
+        self.assertEqual(list(results), ["b", "c"])
+        self.assertEqual(results["c"]["quantity"], 6)
+        self.assertEqual(results["c"]["unit"], "kg")
+        self.assertEqual(results["c"]["min_depth"], 2)
+        self.assertFalse(results["c"]["truncated"])
+        self.assertTrue(self.results(a, 1)["b"]["truncated"])
+
+    def test_layered_diamonds(self):
+        # 2^30 paths to the bottom layer: counted per level, not enumerated
+        top = previous = [self.good("top")]
+        for level in range(30):
+            layer = [self.good(f"{level}-{i}") for i in range(2)]
+            for parent in previous:
+                for child in layer:
+                    self.contains(parent, child)
+            previous = layer
+        start = time.perf_counter()
+        results = self.results(top[0], 30)
+        self.assertLess(time.perf_counter() - start, 5)
+        bottom = results["29-0"]
+        self.assertEqual((bottom["paths"], bottom["quantity"]), (2**29, 2**29))
+        self.assertEqual((bottom["min_depth"], bottom["max_depth"]), (30, 30))
+
+    def test_cycle(self):
+        a, b, c = self.good("a"), self.good("b"), self.good("c")
+        self.contains(a, b)
+        self.contains(b, c)
+        self.contains(c, b)
+        results = self.results(a, 10)
+        self.assertTrue(results["b"]["cycle"])
+        self.assertEqual(results["b"]["paths"], 1)
+        self.assertEqual(results["b"]["max_depth"], 3)
+        self.assertFalse(results["c"]["cycle"])
+        self.assertFalse(results["c"]["truncated"])
+
+    def test_diamond_with_cycle(self):
+        # a->c->b holds no cycle even though b->c->b does: it is counted
+        a, b, c = self.good("a"), self.good("b"), self.good("c")
+        self.contains(a, b, 2)
+        self.contains(a, c, 3)
+        self.contains(b, c, 5)
+        self.contains(c, b, 7)
+        results = self.results(a, 10)
+        self.assertEqual((results["b"]["paths"], results["b"]["quantity"]), (2, 23))
+        self.assertEqual((results["c"]["paths"], results["c"]["quantity"]), (2, 13))
+        self.assertTrue(results["b"]["cycle"])
+        self.assertTrue(results["c"]["cycle"])
+        self.assertEqual(results["b"]["max_depth"], 3)
+
+    def test_endpoint_depth_limits(self):
+        a = self.good("a")
+        url = reverse("good-explode", args=[a.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"], [])
+        with override_settings(BOM_MAX_DEPTH=5):
+            response = self.client.get(url, {"max_depth": 6})
+        self.assertEqual(response.status_code, 400)
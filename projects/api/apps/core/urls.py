@@ -15,6 +15,9 @@ from .views import (
     EconomicFlowViewSet,
     ElementaryFlowCompartmentViewSet,
     ElementaryFlowViewSet,
+    ScenarioJobViewSet,
+    SolveJobViewSet,
+    ImportJobViewSet,
 )
 
 router = DefaultRouter()
@@ -37,4 +40,8 @@ router.register(r"economic-flows", EconomicFlowViewSet)
 router.register(r"elementary-flow-compartments", ElementaryFlowCompartmentViewSet)
 router.register(r"elementary-flows", ElementaryFlowViewSet)
 
+router.register(r"scenario-jobs", ScenarioJobViewSet)
+router.register(r"solve-jobs", SolveJobViewSet)
+router.register(r"imports", ImportJobViewSet)
+
 urlpatterns = router.urls
@@ -1,5 +1,18 @@
-from rest_framework import viewsets
+import io
+import os
+import shutil
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.permissions import AllowAny  # replace with your auth later
+from rest_framework.response import Response
 
 from .models import (
     Project,
@@ -17,8 +30,15 @@ from .models import (
     EconomicFlow,
     ElementaryFlowCompartment,
     ElementaryFlow,
+    ElementaryFlowType,
+    FinalDemand,
+    ScenarioJob,
+    SolveJob,
+    ImportJob,
 )
-
+from .bom import explode
+from .matrices import MatrixError, inventory, solve_demands, solver, write_demands
+from .scenarios import read_rows
 from .serializers import (
     ProjectSerializer,
     DimensionSerializer,
@@ -35,7 +55,13 @@ from .serializers import (
     EconomicFlowSerializer,
     ElementaryFlowCompartmentSerializer,
     ElementaryFlowSerializer,
+    ScenarioJobSerializer,
+    SolveJobSerializer,
+    ImportJobSerializer,
+    SolveBatchSerializer,
+    SolveSerializer,
 )
+from .tasks import enumerate_scenarios, import_workbook, solve_batch_job
 
 
 class ProjectFilterMixin:
@@ -59,6 +85,141 @@ class ProjectViewSet(viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
     permission_classes = [AllowAny]
 
+    def final_demand(self, request, project):
+        # Demand posted as {"demand": {good id: quantity}}, else FinalDemand
+        serializer = SolveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        demand = serializer.validated_data.get("demand")
+        if demand is None:
+            demand = dict(
+                FinalDemand.objects.filter(project=project).values_list(
+                    "good_id", "quantity"
+                )
+            )
+        return demand
+
+    @action(detail=True, methods=["get", "post"], serializer_class=SolveSerializer)
+    def solve(self, request, pk=None):
+        # GET solves for the project's FinalDemand; POST {"demand": {good id:
+        # quantity}} for any other demand, reusing the same factorization.
+        project = self.get_object()
+        demand = self.final_demand(request, project)
+        try:
+            project_solver = solver(project.pk)
+            scaling = project_solver.solve(project_solver.demand(demand))
+        except MatrixError as exc:
+            raise ValidationError(str(exc))
+        return Response(
+            {
+                "data_version": project_solver.version,
+                "process_ids": project_solver.technology.process_ids.tolist(),
+                "scaling": scaling.tolist(),
+            }
+        )
+
+    @action(detail=True, methods=["get", "post"], serializer_class=SolveSerializer)
+    def inventory(self, request, pk=None):
+        # Total of each elementary flow type (production factor x
+        # compartment) for the final demand, as B @ s. Flow types that sum
+        # to zero are left out.
+        project = self.get_object()
+        demand = self.final_demand(request, project)
+        try:
+            interventions, totals = inventory(project.pk, demand)
+        except MatrixError as exc:
+            raise ValidationError(str(exc))
+
+        nonzero = np.flatnonzero(totals)
+        flow_type_ids = interventions.flow_type_ids[nonzero].tolist()
+        flow_types = ElementaryFlowType.objects.select_related(
+            "production_factor", "compartment"
+        ).in_bulk(flow_type_ids)
+        return Response(
+            {
+                "data_version": interventions.version,
+                "results": [
+                    {
+                        "elementary_flow_type": flow_type_id,
+                        "production_factor": flow_types[
+                            flow_type_id
+                        ].production_factor.name,
+                        "compartment": flow_types[flow_type_id].compartment.name,
+                        "quantity": quantity,
+                    }
+                    for flow_type_id, quantity in zip(
+                        flow_type_ids, totals[nonzero].tolist()
+                    )
+                ],
+            }
+        )
+
+    def enqueue_solve(self, request, project, version, mappings):
+        job = SolveJob.objects.create(
+            project=project, data_version=version, total=len(mappings)
+        )
+        write_demands(job.demands_path, mappings)
+
+        def enqueue():
+            result = solve_batch_job.delay(job.id)
+            SolveJob.objects.filter(pk=job.pk).update(task_id=result.id)
+
+        transaction.on_commit(enqueue)
+        data = SolveJobSerializer(job, context={"request": request}).data
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="solve-batch",
+        serializer_class=SolveBatchSerializer,
+    )
+    def solve_batch(self, request, pk=None):
+        # Many demand scenarios against one factorization. The response is
+        # an .npz archive: "scaling" (scenarios x processes) and
+        # "process_ids" (its columns). Batches over SOLVE_BATCH_SIZE scenarios
+        # become a SolveJob (202): poll /solve-jobs/<id>/, then download
+        # /solve-jobs/<id>/result/.
+        project = self.get_object()
+        serializer = SolveBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        mappings = serializer.validated_data["mappings"]
+        if "overrides" in serializer.validated_data:
+            base = dict(
+                FinalDemand.objects.filter(project=project).values_list(
+                    "good_id", "quantity"
+                )
+            )
+            mappings = [{**base, **override} for override in mappings]
+
+        try:
+            project_solver = solver(project.pk)
+            # Unknown goods are reported here rather than from the task
+            project_solver.technology.good_positions(
+                list({g for mapping in mappings for g in mapping})
+            )
+            if len(mappings) > settings.SOLVE_BATCH_SIZE:
+                return self.enqueue_solve(
+                    request, project, project_solver.version, mappings
+                )
+            scaling = solve_demands(project.pk, mappings, project_solver.version)
+        except MatrixError as exc:
+            raise ValidationError(str(exc))
+
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            scaling=scaling,
+            process_ids=project_solver.technology.process_ids,
+        )
+        return HttpResponse(
+            buffer.getvalue(),
+            content_type="application/octet-stream",
+            headers={
+                "Content-Disposition": f'attachment; filename="project-{project.pk}-scaling.npz"',
+                "X-Data-Version": str(project_solver.version),
+            },
+        )
+
 
 class DimensionViewSet(ProjectFilterMixin, viewsets.ModelViewSet):
     queryset = Dimension.objects.select_related("project").all().order_by("id")
@@ -127,6 +288,33 @@ class GoodViewSet(ProjectFilterMixin, viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     project_filter_field = "project"
 
+    @action(detail=True, methods=["get"])
+    def explode(self, request, pk=None):
+        # Reachable edges in one recursive query, paths counted per level
+        # (see apps.core.bom)
+        good = self.get_object()
+        try:
+            max_depth = int(
+                request.query_params.get("max_depth", settings.BOM_DEFAULT_DEPTH)
+            )
+        except ValueError:
+            raise ValidationError("max_depth must be an integer.")
+        if not 1 <= max_depth <= settings.BOM_MAX_DEPTH:
+            raise ValidationError(
+                f"max_depth must be between 1 and {settings.BOM_MAX_DEPTH}."
+            )
+
+        results = explode(good.pk, max_depth)
+        return Response(
+            {
+                "good": good.pk,
+                "max_depth": max_depth,
+                "cycles": [r["good"] for r in results if r["cycle"]],
+                "truncated": any(r["truncated"] for r in results),
+                "results": results,
+            }
+        )
+
 
 class TransformableEntityContainConservedEntityViewSet(
     ProjectFilterMixin, viewsets.ModelViewSet
@@ -232,3 +420,163 @@ class ElementaryFlowViewSet(ProjectFilterMixin, viewsets.ModelViewSet):
     serializer_class = ElementaryFlowSerializer
     permission_classes = [AllowAny]
     project_filter_field = "process__project"
+
+
+class ScenarioJobViewSet(
+    ProjectFilterMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    # POST enqueues the enumeration; GET /scenario-jobs/<id>/ reports progress
+    # and GET /scenario-jobs/<id>/results/?offset=&limit= pages through the
+    # stored chunks, reading only the ones covering the requested page.
+    queryset = ScenarioJob.objects.select_related("project").all().order_by("id")
+    serializer_class = ScenarioJobSerializer
+    permission_classes = [AllowAny]
+    project_filter_field = "project"
+
+    def perform_create(self, serializer):
+        job = serializer.save(chunk_size=settings.SCENARIO_CHUNK_SIZE)
+
+        def enqueue():
+            result = enumerate_scenarios.delay(job.id)
+            ScenarioJob.objects.filter(pk=job.pk).update(task_id=result.id)
+
+        transaction.on_commit(enqueue)
+
+    def perform_destroy(self, instance):
+        if instance.task_id and instance.status in (
+            ScenarioJob.STATUS_PENDING,
+            ScenarioJob.STATUS_RUNNING,
+        ):
+            enumerate_scenarios.AsyncResult(instance.task_id).revoke(terminate=True)
+        shutil.rmtree(instance.results_dir, ignore_errors=True)
+        instance.delete()
+
+    @action(detail=True, methods=["get"])
+    def results(self, request, pk=None):
+        job = self.get_object()
+        try:
+            offset = max(int(request.query_params.get("offset", 0)), 0)
+            limit = int(
+                request.query_params.get("limit", settings.REST_FRAMEWORK["PAGE_SIZE"])
+            )
+        except ValueError:
+            raise ValidationError("offset and limit must be integers.")
+        limit = min(max(limit, 0), job.chunk_size)
+
+        codes = read_rows(
+            job.results_dir, job.chunk_size, len(job.domains), offset, limit
+        )
+        rows = [
+            [job.domains[d][c] for d, c in enumerate(row)] for row in codes.tolist()
+        ]
+        term_ids = {term_id for row in rows for term_id in row}
+        names = dict(Term.objects.filter(id__in=term_ids).values_list("id", "name"))
+        return Response(
+            {
+                "count": job.produced,
+                "offset": offset,
+                "limit": limit,
+                "status": job.status,
+                "terms": names,
+                "results": [
+                    {"rank": offset + i, "terms": row} for i, row in enumerate(rows)
+                ],
+            }
+        )
+
+
+class SolveJobViewSet(
+    ProjectFilterMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    # Created by POST /projects/<id>/solve-batch/; GET /solve-jobs/<id>/
+    # reports progress and GET /solve-jobs/<id>/result/ returns the .npz
+    # archive once the job has succeeded.
+    queryset = SolveJob.objects.select_related("project").all().order_by("id")
+    serializer_class = SolveJobSerializer
+    permission_classes = [AllowAny]
+    project_filter_field = "project"
+
+    def perform_destroy(self, instance):
+        if instance.task_id and instance.status in (
+            SolveJob.STATUS_PENDING,
+            SolveJob.STATUS_RUNNING,
+        ):
+            solve_batch_job.AsyncResult(instance.task_id).revoke(terminate=True)
+        if os.path.exists(instance.result_path):
+            os.remove(instance.result_path)
+        instance.delete()
+
+    @action(detail=True, methods=["get"])
+    def result(self, request, pk=None):
+        job = self.get_object()
+        if job.status != SolveJob.STATUS_SUCCESS:
+            raise ValidationError(f"The job is {job.status}.")
+        return FileResponse(
+            open(job.result_path, "rb"),
+            as_attachment=True,
+            filename=f"project-{job.project_id}-scaling-{job.pk}.npz",
+            content_type="application/octet-stream",
+            headers={"X-Data-Version": str(job.data_version)},
+        )
+
+
+class ImportJobViewSet(
+    ProjectFilterMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    # POST (multipart) stores the workbook and enqueues the import;
+    # GET /imports/<id>/ reports per-sheet progress, POST /imports/<id>/cancel/
+    # stops it (the import's transaction is rolled back) and DELETE also
+    # removes the job and its upload.
+    queryset = ImportJob.objects.select_related("project").all().order_by("id")
+    serializer_class = ImportJobSerializer
+    permission_classes = [AllowAny]
+    parser_classes = [MultiPartParser, FormParser]
+    project_filter_field = "project"
+
+    def perform_create(self, serializer):
+        job = serializer.save()
+
+        def enqueue():
+            result = import_workbook.delay(job.id)
+            ImportJob.objects.filter(pk=job.pk).update(task_id=result.id)
+
+        transaction.on_commit(enqueue)
+
+    def revoke(self, job):
+        if job.task_id and job.status in ImportJob.ACTIVE_STATUSES:
+            import_workbook.AsyncResult(job.task_id).revoke(terminate=True)
+
+    def perform_destroy(self, instance):
+        self.revoke(instance)
+        instance.file.delete(save=False)
+        instance.delete()
+
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, pk=None):
+        job = self.get_object()
+        # Conditional update: of two concurrent cancels, or a cancel racing
+        # the task's own status changes, only one moves the job out of the
+        # active statuses.
+        cancelled = ImportJob.objects.filter(
+            pk=job.pk, status__in=ImportJob.ACTIVE_STATUSES
+        ).update(status=ImportJob.STATUS_CANCELLED, finished_at=timezone.now())
+        if not cancelled:
+            job.refresh_from_db(fields=["status"])
+            raise ValidationError(f"The import is already {job.status}.")
+        self.revoke(job)
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
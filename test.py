@@ -1,52 +1,47 @@
+import os
+import sys
 import time
 
-
-def compatible_with_rule(partial, rule):
-    """Vrai si 'partial' ne contredit pas 'rule' (tous les dims fixés des 2 concordent)."""
-    for d, v in partial.items():
-        if d in rule and rule[d] != v:
-            return False
-    return True
-
-def matches_rule_complete(assign, rule):
-    """Vrai si 'assign' couvre entièrement la règle (toutes les clés de rule y sont identiques)."""
-    return all(assign.get(d, object()) == v for d, v in rule.items())
-
-def still_whitelisted(partial, whitelists):
-    """Vrai si au moins une WL reste possible en prolongeant 'partial'."""
-    if not whitelists:
-        return True
-    return any(compatible_with_rule(partial, wl) for wl in whitelists)
-
-def violates_blacklist(partial, blacklists):
-    """Vrai si une BL est déjà entièrement satisfaite par 'partial' -> prune immédiat."""
-    return any(matches_rule_complete(partial, bl) for bl in blacklists)
-
-def generate(domains, whitelists=None, blacklists=None):
-    """Itérateur sur les affectations admissibles (dict dim->val)."""
-    whitelists = whitelists or []
-    blacklists = blacklists or []
-    n = len(domains)
-
-    def dfs(i, partial):
-        # Pruning précoce
-        if violates_blacklist(partial, blacklists):
-            return
-        if not still_whitelisted(partial, whitelists):
-            return
-
-        if i == n:
-            # feuille: exiger correspondance WL complète s'il y en a
-            if (not whitelists) or any(matches_rule_complete(partial, wl) for wl in whitelists):
-                yield dict(partial)
-            return
-
-        for val in domains[i]:
-            partial[i] = val
-            yield from dfs(i+1, partial)
-        partial.pop(i, None)
-
-    yield from dfs(0, {})
+# Le moteur vit dans l'application Django (apps/core/scenarios.py), ce script
+# n'en est qu'un exemple d'usage et un banc d'essai.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "projects", "api"))
+
+from apps.core.scenarios import (  # noqa: E402
+    count,
+    explain,
+    generate,
+    generate_dfs,
+    generate_parallel,
+)
+
+
+def benchmark(domains, whitelists=None, blacklists=None, limit=None):
+    """Compare le DFS sur dict, le moteur compilé et sa version multi-processus (sans affichage)."""
+    timings = {}
+    outputs = {}
+    engines = (
+        ("dfs", generate_dfs),
+        ("compiled", generate),
+        ("parallel", generate_parallel),
+    )
+    for name, gen in engines:
+        start = time.perf_counter()
+        out = []
+        for comb in gen(domains, whitelists, blacklists):
+            out.append(comb)
+            if limit is not None and len(out) >= limit:
+                break
+        timings[name] = time.perf_counter() - start
+        outputs[name] = out
+
+    for name in ("compiled", "parallel"):
+        assert outputs[name] == outputs["dfs"], f"{name} diverge du DFS de référence"
+    count = len(outputs["dfs"])
+    for name, elapsed in timings.items():
+        print(f"{name:>9}: {count} combinaisons en {elapsed:.3f}s ({count / elapsed:,.0f}/s)")
+    for name in ("compiled", "parallel"):
+        print(f"  speed-up {name}: x{timings['dfs'] / timings[name]:.1f}")
+    return timings
 
 
 # -------- Exemple d'usage --------
@@ -79,6 +74,34 @@ if __name__ == "__main__":
     # BL exemple: [{O:"A", 2:"E"}, {1:"Z"}] => interdire (d0="A" et d2="E") et (d1="Z")
     blacklists = [{0: "A", 1: "B", 2: "A"}]
 
+    if "--count" in sys.argv:
+        # python test.py --count : taille de l'espace admissible, sans énumérer
+        start_time = time.perf_counter()
+        total = count(domains, whitelists, blacklists)
+        elapsed = time.perf_counter() - start_time
+        print(f"{total} combinaisons admissibles ({elapsed * 1000:.2f} ms)")
+        sys.exit(0)
+
+    if "--explain" in sys.argv:
+        # python test.py --explain : ordre planifié des dimensions et élagage estimé
+        report = explain(domains, whitelists, blacklists)
+        print(f"Ordre planifié: {report['order']}")
+        print(f"Arbre complet: {report['tree_nodes']} noeuds")
+        print(
+            f"Ordre d'origine: {report['natural_nodes']} noeuds développés"
+            f" ({report['natural_pruned']:.2%} élagués)"
+        )
+        print(
+            f"Ordre planifié: {report['planned_nodes']} noeuds développés"
+            f" ({report['planned_pruned']:.2%} élagués)"
+        )
+        sys.exit(0)
+
+    if "--bench" in sys.argv:
+        # python test.py --bench : compare le DFS sur dict et les moteurs compilés
+        benchmark(domains, whitelists, blacklists)
+        sys.exit(0)
+
     start_time = time.time()
 
     counter = 0